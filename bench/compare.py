@@ -0,0 +1,62 @@
+from __future__ import annotations
+
+import sys
+import argparse
+from typing import Any, Dict, List, Tuple
+
+from .results import load_results
+
+# =========================
+# Compara dois resultados (base x novo) do bench.load ou bench.micro
+# =========================
+#   python -m bench.compare bench/results/load-abc123-....json bench/results/load-def456-....json [--threshold 10]
+# Sai com código 1 se alguma métrica piorar mais que --threshold %.
+
+# métricas em que maior é melhor; o resto (latências, ns por chamada, erros) menor é melhor
+HIGHER_IS_BETTER = {"throughput_rps"}
+IGNORED = {"requests", "duration_s", "loops"}
+
+def compare(base: Dict[str, Any], new: Dict[str, Any], threshold: float) -> Tuple[List[str], List[str]]:
+    lines, regressions = [], []
+    for name, metrics in new["results"].items():
+        old = base["results"].get(name)
+        if old is None:
+            lines.append(f"{name}: novo (sem base)")
+            continue
+        for metric, value in metrics.items():
+            if metric in IGNORED or not isinstance(value, (int, float)) or metric not in old:
+                continue
+            prev = old[metric]
+            if prev == 0:
+                delta = 0.0 if value == 0 else float("inf")
+            else:
+                delta = (value - prev) / prev * 100.0
+            worse = -delta if metric in HIGHER_IS_BETTER else delta
+            flag = ""
+            if worse > threshold:
+                flag = "  << piorou"
+                regressions.append(f"{name}.{metric}")
+            elif worse < -threshold:
+                flag = "  melhorou"
+            lines.append(f"{name + '.' + metric:<40} {prev:>14,.2f} -> {value:>14,.2f}  ({delta:+.1f}%){flag}")
+    return lines, regressions
+
+def main():
+    ap = argparse.ArgumentParser(description="Compara dois resultados JSON do bench")
+    ap.add_argument("base")
+    ap.add_argument("new")
+    ap.add_argument("--threshold", type=float, default=10.0, help="variação (%%) considerada regressão")
+    a = ap.parse_args()
+    base, new = load_results(a.base), load_results(a.new)
+    if base.get("kind") != new.get("kind"):
+        ap.error(f"tipos diferentes: {base.get('kind')} x {new.get('kind')}")
+    print(f"base: {base['meta'].get('commit')} ({base['meta'].get('timestamp')})  "
+          f"novo: {new['meta'].get('commit')} ({new['meta'].get('timestamp')})")
+    lines, regressions = compare(base, new, a.threshold)
+    print("\n".join(lines))
+    if regressions:
+        print(f"\n{len(regressions)} regressão(ões) acima de {a.threshold:.0f}%: {', '.join(regressions)}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,262 @@
+from __future__ import annotations
+
+import os
+import sys
+import json
+import time
+import socket
+import asyncio
+import argparse
+import tempfile
+import subprocess
+from typing import Any, Dict, List, Optional, Tuple
+
+import httpx
+
+from .results import percentile, write_results
+
+# =========================
+# Benchmark de carga ponta a ponta (cliente MCP -> hub -> upstream stub)
+# =========================
+#   python -m bench.load --concurrency 16 --requests 2000 --latency-ms 20 --scenarios tools,resources
+# Sobe o upstream stub (bench.stub) e o hub (mcp-server.py) com um tools.json/resources.json gerado,
+# abre uma sessão streamable-http por worker e dispara tools/call e resources/read em /mcp.
+# Com --hub-url mede um hub já rodando (com a config dele); --config-dir mantém os arquivos gerados.
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ACCEPT = "application/json, text/event-stream"
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+# ---------- configuração gerada
+def generate_config(config_dir: str, upstream: str, extra_tools: int = 0) -> Dict[str, str]:
+    """tools.json/resources.json apontando para o stub; extra_tools simula catálogos grandes."""
+    tools = [
+        {"name": "bench_item", "description": "Um item do stub", "args": {"id": "int"},
+         "http": {"url": upstream + "/item/{id}"}},
+        {"name": "bench_items", "description": "Lista filtrada do stub", "args": {"min_price": "float"},
+         "http": {"url": upstream + "/items",
+                  "filter": {"where": {"price": {"gte": "{min_price}"}}, "sort": "-price", "limit": 10,
+                             "select": ["id", "title", "price"]}}},
+    ]
+    tools += [{"name": f"bench_extra_{i}", "description": f"Tool extra {i}", "args": {"id": "int"},
+               "http": {"url": upstream + "/item/{id}"}} for i in range(extra_tools)]
+    resources = [{"uri": "bench://item/{id}", "description": "Item do stub", "http": {"url": upstream + "/item/{id}"}}]
+    paths = {"TOOLS_FILE": os.path.join(config_dir, "tools.json"),
+             "RESOURCES_FILE": os.path.join(config_dir, "resources.json"),
+             "PROMPTS_FILE": os.path.join(config_dir, "prompts.json")}
+    for key, data in (("TOOLS_FILE", tools), ("RESOURCES_FILE", resources), ("PROMPTS_FILE", [])):
+        with open(paths[key], "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=2)
+    return paths
+
+# ---------- processos
+def _spawn(args: List[str], log_path: str, env: Optional[Dict[str, str]] = None) -> subprocess.Popen:
+    # saída num arquivo (não PIPE): um pipe cheio de logs travaria o processo no meio da medição
+    with open(log_path, "wb") as log:
+        return subprocess.Popen(args, cwd=ROOT, env={**os.environ, **(env or {})},
+                                stdout=log, stderr=subprocess.STDOUT)
+
+def _log_tail(log_path: str, limit: int = 2000) -> str:
+    try:
+        with open(log_path, "rb") as f:
+            return f.read().decode(errors="replace")[-limit:]
+    except OSError:
+        return ""
+
+async def _wait_ready(proc: subprocess.Popen, check, what: str, log_path: str, timeout: float = 30.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"{what} terminou na inicialização (código {proc.returncode}):\n{_log_tail(log_path)}")
+        try:
+            if await check():
+                return
+        except httpx.HTTPError:
+            pass
+        await asyncio.sleep(0.2)
+    raise RuntimeError(f"{what} não respondeu em {timeout:.0f}s")
+
+def _stop(proc: Optional[subprocess.Popen]):
+    if proc is None or proc.poll() is not None:
+        return
+    proc.terminate()
+    try:
+        proc.wait(timeout=10)
+    except subprocess.TimeoutExpired:
+        proc.kill()
+
+# ---------- cliente MCP (streamable-http) mínimo
+def _parse_body(resp: httpx.Response) -> Dict[str, Any]:
+    """Resposta JSON direta ou SSE (última linha data: com a mensagem JSON-RPC)."""
+    if resp.headers.get("content-type", "").startswith("text/event-stream"):
+        data = [line[5:].strip() for line in resp.text.splitlines() if line.startswith("data:")]
+        return json.loads(data[-1]) if data else {}
+    return resp.json() if resp.content else {}
+
+class McpSession:
+    def __init__(self, client: httpx.AsyncClient, url: str):
+        self.client = client
+        self.url = url
+        self.session_id: Optional[str] = None
+        self._ids = 0
+
+    def _headers(self) -> Dict[str, str]:
+        h = {"Accept": ACCEPT, "Content-Type": "application/json"}
+        if self.session_id:
+            h["mcp-session-id"] = self.session_id
+        return h
+
+    async def initialize(self):
+        resp = await self.client.post(self.url, headers=self._headers(), json={
+            "jsonrpc": "2.0", "id": 0, "method": "initialize",
+            "params": {"protocolVersion": "2025-03-26", "capabilities": {},
+                       "clientInfo": {"name": "mcp-hub-bench", "version": "1"}},
+        })
+        resp.raise_for_status()
+        self.session_id = resp.headers.get("mcp-session-id")
+        await self.client.post(self.url, headers=self._headers(),
+                               json={"jsonrpc": "2.0", "method": "notifications/initialized"})
+
+    async def request(self, method: str, params: Dict[str, Any]) -> Tuple[bool, Dict[str, Any]]:
+        """(ok, mensagem); ok=False para erro JSON-RPC, isError da tool ou HTTP != 200."""
+        self._ids += 1
+        resp = await self.client.post(self.url, headers=self._headers(),
+                                      json={"jsonrpc": "2.0", "id": self._ids, "method": method, "params": params})
+        if resp.status_code != 200:
+            return False, {"status": resp.status_code}
+        msg = _parse_body(resp)
+        ok = "error" not in msg and not (msg.get("result") or {}).get("isError", False)
+        return ok, msg
+
+# ---------- cenários
+def _scenario_call(name: str, i: int) -> Tuple[str, Dict[str, Any]]:
+    if name == "tools":
+        return "tools/call", {"name": "bench_item", "arguments": {"id": i % 100}}
+    if name == "tools_filter":
+        return "tools/call", {"name": "bench_items", "arguments": {"min_price": float(i % 20)}}
+    if name == "resources":
+        return "resources/read", {"uri": f"bench://item/{i % 100}"}
+    if name == "tools_list":
+        return "tools/list", {}
+    raise ValueError(f"cenário desconhecido: {name}")
+
+SCENARIOS = ("tools", "tools_filter", "resources", "tools_list")
+
+async def run_scenario(hub_url: str, scenario: str, concurrency: int, requests: int,
+                       duration: float, warmup: int) -> Dict[str, Any]:
+    limits = httpx.Limits(max_connections=concurrency * 2, max_keepalive_connections=concurrency * 2)
+    async with httpx.AsyncClient(timeout=60.0, limits=limits) as client:
+        sessions = [McpSession(client, hub_url) for _ in range(concurrency)]
+        await asyncio.gather(*(s.initialize() for s in sessions))
+        for s in sessions:  # aquecimento: conexões, caches de template, pools do hub
+            for i in range(warmup):
+                await s.request(*_scenario_call(scenario, i))
+
+        latencies: List[float] = []
+        errors = 0
+        counter = iter(range(requests if requests > 0 else sys.maxsize))
+        start = time.perf_counter()
+        stop_at = start + duration if duration > 0 else float("inf")
+
+        async def worker(session: McpSession):
+            nonlocal errors
+            for i in counter:
+                if time.perf_counter() >= stop_at:
+                    return
+                t0 = time.perf_counter()
+                try:
+                    ok, _ = await session.request(*_scenario_call(scenario, i))
+                except httpx.HTTPError:
+                    ok = False
+                latencies.append(time.perf_counter() - t0)
+                if not ok:
+                    errors += 1
+
+        await asyncio.gather(*(worker(s) for s in sessions))
+        elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    ms = lambda v: round(v * 1000.0, 3)
+    return {
+        "requests": len(latencies), "errors": errors, "duration_s": round(elapsed, 3),
+        "throughput_rps": round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        "p50_ms": ms(percentile(latencies, 50)), "p95_ms": ms(percentile(latencies, 95)),
+        "p99_ms": ms(percentile(latencies, 99)), "max_ms": ms(latencies[-1]) if latencies else 0.0,
+        "mean_ms": ms(sum(latencies) / len(latencies)) if latencies else 0.0,
+    }
+
+async def _main(a: argparse.Namespace) -> Dict[str, Dict[str, Any]]:
+    stub = hub = None
+    tmp = tempfile.TemporaryDirectory(prefix="mcp-hub-bench-")
+    try:
+        hub_url = a.hub_url
+        if not hub_url:
+            stub_port, hub_port = _free_port(), _free_port()
+            upstream = f"http://127.0.0.1:{stub_port}"
+            stub_log, hub_log = os.path.join(tmp.name, "stub.log"), os.path.join(tmp.name, "hub.log")
+            stub = _spawn([sys.executable, "-m", "bench.stub", "--port", str(stub_port),
+                           "--latency-ms", str(a.latency_ms), "--jitter-ms", str(a.jitter_ms),
+                           "--items", str(a.items), "--item-bytes", str(a.item_bytes),
+                           "--error-rate", str(a.error_rate)], stub_log)
+            async with httpx.AsyncClient() as c:
+                await _wait_ready(stub, lambda: _ok(c.get(upstream + "/health")), "stub", stub_log)
+            paths = generate_config(a.config_dir or tmp.name, upstream, a.extra_tools)
+            env = {**paths, "PORT": str(hub_port), "HOST": "127.0.0.1", "LOG_LEVEL": a.hub_log_level,
+                   "WORKERS": str(a.workers),
+                   "DOTENV_PATH": os.devnull}  # .env do desenvolvedor não entra na medição
+            hub = _spawn([sys.executable, "mcp-server.py"], hub_log, env)
+            hub_url = f"http://127.0.0.1:{hub_port}/mcp"
+
+            async def hub_up() -> bool:
+                async with httpx.AsyncClient() as c:
+                    await McpSession(c, hub_url).initialize()
+                return True
+            await _wait_ready(hub, hub_up, "hub", hub_log)
+
+        results = {}
+        for scenario in a.scenarios.split(","):
+            scenario = scenario.strip()
+            r = await run_scenario(hub_url, scenario, a.concurrency, a.requests, a.duration, a.warmup)
+            results[scenario] = r
+            print(f"{scenario:<14} {r['throughput_rps']:>9.1f} req/s  p50 {r['p50_ms']:>8.2f} ms  "
+                  f"p95 {r['p95_ms']:>8.2f} ms  p99 {r['p99_ms']:>8.2f} ms  erros {r['errors']}/{r['requests']}")
+        return results
+    finally:
+        _stop(hub)
+        _stop(stub)
+        tmp.cleanup()
+
+async def _ok(coro) -> bool:
+    return (await coro).status_code == 200
+
+def main():
+    ap = argparse.ArgumentParser(description="Benchmark de carga do hub via streamable-http (/mcp)")
+    ap.add_argument("--scenarios", default="tools,tools_filter,resources",
+                    help=f"lista separada por vírgula: {', '.join(SCENARIOS)}")
+    ap.add_argument("--concurrency", type=int, default=8)
+    ap.add_argument("--requests", type=int, default=1000, help="por cenário (0 = usar só --duration)")
+    ap.add_argument("--duration", type=float, default=0.0, help="segundos por cenário (0 = sem limite)")
+    ap.add_argument("--warmup", type=int, default=5, help="chamadas de aquecimento por sessão")
+    ap.add_argument("--latency-ms", type=float, default=5.0)
+    ap.add_argument("--jitter-ms", type=float, default=0.0)
+    ap.add_argument("--items", type=int, default=50)
+    ap.add_argument("--item-bytes", type=int, default=200)
+    ap.add_argument("--error-rate", type=float, default=0.0)
+    ap.add_argument("--extra-tools", type=int, default=0, help="tools extras no catálogo gerado")
+    ap.add_argument("--workers", type=int, default=1, help="WORKERS do hub (0 = um por CPU)")
+    ap.add_argument("--hub-url", help="usa um hub já rodando (ex.: http://127.0.0.1:8030/mcp)")
+    ap.add_argument("--config-dir", help="onde gravar o tools.json/resources.json gerado")
+    ap.add_argument("--hub-log-level", default="warning")
+    ap.add_argument("--out", help="arquivo JSON de saída (default: bench/results/load-<commit>-<data>.json)")
+    a = ap.parse_args()
+    if a.requests <= 0 and a.duration <= 0:
+        ap.error("informe --requests ou --duration")
+    results = asyncio.run(_main(a))
+    print("resultados em", write_results("load", vars(a), results, a.out))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+from __future__ import annotations
+
+import timeit
+import argparse
+import statistics
+from collections import ChainMap
+from typing import Any, Callable, Dict
+
+from mcp_http_hub.utils import safe_format, resolve_template_obj, coerce_args, extract_filter, args_ctx
+from mcp_http_hub.filters import compile_filter
+from mcp_http_hub.http_client import compile_http, prepare_request
+from mcp_http_hub.serializer import dumps, loads
+
+from .results import write_results
+
+# =========================
+# Micro-benchmarks das funções do caminho quente
+# =========================
+#   python -m bench.micro [--repeat 5] [--out arquivo.json]
+# Reporta ns por chamada (melhor e mediana entre as repetições).
+
+def _cases() -> Dict[str, Callable[[], Any]]:
+    ctx = args_ctx({"id": 42, "q": "café", "page": 3})
+    env_ctx = ChainMap({"id": "42"}, {"API_HOST": "api.example.com", "TOKEN": "abc"})
+    tmpl_obj = {
+        "url": "https://{API_HOST}/v1/items/{id}",
+        "headers": {"Authorization": "Bearer {TOKEN}", "Accept": "application/json"},
+        "body": {"id": "{id}", "tags": ["{id}", "fixo"], "nested": {"k": "{missing}"}},
+    }
+    spec = {"id": "int", "price": "float", "active": "bool", "name": "str"}
+    raw_args = {"id": "42", "price": "9.5", "active": "sim", "name": "espresso"}
+    items = [{"id": i, "title": f"Coffee {i}", "price": i * 1.5, "tags": ["hot" if i % 2 else "iced"],
+              "meta": {"origin": "BR" if i % 3 else "CO"}} for i in range(1000)]
+    flt = {"where": {"price": {"gte": 100}, "meta.origin": "BR"}, "sort": "-price",
+           "limit": 20, "select": ["id", "title", "price"]}
+    compiled = compile_filter(flt)
+    plan = compile_http({"url": "https://api.example.com/v1/items/{id}", "query": {"q": "{q}", "page": "{page}"},
+                         "headers": {"Accept": "application/json"}})
+    items_json = dumps(items)
+    return {
+        "safe_format": lambda: safe_format("https://{API_HOST}/v1/items/{id}?x={missing}", env_ctx),
+        "resolve_template_obj": lambda: resolve_template_obj(tmpl_obj, env_ctx),
+        "coerce_args": lambda: coerce_args(spec, raw_args),
+        "extract_filter_1000": lambda: extract_filter(items, flt, ctx),
+        "compiled_filter_1000": lambda: compiled.apply(items, ctx),
+        "prepare_request": lambda: prepare_request(plan, ctx),
+        "json_dumps_1000": lambda: dumps(items),
+        "json_loads_1000": lambda: loads(items_json),
+    }
+
+def run(repeat: int = 5, min_time: float = 0.2) -> Dict[str, Dict[str, Any]]:
+    out: Dict[str, Dict[str, Any]] = {}
+    for name, fn in _cases().items():
+        timer = timeit.Timer(fn)
+        number, elapsed = timer.autorange()
+        if elapsed < min_time:
+            number = max(int(number * min_time / max(elapsed, 1e-9)), 1)
+        per_call = [t / number * 1e9 for t in timer.repeat(repeat=repeat, number=number)]
+        out[name] = {"ns_per_call_best": round(min(per_call), 1),
+                     "ns_per_call_median": round(statistics.median(per_call), 1), "loops": number}
+        print(f"{name:<24} {out[name]['ns_per_call_best']:>12,.1f} ns  (mediana {out[name]['ns_per_call_median']:,.1f})")
+    return out
+
+def main():
+    ap = argparse.ArgumentParser(description="Micro-benchmarks (safe_format, filtros, coerce_args...)")
+    ap.add_argument("--repeat", type=int, default=5)
+    ap.add_argument("--min-time", type=float, default=0.2, help="segundos mínimos por repetição")
+    ap.add_argument("--out", help="arquivo JSON de saída (default: bench/results/micro-<commit>-<data>.json)")
+    a = ap.parse_args()
+    results = run(a.repeat, a.min_time)
+    print("resultados em", write_results("micro", vars(a), results, a.out))
+
+if __name__ == "__main__":
+    main()
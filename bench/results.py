@@ -0,0 +1,54 @@
+from __future__ import annotations
+
+import os
+import sys
+import json
+import platform
+import datetime
+import subprocess
+from typing import Any, Dict, List
+
+# =========================
+# Resultados em JSON (comparáveis entre versões com bench.compare)
+# =========================
+#   { "kind": "load" | "micro", "meta": {commit, python, ...}, "args": {...}, "results": { nome: {métrica: valor} } }
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    """Percentil por rank mais próximo sobre uma lista já ordenada."""
+    if not sorted_values:
+        return 0.0
+    idx = min(max(int(round(pct / 100.0 * len(sorted_values) + 0.5)) - 1, 0), len(sorted_values) - 1)
+    return sorted_values[idx]
+
+def _git(*args: str) -> str:
+    try:
+        return subprocess.run(["git", *args], capture_output=True, text=True, timeout=10,
+                              cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        return ""
+
+def run_meta() -> Dict[str, Any]:
+    return {
+        "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+        "commit": _git("rev-parse", "--short", "HEAD") or None,
+        "dirty": bool(_git("status", "--porcelain", "--untracked-files=no")),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+    }
+
+def write_results(kind: str, args: Dict[str, Any], results: Dict[str, Dict[str, Any]], out: str | None = None) -> str:
+    doc = {"kind": kind, "meta": run_meta(), "args": args, "results": results}
+    if not out:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        stamp = datetime.datetime.now().strftime("%Y%m%d-%H%M%S")
+        out = os.path.join(RESULTS_DIR, f"{kind}-{doc['meta']['commit'] or 'nogit'}-{stamp}.json")
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(doc, f, indent=2, ensure_ascii=False)
+    return out
+
+def load_results(path: str) -> Dict[str, Any]:
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
@@ -0,0 +1,100 @@
+from __future__ import annotations
+
+import json
+import random
+import asyncio
+import argparse
+
+import uvicorn
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import Response
+from starlette.routing import Route
+
+# =========================
+# Upstream stub para benchmarks (latência, tamanho do payload e taxa de erro configuráveis)
+# =========================
+#   python -m bench.stub --port 8791 --latency-ms 20 --jitter-ms 5 --items 50 --item-bytes 200 --error-rate 0.01
+# Cada rota aceita os mesmos parâmetros por query (latency_ms, jitter_ms, items, item_bytes, error_rate),
+# que sobrepõem os da linha de comando:
+#   GET /items        lista de objetos {id, title, price, tags, meta, pad}
+#   GET /item/{id}    um objeto
+#   GET /text         texto puro de item_bytes
+#   GET /health       sem latência nem erro
+
+class StubConfig:
+    def __init__(self, latency_ms: float = 0.0, jitter_ms: float = 0.0, items: int = 20,
+                 item_bytes: int = 100, error_rate: float = 0.0, seed: int = 42):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.items = items
+        self.item_bytes = item_bytes
+        self.error_rate = error_rate
+        self.rng = random.Random(seed)  # semente fixa: mesma sequência de erros/latências entre execuções
+
+def _item(i: int, item_bytes: int) -> dict:
+    return {"id": i, "title": f"Coffee {i}", "price": round(i * 1.5, 2),
+            "tags": ["hot" if i % 2 else "iced"], "meta": {"origin": "BR" if i % 3 else "CO"},
+            "pad": "x" * max(item_bytes - 100, 0)}
+
+def create_app(cfg: StubConfig) -> Starlette:
+    async def _pre(request: Request) -> Response | None:
+        q = request.query_params
+        latency = float(q.get("latency_ms", cfg.latency_ms))
+        jitter = float(q.get("jitter_ms", cfg.jitter_ms))
+        delay = max(latency + (cfg.rng.uniform(-jitter, jitter) if jitter else 0.0), 0.0)
+        if delay:
+            await asyncio.sleep(delay / 1000.0)
+        if cfg.rng.random() < float(q.get("error_rate", cfg.error_rate)):
+            return Response('{"error": "stub"}', status_code=503, media_type="application/json")
+        return None
+
+    def _json(obj) -> Response:
+        return Response(json.dumps(obj), media_type="application/json")
+
+    async def items(request: Request) -> Response:
+        err = await _pre(request)
+        if err is not None:
+            return err
+        q = request.query_params
+        n = int(q.get("items", cfg.items))
+        size = int(q.get("item_bytes", cfg.item_bytes))
+        return _json([_item(i, size) for i in range(n)])
+
+    async def item(request: Request) -> Response:
+        err = await _pre(request)
+        if err is not None:
+            return err
+        size = int(request.query_params.get("item_bytes", cfg.item_bytes))
+        return _json(_item(int(request.path_params["id"]), size))
+
+    async def text(request: Request) -> Response:
+        err = await _pre(request)
+        if err is not None:
+            return err
+        return Response("x" * int(request.query_params.get("item_bytes", cfg.item_bytes)), media_type="text/plain")
+
+    async def health(request: Request) -> Response:
+        return _json({"ok": True})
+
+    return Starlette(routes=[
+        Route("/items", items), Route("/item/{id:int}", item),
+        Route("/text", text), Route("/health", health),
+    ])
+
+def main():
+    ap = argparse.ArgumentParser(description="Upstream stub para benchmarks do hub")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8791)
+    ap.add_argument("--latency-ms", type=float, default=0.0)
+    ap.add_argument("--jitter-ms", type=float, default=0.0)
+    ap.add_argument("--items", type=int, default=20)
+    ap.add_argument("--item-bytes", type=int, default=100)
+    ap.add_argument("--error-rate", type=float, default=0.0)
+    ap.add_argument("--seed", type=int, default=42)
+    a = ap.parse_args()
+    cfg = StubConfig(a.latency_ms, a.jitter_ms, a.items, a.item_bytes, a.error_rate, a.seed)
+    uvicorn.run(create_app(cfg), host=a.host, port=a.port, log_level="warning", access_log=False)
+
+if __name__ == "__main__":
+    main()
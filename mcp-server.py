@@ -1,18 +1,53 @@
 from __future__ import annotations
 
+import sys
+import anyio
+
 from mcp_http_hub.settings import settings
-from mcp_http_hub.loaders.tools_loader import load_tools_from_file
-from mcp_http_hub.loaders.resources_loader import load_resources_from_file
-from mcp_http_hub.loaders.prompts_loader import load_prompts_from_file
+from mcp_http_hub.http_pool import aclose_clients
+from mcp_http_hub.oauth import cancel_refreshes
+from mcp_http_hub.blobs import close_blobs
+from mcp_http_hub.shared_state import flush_shared
+from mcp_http_hub import admin  # noqa: F401  (registra rotas /hub/*)
+from mcp_http_hub.reload import load_all, install_list_changed, install_reload_signal, watch_config
+from mcp_http_hub.prefetch import run_prefetch
+from mcp_http_hub.warmup import run_warmup
+from mcp_http_hub.workers import worker_count, is_worker, run_supervisor, serve_http
+from mcp_http_hub.logs import install_stdlib_logging, flush_logs
+
+async def _serve():
+    # roda no mesmo event loop dos clientes async, para fechá-los corretamente no shutdown
+    install_reload_signal()
+    try:
+        async with anyio.create_task_group() as tg:
+            tg.start_soon(watch_config)  # hot-reload dos arquivos (CONFIG_WATCH_INTERVAL)
+            tg.start_soon(run_prefetch)  # resources com "prefetch" (grava PREFETCH_SNAPSHOT ao sair)
+            tg.start_soon(run_warmup)    # DNS e conexões dos upstreams conhecidos (WARMUP_INTERVAL)
+            await serve_http(settings.mcp)  # com WORKERS > 1, no socket compartilhado
+            tg.cancel_scope.cancel()
+    finally:
+        cancel_refreshes()
+        await aclose_clients()
+        close_blobs()
+        flush_shared()
+        flush_logs()
 
 def main():
+    # logs de mcp/httpx/uvicorn na mesma fila (sem escrita síncrona no stderr por requisição)
+    install_stdlib_logging()
+
+    # WORKERS > 1: este processo só supervisiona; cada worker reexecuta este script
+    workers = worker_count()
+    if workers > 1 and not is_worker():
+        sys.exit(run_supervisor(workers))
+
     # Carregadores registram tudo no objeto FastMCP global dos loaders
-    load_tools_from_file(settings.TOOLS_FILE)
-    load_resources_from_file(settings.RESOURCES_FILE)
-    load_prompts_from_file(settings.PROMPTS_FILE)
+    # (e guardam as definições para o hot-reload aplicar só as diferenças)
+    load_all()
+    install_list_changed(settings.mcp)
 
-    # Sobe servidor
-    settings.mcp.run(transport="streamable-http")
+    # Sobe servidor; no shutdown fecha os pools de conexão compartilhados
+    anyio.run(_serve)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,119 @@
+from __future__ import annotations
+
+import hmac
+
+from mcp.server.fastmcp import FastMCP
+from starlette.requests import Request
+from starlette.responses import JSONResponse, PlainTextResponse
+
+from .settings import settings
+from .response_cache import cache_stats
+from .oauth import oauth_stats
+from .coalesce import coalesce_stats
+from .batching import batch_stats
+from .limits import limits_stats
+from .resilience import breaker_stats
+from .metrics import render_metrics
+from .reload import reload_config, reload_stats
+from .shared_state import shared_stats
+from .paging import paging_stats
+from .prefetch import prefetch_stats
+from .deadlines import deadline_stats
+from .paginate import paginate_stats
+from .prompt_render import render_stats
+from .warmup import warmup_stats
+from .serializer import serializer_name
+
+# =========================
+# Rotas de introspecção (servidas junto ao app streamable-http)
+# =========================
+mcp: FastMCP = settings.mcp
+
+_LOOPBACK = ("127.0.0.1", "::1", "::ffff:127.0.0.1", "localhost")  # dual-stack: IPv4 mapeado
+
+def _may_reload(request: Request) -> bool:
+    """POST /hub/reload: com RELOAD_TOKEN, só com o Bearer certo; sem ele, só de loopback."""
+    if settings.RELOAD_TOKEN:
+        auth = request.headers.get("authorization", "")
+        return hmac.compare_digest(auth.encode(), f"Bearer {settings.RELOAD_TOKEN}".encode())
+    return request.client is not None and request.client.host in _LOOPBACK
+
+@mcp.custom_route("/hub/cache", methods=["GET"])
+async def _cache_route(request: Request) -> JSONResponse:
+    """Contadores dos caches de resposta (hits/misses/evictions/bytes) por definição."""
+    return JSONResponse(cache_stats())
+
+@mcp.custom_route("/hub/oauth", methods=["GET"])
+async def _oauth_route(request: Request) -> JSONResponse:
+    """Estado dos tokens oauth2 (validade, backoff, refreshes) por token_url/client_id."""
+    return JSONResponse(oauth_stats())
+
+@mcp.custom_route("/hub/coalesce", methods=["GET"])
+async def _coalesce_route(request: Request) -> JSONResponse:
+    """Chamadas idênticas coalescidas (leaders = idas ao upstream, coalesced = carona)."""
+    return JSONResponse(coalesce_stats())
+
+@mcp.custom_route("/hub/batch", methods=["GET"])
+async def _batch_route(request: Request) -> JSONResponse:
+    """Micro-batching por definição (calls, batches, keys, singles)."""
+    return JSONResponse(batch_stats())
+
+@mcp.custom_route("/hub/limits", methods=["GET"])
+async def _limits_route(request: Request) -> JSONResponse:
+    """Limites por upstream: em andamento, fila, espera média/máxima, rejeições, pausas por Retry-After."""
+    return JSONResponse(limits_stats())
+
+@mcp.custom_route("/hub/breakers", methods=["GET"])
+async def _breakers_route(request: Request) -> JSONResponse:
+    """Circuit breakers por host (closed/open/half_open, falhas seguidas, retries e hedges)."""
+    return JSONResponse(breaker_stats())
+
+@mcp.custom_route("/hub/reload", methods=["GET", "POST"])
+async def _reload_route(request: Request) -> JSONResponse:
+    """POST relê tools/resources/prompts e aplica só as diferenças; GET mostra o último reload."""
+    if request.method == "POST":
+        if not _may_reload(request):
+            return JSONResponse({"error": "reload não autorizado (RELOAD_TOKEN ou loopback)"}, status_code=403)
+        return JSONResponse(await reload_config("POST /hub/reload"))
+    return JSONResponse(reload_stats())
+
+@mcp.custom_route("/hub/shared", methods=["GET"])
+async def _shared_route(request: Request) -> JSONResponse:
+    """Worker que respondeu (pid) e uso do store compartilhado entre workers."""
+    return JSONResponse(shared_stats())
+
+@mcp.custom_route("/hub/prefetch", methods=["GET"])
+async def _prefetch_route(request: Request) -> JSONResponse:
+    """Resources com prefetch: idade do valor quente, próxima busca, hits/misses e falhas."""
+    return JSONResponse(prefetch_stats())
+
+@mcp.custom_route("/hub/pages", methods=["GET"])
+async def _pages_route(request: Request) -> JSONResponse:
+    """Resultados paginados guardados (conjuntos, bytes) e o serializador JSON em uso."""
+    return JSONResponse({**paging_stats(), "serializer": serializer_name()})
+
+@mcp.custom_route("/hub/deadlines", methods=["GET"])
+async def _deadlines_route(request: Request) -> JSONResponse:
+    """Prazos por chamada: prazos esgotados, retries sem tempo e chamadas canceladas por desconexão."""
+    return JSONResponse(deadline_stats())
+
+@mcp.custom_route("/hub/paginate", methods=["GET"])
+async def _paginate_route(request: Request) -> JSONResponse:
+    """Definições com paginate: chamadas, páginas e itens lidos, paradas pelo limit e cortes por teto."""
+    return JSONResponse(paginate_stats())
+
+@mcp.custom_route("/hub/prompts", methods=["GET"])
+async def _prompts_route(request: Request) -> JSONResponse:
+    """Renderização dos prompts HTTP: renders, variáveis cortadas por tamanho e por tempo."""
+    return JSONResponse(render_stats())
+
+@mcp.custom_route("/hub/warmup", methods=["GET"])
+async def _warmup_route(request: Request) -> JSONResponse:
+    """Upstreams aquecidos: conexões ociosas, aquecimentos e falhas, e o cache de DNS."""
+    return JSONResponse(warmup_stats())
+
+if settings.METRICS:
+    @mcp.custom_route("/metrics", methods=["GET"])
+    async def _metrics_route(request: Request) -> PlainTextResponse:
+        """Métricas no formato texto do Prometheus (handlers, fases do upstream, filtros)."""
+        return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4; charset=utf-8")
@@ -0,0 +1,202 @@
+from __future__ import annotations
+
+import asyncio
+import httpx
+from typing import Any, Dict, List, Optional, Tuple
+
+from .filters import compile_path, list_path
+from .http_client import (compile_http, prepare_request, decode_response, finish_payload, http_call_async, _asend,
+                          _cached_result)
+from .deadlines import adeadline, spawn, abort
+from .settings import settings
+from .serializer import dumps
+from .utils import args_ctx, coerce_args, debug_sampled, warn
+
+# =========================
+# Micro-batching estilo dataloader (bloco "batch" na definição)
+# =========================
+#   "batch": {
+#     "arg": "id",                  # argumento que varia entre as chamadas
+#     "window_ms": 5,               # janela de coleta
+#     "max_size": 50,               # dispara antes se encher
+#     "http": {                     # requisição em lote; {keys} = chaves unidas por separator
+#       "url": "https://api.example.com/coffee",
+#       "query": { "ids": "{keys}" }
+#     },
+#     "separator": ",",
+#     "keys_in_body": "ids",        # opcional: POST JSON com a lista em body[ids]
+#     "items_path": "data",         # onde está a lista na resposta (default: raiz)
+#     "key_path": "id"              # campo de cada item que casa com o argumento
+#   }
+# Chamadas com os mesmos demais argumentos que chegam na janela viram uma só
+# requisição; a resposta é repartida por key_path. Lote de uma chave só usa o
+# "http" normal da definição (mesma semântica de antes, inclusive cache). Cada item do lote passa
+# pelo mesmo "filter" e vai para o mesmo cache da requisição individual, então o resultado não
+# depende de quantas chamadas caíram na janela; chave com entrada fresca no cache nem entra no lote.
+# As chaves da resposta são convertidas como o argumento ("args" da definição): 1 casa com 1.0.
+# Cada chamador espera dentro do próprio prazo ("deadline" do http da definição); a requisição
+# em lote tem o prazo do "http" do batch e é cancelada se todos os chamadores desistirem.
+
+_STATS: Dict[str, Dict[str, int]] = {}
+
+class _Pending:
+    __slots__ = ("args", "waiters", "task")
+
+    def __init__(self, args: Dict[str, Any]):
+        self.args = args
+        self.waiters: Dict[str, Tuple[Any, List[asyncio.Future]]] = {}
+        self.task: Optional[asyncio.Task] = None
+
+class Batcher:
+    def __init__(self, name: str, cfg: dict, single_plan, arg_type: Optional[str] = None):
+        if not cfg.get("arg") or not cfg.get("http"):
+            raise ValueError(f"{name}: batch requer 'arg' e 'http'")
+        self.name = name
+        self.arg = cfg["arg"]
+        self.window = float(cfg.get("window_ms", 5)) / 1000.0
+        self.max_size = max(int(cfg.get("max_size", 50)), 1)
+        self.separator = str(cfg.get("separator", ","))
+        self.keys_in_body = cfg.get("keys_in_body")
+        items_path = list_path(cfg.get("items_path"))
+        self.items_path = compile_path(items_path) if items_path else None
+        self.key_path = compile_path(cfg.get("key_path") or self.arg)
+        self.plan = compile_http(cfg["http"])
+        self.single_plan = single_plan
+        self.arg_type = arg_type
+        self._pending: Dict[tuple, _Pending] = {}
+        self.stats = _STATS.setdefault(name, {"calls": 0, "batches": 0, "keys": 0, "singles": 0, "cached": 0})
+
+    def _norm(self, value: Any) -> Optional[str]:
+        """Chave de casamento: mesma conversão dos args (coerce_args) e número inteiro sem ".0"."""
+        if self.arg_type:
+            try:
+                value = coerce_args({self.arg: self.arg_type}, {self.arg: value})[self.arg]
+            except (TypeError, ValueError):
+                return None
+        if isinstance(value, float) and value.is_integer():
+            value = int(value)
+        return str(value)
+
+    async def load(self, args: Dict[str, Any]) -> Tuple[str, Any]:
+        """Mesma assinatura de retorno de http_call_async: (mode, payload) do item."""
+        self.stats["calls"] += 1
+        key = args[self.arg]
+        cache = self.single_plan.cache
+        if cache is not None:
+            ctx = args_ctx(args)
+            req = prepare_request(self.single_plan, ctx)
+            entry, state = await cache.alookup(cache.key_for(req.method, req.url, req.params, req.headers), req.headers)
+            if state == "fresh":
+                self.stats["cached"] += 1
+                return _cached_result(req, entry, ctx)
+        group = tuple(sorted((k, str(v)) for k, v in args.items() if k != self.arg))
+        pending = self._pending.get(group)
+        if pending is None:
+            pending = self._pending[group] = _Pending(args)
+            pending.task = spawn(self._flush_later(group, pending), detached=True)
+        fut = asyncio.get_running_loop().create_future()
+        pending.waiters.setdefault(self._norm(key), (key, []))[1].append(fut)
+        if len(pending.waiters) >= self.max_size:
+            self._pending.pop(group, None)
+            pending.task.cancel()
+            pending.task = spawn(self._flush(pending), detached=True)
+        try:
+            with adeadline(self.single_plan.deadline, self.name):
+                return await fut
+        finally:
+            if fut.cancelled():
+                self._abandon(group, pending)
+
+    def _abandon(self, group: tuple, pending: _Pending):
+        """Chamador desistiu (cancelado/prazo): sem mais ninguém esperando, o lote é cancelado."""
+        if all(f.done() for _, futs in pending.waiters.values() for f in futs):
+            if self._pending.get(group) is pending:
+                self._pending.pop(group, None)
+            abort(pending.task)
+
+    async def _flush_later(self, group: tuple, pending: _Pending):
+        await asyncio.sleep(self.window)
+        if self._pending.get(group) is pending:
+            self._pending.pop(group, None)
+        await self._flush(pending)
+
+    async def _flush(self, pending: _Pending):
+        waiters = pending.waiters
+        try:
+            if len(waiters) == 1:
+                (key, futs), = waiters.values()
+                self.stats["singles"] += 1
+                result = await http_call_async(self.single_plan, args_ctx({**pending.args, self.arg: key}))
+                _settle(futs, result=result)
+                return
+            items, headers = await self._bulk([k for k, _ in waiters.values()], pending.args)
+        except Exception as e:
+            for _, futs in waiters.values():
+                _settle(futs, error=e)
+            return
+        self.stats["batches"] += 1
+        self.stats["keys"] += len(waiters)
+        debug_sampled("batch: %s -> 1 requisição para %d chaves", self.name, len(waiters))
+        for skey, (key, futs) in waiters.items():
+            if skey not in items:
+                _settle(futs, error=LookupError(f"{self.name}: {self.arg}={key} não encontrado na resposta em lote"))
+                continue
+            try:
+                result = self._item_result(items[skey], headers, {**pending.args, self.arg: key})
+            except Exception as e:
+                _settle(futs, error=e)
+                continue
+            _settle(futs, result=result)
+
+    def _item_result(self, item: Any, headers, args: Dict[str, Any]) -> Tuple[str, Any]:
+        """Item do lote como se viesse da requisição individual: guardado no cache dela e filtrado."""
+        ctx = args_ctx(args)
+        req = prepare_request(self.single_plan, ctx)
+        cache = self.single_plan.cache
+        if cache is not None:
+            key = cache.key_for(req.method, req.url, req.params, req.headers)
+            cache.store(key, 200, headers, "json", item, len(dumps(item)), req.headers)
+        return finish_payload(req, "json", item, ctx)
+
+    async def _bulk(self, keys: List[Any], args: Dict[str, Any]) -> Tuple[Dict[str, Any], httpx.Headers]:
+        ctx = args_ctx({**args, "keys": self.separator.join(str(k) for k in keys)})
+        req = prepare_request(self.plan, ctx)
+        if self.keys_in_body:
+            req.json_body = {**(req.json_body or {}), self.keys_in_body: keys}
+            req.data_body = None
+        with adeadline(self.plan.deadline, self.name):
+            resp = await _asend(req)
+            mode, payload = decode_response(req, resp)
+        if self.items_path is not None:
+            payload = self.items_path(payload)
+        if mode != "json" or not isinstance(payload, list):
+            raise ValueError(f"{self.name}: resposta em lote deve ser uma lista JSON (veja batch.items_path)")
+        out = {}
+        for item in payload:
+            k = self.key_path(item)
+            if isinstance(k, (str, int, float)) and (skey := self._norm(k)) is not None:
+                out.setdefault(skey, item)
+        return out, resp.headers
+
+def _settle(futs: List[asyncio.Future], result: Any = None, error: Optional[BaseException] = None):
+    for f in futs:
+        if f.done():  # chamador cancelado
+            continue
+        if error is not None:
+            f.set_exception(error)
+        else:
+            f.set_result(result)
+
+def batch_stats() -> Dict[str, Dict[str, int]]:
+    return {name: dict(s) for name, s in _STATS.items()}
+
+def make_batcher(name: str, defn: dict, single_plan) -> Optional[Batcher]:
+    """Batcher da definição (None sem bloco 'batch'); só no modo async."""
+    cfg = defn.get("batch")
+    if not cfg:
+        return None
+    if not settings.HTTP_ASYNC:
+        # handlers sync rodam um de cada vez: não há o que agrupar
+        warn(f"{name}: batch ignorado com HTTP_ASYNC=false")
+        return None
+    return Batcher(name, cfg, single_plan, (defn.get("args") or {}).get(cfg.get("arg")))
@@ -0,0 +1,216 @@
+from __future__ import annotations
+
+import os
+import time
+import uuid
+import tempfile
+import threading
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+
+import anyio
+
+from .settings import settings
+from .shared_state import shared_store
+from .utils import debug, warn
+
+# =========================
+# Corpos grandes em disco ("response": "stream")
+# =========================
+# O corpo do upstream é lido em chunks para um SpooledTemporaryFile (em memória
+# até spool_bytes, depois em disco) com teto max_bytes. Corpos até inline_bytes
+# voltam inteiros; acima disso viram um blob servido em partes pelo resource
+# template blob://{blob_id}/{index}, lidas com os.pread (memória O(chunk)).
+# Com SHARED_STATE_FILE (vários workers) os metadados do blob vão para o store compartilhado:
+# um worker que não criou o blob abre o mesmo arquivo (só leitura; quem remove é o dono).
+
+BLOB_URI = "blob://{blob_id}/{index}"
+
+def stream_options(stream_cfg: Any) -> Dict[str, Any]:
+    """Mescla o bloco 'stream' do http_cfg (ou true) com os defaults de settings."""
+    cfg = stream_cfg if isinstance(stream_cfg, dict) else {}
+    return {
+        "max_bytes": int(cfg.get("max_bytes", settings.STREAM_MAX_BYTES)),
+        "chunk_bytes": int(cfg.get("chunk_bytes", settings.STREAM_CHUNK_BYTES)),
+        "inline_bytes": int(cfg.get("inline_bytes", settings.STREAM_INLINE_BYTES)),
+        "spool_bytes": int(cfg.get("spool_bytes", settings.STREAM_SPOOL_BYTES)),
+        "ttl": float(cfg.get("ttl", settings.STREAM_TTL)),
+    }
+
+class BodyTooLarge(ValueError):
+    pass
+
+class StreamedBody:
+    """Destino incremental do corpo: acumula chunks no spool respeitando max_bytes."""
+
+    def __init__(self, opts: Dict[str, Any], text: bool, encoding: Optional[str], mime: Optional[str]):
+        self.opts = opts
+        self.text = text
+        self.encoding = encoding or "utf-8"
+        self.mime = mime
+        self.size = 0
+        self.file = tempfile.SpooledTemporaryFile(max_size=opts["spool_bytes"], dir=settings.STREAM_DIR or None)
+
+    def write(self, chunk: bytes):
+        self.size += len(chunk)
+        if self.size > self.opts["max_bytes"]:
+            self.file.close()
+            raise BodyTooLarge(f"Resposta excede o limite de {self.opts['max_bytes']} bytes")
+        self.file.write(chunk)
+
+    def inline(self) -> bool:
+        return self.size <= self.opts["inline_bytes"]
+
+    def read_all(self) -> "str | bytes":
+        """Só para corpos pequenos (inline) ou consumidores que precisam do texto inteiro."""
+        self.file.seek(0)
+        data = self.file.read()
+        self.file.close()
+        return data.decode(self.encoding, errors="replace") if self.text else data
+
+    def close(self):
+        self.file.close()
+
+@dataclass
+class Blob:
+    id: str
+    path: str
+    fd: int
+    size: int
+    chunk_bytes: int
+    text: bool
+    encoding: str
+    mime: Optional[str]
+    expires: float
+    owner: bool = True  # False: aberto a partir do store compartilhado (outro worker o criou)
+
+    @property
+    def chunks(self) -> int:
+        return max((self.size + self.chunk_bytes - 1) // self.chunk_bytes, 1)
+
+    def manifest(self) -> Dict[str, Any]:
+        return {
+            "blob_id": self.id,
+            "size": self.size,
+            "chunk_bytes": self.chunk_bytes,
+            "chunks": self.chunks,
+            "mime_type": self.mime,
+            "chunk_uri": BLOB_URI.replace("{blob_id}", self.id),
+            "expires_in": max(int(self.expires - time.time()), 0),
+        }
+
+_BLOBS: dict[str, Blob] = {}
+_LOCK = threading.Lock()
+
+def store_blob(body: StreamedBody) -> Blob:
+    """Move o spool para um arquivo nomeado e registra o blob (expira em ttl)."""
+    sweep_blobs()
+    fd, path = tempfile.mkstemp(prefix="mcp-blob-", dir=settings.STREAM_DIR or None)
+    body.file.seek(0)
+    while True:
+        chunk = body.file.read(body.opts["chunk_bytes"])
+        if not chunk:
+            break
+        os.write(fd, chunk)
+    body.close()
+    blob = Blob(
+        id=uuid.uuid4().hex, path=path, fd=fd, size=body.size, chunk_bytes=body.opts["chunk_bytes"],
+        text=body.text, encoding=body.encoding, mime=body.mime, expires=time.time() + body.opts["ttl"],
+    )
+    with _LOCK:
+        _BLOBS[blob.id] = blob
+    store = shared_store()
+    if store is not None:
+        store.put("blob", blob.id, (path, blob.size, blob.chunk_bytes, blob.text, blob.encoding, blob.mime,
+                                    blob.expires), blob.expires - time.time())
+    debug("blob: %s (%d bytes, %d partes)", blob.id, blob.size, blob.chunks)
+    return blob
+
+def _open_shared(blob_id: str) -> Optional[Blob]:
+    store = shared_store()
+    value = store.get("blob", blob_id) if store is not None else None
+    if value is None:
+        return None
+    path, size, chunk_bytes, text, encoding, mime, expires = value
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return None  # o dono já removeu
+    blob = Blob(id=blob_id, path=path, fd=fd, size=size, chunk_bytes=chunk_bytes, text=text,
+                encoding=encoding, mime=mime, expires=expires, owner=False)
+    with _LOCK:
+        current = _BLOBS.setdefault(blob_id, blob)
+    if current is not blob:
+        os.close(fd)
+    return current
+
+def _utf8_start(fd: int, off: int, size: int) -> int:
+    """Avança off até o início de um caractere UTF-8 (pula bytes de continuação)."""
+    while 0 < off < size:
+        b = os.pread(fd, 1, off)
+        if not b or (b[0] & 0xC0) != 0x80:
+            break
+        off += 1
+    return off
+
+def read_blob_chunk(blob_id: str, index: int) -> "str | bytes":
+    blob = _BLOBS.get(blob_id) or _open_shared(blob_id)
+    if blob is None or time.time() >= blob.expires:
+        raise ValueError(f"blob '{blob_id}' inexistente ou expirado")
+    if index < 0 or index >= blob.chunks:
+        raise ValueError(f"blob '{blob_id}': parte {index} fora do intervalo (0..{blob.chunks - 1})")
+    start = index * blob.chunk_bytes
+    end = min(start + blob.chunk_bytes, blob.size)
+    if blob.text:
+        # fronteiras determinísticas alinhadas a caracteres: as partes não se sobrepõem
+        start = _utf8_start(blob.fd, start, blob.size)
+        end = _utf8_start(blob.fd, end, blob.size)
+        return os.pread(blob.fd, end - start, start).decode(blob.encoding, errors="replace")
+    return os.pread(blob.fd, end - start, start)
+
+async def aread_blob_chunk(blob_id: str, index: int) -> "str | bytes":
+    """read_blob_chunk para o handler async: blob de outro worker é aberto fora do event loop."""
+    if blob_id not in _BLOBS and shared_store() is not None:
+        return await anyio.to_thread.run_sync(read_blob_chunk, blob_id, index)
+    return read_blob_chunk(blob_id, index)
+
+def _remove(blob: Blob):
+    try:
+        os.close(blob.fd)
+        if blob.owner:
+            os.unlink(blob.path)
+    except OSError as e:
+        warn(f"blob: erro ao remover {blob.path}: {e}")
+
+def sweep_blobs():
+    now = time.time()
+    with _LOCK:
+        expired = [b for b in _BLOBS.values() if now >= b.expires]
+        for b in expired:
+            _BLOBS.pop(b.id, None)
+    for b in expired:
+        _remove(b)
+
+def close_blobs():
+    """Remove todos os blobs (shutdown)."""
+    with _LOCK:
+        blobs = list(_BLOBS.values())
+        _BLOBS.clear()
+    for b in blobs:
+        _remove(b)
+
+_REGISTERED = False
+
+def register_blob_resource(mcp):
+    """Registra (uma vez) o resource template que serve as partes dos blobs."""
+    global _REGISTERED
+    if _REGISTERED:
+        return
+    _REGISTERED = True
+
+    async def _blob_chunk(blob_id: str, index: str):
+        return await aread_blob_chunk(blob_id, int(index))
+
+    mcp.resource(BLOB_URI, description="Parte de uma resposta grande (response=stream)",
+                 mime_type="application/octet-stream")(_blob_chunk)
+    debug(f"  Resource: {BLOB_URI} (partes de respostas stream)")
@@ -0,0 +1,175 @@
+from __future__ import annotations
+
+import os
+import sys
+import time
+import marshal
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from mcp import types
+from mcp.shared.exceptions import McpError
+from mcp.server.fastmcp.tools import Tool
+
+from .settings import settings
+from .metrics import instrument
+from .utils import debug, info, warn
+
+# =========================
+# Catálogo de tools compacto e preguiçoso (CATALOG_LAZY=true)
+# =========================
+# Registrar uma tool no FastMCP (Tool.from_function) cria um modelo pydantic e gera o
+# JSON schema por tool: com milhares de tools isso domina a inicialização e a memória.
+# Aqui cada tool vira um _Record (__slots__) com a definição original; o schema de entrada
+# é montado direto do "args" e a Tool do FastMCP só é materializada na primeira chamada.
+#   tools/list     paginado (TOOLS_PAGE_SIZE por página, nextCursor)
+#   CATALOG_SNAPSHOT=arquivo   definições já validadas + schemas em formato marshal; se o
+#                  tools.json não mudou, a próxima inicialização carrega direto dele.
+
+_JSON_TYPES = {"int": "integer", "float": "number", "bool": "boolean", "str": "string"}
+SNAPSHOT_VERSION = 1
+
+class _Record:
+    __slots__ = ("name", "description", "defn", "schema", "listed")
+
+    def __init__(self, name: str, description: str, defn: dict, schema: Optional[dict] = None):
+        self.name = sys.intern(name)
+        self.description = description
+        self.defn = defn
+        self.schema = schema
+        self.listed: Optional[types.Tool] = None
+
+    def input_schema(self) -> dict:
+        if self.schema is None:
+            self.schema = input_schema(self.defn.get("args") or {})
+        return self.schema
+
+    def as_mcp(self) -> types.Tool:
+        if self.listed is None:
+            self.listed = types.Tool(name=self.name, description=self.description, inputSchema=self.input_schema())
+        return self.listed
+
+def input_schema(arg_spec: Dict[str, str]) -> dict:
+    """Mesmo schema que o FastMCP gera para os handlers (args keyword-only, todos obrigatórios)."""
+    props = {
+        k: {"title": k.replace("_", " ").title(), "type": _JSON_TYPES.get(str(t).lower(), "string")}
+        for k, t in arg_spec.items()
+    }
+    schema: Dict[str, Any] = {"properties": props, "title": "_implArguments", "type": "object"}
+    if props:
+        schema["required"] = list(props)
+    return schema
+
+_RECORDS: Dict[str, _Record] = {}
+_BUILDER: Optional[Callable[[dict], Tuple[str, str, Callable]]] = None
+_MCP = None
+
+class _LazyTools(dict):
+    """Dict de tools do ToolManager que materializa a Tool do FastMCP no primeiro acesso."""
+
+    def get(self, name, default=None):
+        tool = dict.get(self, name)
+        if tool is None and name in _RECORDS:
+            tool = _materialize(_RECORDS[name])
+        return default if tool is None else tool
+
+    def __contains__(self, name) -> bool:
+        return dict.__contains__(self, name) or name in _RECORDS
+
+def _materialize(rec: _Record) -> Tool:
+    started = time.perf_counter()
+    name, description, fn = _BUILDER(rec.defn)
+    tool = Tool.from_function(instrument("tool", name, fn), name=name, description=description)
+    dict.__setitem__(_MCP._tool_manager._tools, name, tool)
+    debug("catalog: tool '%s' materializada em %.1f ms", name, (time.perf_counter() - started) * 1000)
+    return tool
+
+def install_catalog(mcp, builder: Callable[[dict], Tuple[str, str, Callable]]):
+    """Troca o dict de tools do FastMCP e o handler de tools/list (paginado)."""
+    global _BUILDER, _MCP
+    if _MCP is not None:
+        return
+    _BUILDER, _MCP = builder, mcp
+    manager = mcp._tool_manager
+    manager._tools = _LazyTools(manager._tools)
+    mcp._mcp_server.list_tools()(_list_tools)
+
+def add_tool(name: str, description: str, defn: dict, schema: Optional[dict] = None):
+    _RECORDS.pop(name, None)
+    _RECORDS[name] = _Record(name, description, defn, schema)
+
+def remove_tool(name: str):
+    _RECORDS.pop(name, None)
+    if _MCP is not None:
+        dict.pop(_MCP._tool_manager._tools, name, None)
+        _MCP._mcp_server._tool_cache.pop(name, None)  # schema cacheado pelo servidor low-level
+
+def catalog_size() -> int:
+    return len(_RECORDS)
+
+# ---------- tools/list paginado
+def _eager_tool(t: Tool) -> types.Tool:
+    return types.Tool(name=t.name, title=t.title, description=t.description, inputSchema=t.parameters,
+                      outputSchema=t.output_schema, annotations=t.annotations, icons=t.icons, _meta=t.meta)
+
+async def _list_tools(req: types.ListToolsRequest) -> types.ListToolsResult:
+    # catálogo primeiro (ordem do arquivo), depois tools registradas direto no FastMCP
+    names = list(_RECORDS)
+    names += [n for n in dict.keys(_MCP._tool_manager._tools) if n not in _RECORDS]
+    page = settings.TOOLS_PAGE_SIZE
+    cursor = req.params.cursor if req is not None and req.params is not None else None
+    if req is None or page <= 0:
+        # req None: o servidor low-level atualizando o cache de schemas numa chamada
+        start, end = 0, len(names)
+    else:
+        try:
+            start = int(cursor) if cursor else 0
+        except ValueError:
+            raise McpError(types.ErrorData(code=types.INVALID_PARAMS, message=f"cursor inválido: {cursor}"))
+        end = start + page
+    tools = []
+    for n in names[start:end]:
+        rec = _RECORDS.get(n)
+        if rec is not None:
+            tools.append(rec.as_mcp())
+        else:
+            tools.append(_eager_tool(dict.__getitem__(_MCP._tool_manager._tools, n)))
+    return types.ListToolsResult(tools=tools, nextCursor=str(end) if end < len(names) else None)
+
+# =========================
+# Snapshot (definições validadas + schemas, marshal)
+# =========================
+def _source_id(source: str) -> Tuple:
+    st = os.stat(source)
+    return (os.path.abspath(source), st.st_size, st.st_mtime_ns)
+
+def read_snapshot(path: str, source: str) -> Optional[List[Tuple[str, str, dict, dict]]]:
+    """Entradas (nome, descrição, definição, schema) se o snapshot corresponde ao arquivo atual."""
+    try:
+        with open(path, "rb") as f:
+            header, entries = marshal.loads(f.read())  # marshal.load(f) lê o arquivo aos pedaços
+    except FileNotFoundError:
+        return None
+    except (OSError, EOFError, ValueError, TypeError) as e:
+        warn(f"catalog: snapshot {path} ilegível ({e}); recarregando de {source}")
+        return None
+    expected = (SNAPSHOT_VERSION, tuple(sys.version_info[:2]), _source_id(source))
+    if tuple(header) != expected:
+        debug(f"catalog: snapshot {path} desatualizado; recarregando de {source}")
+        return None
+    return entries
+
+def write_snapshot(path: str, source: str):
+    entries = [(r.name, r.description, r.defn, r.input_schema()) for r in _RECORDS.values()]
+    header = (SNAPSHOT_VERSION, tuple(sys.version_info[:2]), _source_id(source))
+    tmp = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp, "wb") as f:
+            f.write(marshal.dumps((header, entries)))
+        os.replace(tmp, path)  # atômico: outro processo nunca lê um snapshot pela metade
+        info(f"catalog: snapshot com {len(entries)} tools gravado em {path}")
+    except (OSError, ValueError) as e:
+        warn(f"catalog: não foi possível gravar o snapshot {path}: {e}")
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
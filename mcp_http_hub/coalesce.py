@@ -0,0 +1,96 @@
+from __future__ import annotations
+
+import asyncio
+import threading
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+from .deadlines import spawn, abort
+
+# =========================
+# Coalescência de requisições idênticas ("coalesce": true dentro de "http")
+# =========================
+# Chamadas concorrentes com a mesma requisição resolvida (método, url, query,
+# headers, auth) compartilham uma única ida ao upstream: a primeira executa,
+# as demais aguardam o mesmo resultado (ou a mesma exceção). Nada fica guardado
+# depois que a chamada termina; para reaproveitar resultados use "cache".
+# No modo async a ida ao upstream roda fora do prazo de quem chegou primeiro (cada chamador
+# espera dentro do próprio prazo) e é cancelada quando o último chamador desiste.
+
+COALESCE_METHODS = ("GET", "HEAD", "OPTIONS")
+
+class _Call:
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: BaseException | None = None
+
+_INFLIGHT: Dict[Hashable, _Call] = {}
+_AINFLIGHT: Dict[Hashable, asyncio.Task] = {}
+_AWAITING: Dict[asyncio.Task, int] = {}  # chamadores aguardando cada task
+_LOCK = threading.Lock()
+_STATS = {"leaders": 0, "coalesced": 0, "errors": 0, "abandoned": 0}
+
+def coalesced(key: Hashable, fn: Callable[[], Any]) -> Any:
+    """Versão sync (threads): só um fn() por chave em andamento."""
+    with _LOCK:
+        call = _INFLIGHT.get(key)
+        leader = call is None
+        if leader:
+            call = _INFLIGHT[key] = _Call()
+            _STATS["leaders"] += 1
+        else:
+            _STATS["coalesced"] += 1
+    if not leader:
+        call.done.wait()
+        if call.error is not None:
+            raise call.error
+        return call.result
+    try:
+        call.result = fn()
+        return call.result
+    except BaseException as e:
+        call.error = e
+        _STATS["errors"] += 1
+        raise
+    finally:
+        with _LOCK:
+            _INFLIGHT.pop(key, None)
+        call.done.set()
+
+def _consume(task: asyncio.Task):
+    # evita "exception was never retrieved" quando todos os chamadores foram cancelados
+    if not task.cancelled() and task.exception() is not None:
+        _STATS["errors"] += 1
+
+async def acoalesced(key: Hashable, factory: Callable[[], Awaitable[Any]]) -> Any:
+    """
+    Versão asyncio: a requisição roda numa task própria e cada chamador a
+    aguarda via shield, então cancelar quem chegou primeiro não derruba os demais;
+    sem ninguém aguardando, a task é cancelada (libera a conexão).
+    """
+    task = _AINFLIGHT.get(key)
+    if task is None:
+        _STATS["leaders"] += 1
+        task = spawn(factory(), detached=True)
+        _AINFLIGHT[key] = task
+        task.add_done_callback(lambda t: _AINFLIGHT.pop(key, None) if _AINFLIGHT.get(key) is t else None)
+        task.add_done_callback(_consume)
+    else:
+        _STATS["coalesced"] += 1
+    _AWAITING[task] = _AWAITING.get(task, 0) + 1
+    try:
+        return await asyncio.shield(task)
+    finally:
+        left = _AWAITING.pop(task) - 1
+        if left:
+            _AWAITING[task] = left
+        elif not task.done():
+            _STATS["abandoned"] += 1
+            if _AINFLIGHT.get(key) is task:  # quem chegar agora não pega carona numa task cancelada
+                del _AINFLIGHT[key]
+            abort(task)
+
+def coalesce_stats() -> Dict[str, int]:
+    return {**_STATS, "in_flight": len(_INFLIGHT) + len(_AINFLIGHT)}
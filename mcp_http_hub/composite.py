@@ -0,0 +1,195 @@
+from __future__ import annotations
+
+import asyncio
+import contextvars
+from collections import ChainMap
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
+from .http_client import http_call, http_call_async, compile_http
+from .deadlines import deadline, adeadline, deadline_for, spawn, abort
+from .utils import args_ctx, debug
+
+# =========================
+# Tools compostas ("steps" no lugar de "http")
+# =========================
+#   {
+#     "name": "coffee-overview",
+#     "args": { "id": "int" },
+#     "max_concurrency": 4,
+#     "steps": [
+#       { "id": "item",  "http": { "url": "https://api.example.com/coffee/{id}" } },
+#       { "id": "stock", "http": { "url": "https://stock.example.com/{id}" }, "on_error": "continue" },
+#       { "id": "origin", "http": { "url": "https://geo.example.com/{item[origin]}" } }
+#     ]
+#   }
+# Passos independentes rodam em paralelo (até max_concurrency). Um passo que
+# referencia outro ({item[origin]}) ou lista-o em "depends_on" espera por ele.
+# O resultado é {id_do_passo: payload}; passos com "output": false ficam de fora.
+# on_error: "fail" (default) derruba a tool; "continue" registra em "errors"
+# e os passos que dependem dele são pulados.
+# "deadline" (s; default CALL_DEADLINE) é o prazo da tool inteira: cada passo ainda respeita o
+# "deadline" do próprio http, mas nenhum passa do prazo da tool.
+
+ON_ERROR = ("fail", "continue")
+
+class Step:
+    __slots__ = ("id", "plan", "deps", "on_error", "output")
+
+    def __init__(self, cfg: dict, plan):
+        self.id = cfg["id"]
+        self.plan = plan
+        self.deps: List[str] = []
+        self.on_error = (cfg.get("on_error") or "fail").lower()
+        self.output = cfg.get("output", True)
+
+class StepFailed(RuntimeError):
+    pass
+
+class CompositePlan:
+    """Passos compilados e ordenados topologicamente no load."""
+
+    def __init__(self, name: str, defn: dict):
+        self.name = name
+        self.max_concurrency = max(int(defn.get("max_concurrency", 4)), 1)
+        self.deadline = deadline_for(defn.get("deadline"))
+        steps: Dict[str, Step] = {}
+        raw = defn.get("steps") or []
+        for cfg in raw:
+            if not cfg.get("id") or not cfg.get("http"):
+                raise ValueError(f"{name}: cada passo requer 'id' e 'http'")
+            if cfg["id"] in steps:
+                raise ValueError(f"{name}: passo '{cfg['id']}' duplicado")
+            step = Step(cfg, compile_http(cfg["http"]))
+            if step.on_error not in ON_ERROR:
+                raise ValueError(f"{name}.{step.id}: on_error deve ser {' ou '.join(ON_ERROR)}")
+            steps[step.id] = step
+        for cfg in raw:
+            step = steps[cfg["id"]]
+            explicit = cfg.get("depends_on") or []
+            for d in explicit:
+                if d not in steps:
+                    raise ValueError(f"{name}.{step.id}: depends_on '{d}' não existe")
+            # placeholders que apontam para outro passo viram dependência
+            implicit = [p for p in step.plan.placeholders if p in steps and p != step.id]
+            step.deps = list(dict.fromkeys([*explicit, *implicit]))
+        self.steps = _toposort(name, steps)
+        # níveis: passos de um mesmo nível não dependem entre si (usado no modo sync)
+        level: Dict[str, int] = {}
+        for s in self.steps:
+            level[s.id] = 1 + max((level[d] for d in s.deps), default=-1)
+        self.levels: List[List[Step]] = []
+        for s in self.steps:
+            if level[s.id] == len(self.levels):
+                self.levels.append([])
+            self.levels[level[s.id]].append(s)
+
+def _toposort(name: str, steps: Dict[str, Step]) -> List[Step]:
+    out: List[Step] = []
+    state: Dict[str, int] = {}  # 1 = visitando, 2 = feito
+
+    def visit(sid: str, trail: tuple):
+        if state.get(sid) == 2:
+            return
+        if state.get(sid) == 1:
+            raise ValueError(f"{name}: dependência circular entre passos: {' -> '.join(trail + (sid,))}")
+        state[sid] = 1
+        for d in steps[sid].deps:
+            visit(d, trail + (sid,))
+        state[sid] = 2
+        out.append(steps[sid])
+
+    for sid in steps:
+        visit(sid, ())
+    return out
+
+def _payload(mode: str, payload: Any) -> Any:
+    return payload.manifest() if mode == "stream" else payload
+
+def _step_ctx(ctx, results: Dict[str, Any]):
+    # saídas dos passos anteriores (objetos JSON) por cima de args + env
+    return ChainMap(results, ctx) if results else ctx
+
+def _blocked(step: Step, errors: Dict[str, str]) -> Optional[str]:
+    failed = [d for d in step.deps if d in errors]
+    return f"dependência(s) com erro: {', '.join(failed)}" if failed else None
+
+def _merge(plan: CompositePlan, results: Dict[str, Any], errors: Dict[str, str]) -> Dict[str, Any]:
+    out = {s.id: results.get(s.id) for s in plan.steps if s.output}
+    if errors:
+        out["errors"] = errors
+    return out
+
+async def run_composite_async(plan: CompositePlan, args: Dict[str, Any]) -> Dict[str, Any]:
+    with adeadline(plan.deadline, plan.name):
+        return await _run_async(plan, args)
+
+async def _run_async(plan: CompositePlan, args: Dict[str, Any]) -> Dict[str, Any]:
+    ctx = args_ctx(args)
+    sem = asyncio.Semaphore(plan.max_concurrency)
+    results: Dict[str, Any] = {}
+    errors: Dict[str, str] = {}
+    tasks: Dict[str, asyncio.Task] = {}
+
+    async def run(step: Step):
+        if step.deps:
+            # asyncio.wait (e não gather): cancelar este passo não cancela as dependências por fora
+            deps = [tasks[d] for d in step.deps]
+            await asyncio.wait(deps)
+            if any(t.cancelled() or t.exception() is not None for t in deps):
+                return  # dependência derrubou a tool
+        reason = _blocked(step, errors)
+        if reason:
+            errors[step.id] = reason
+            return
+        try:
+            async with sem:
+                results[step.id] = _payload(*await http_call_async(step.plan, _step_ctx(ctx, results)))
+        except Exception as e:
+            if step.on_error == "fail":
+                raise StepFailed(f"{plan.name}: passo '{step.id}' falhou: {e}") from e
+            errors[step.id] = str(e)
+            debug("composite: %s.%s falhou (continue): %s", plan.name, step.id, e)
+
+    for step in plan.steps:  # ordem topológica: dependências já têm task
+        tasks[step.id] = spawn(run(step))
+    try:
+        done, _ = await asyncio.wait(tasks.values(), return_when=asyncio.FIRST_EXCEPTION)
+        for t in tasks.values():  # primeiro erro na ordem dos passos
+            if t in done and not t.cancelled() and t.exception() is not None:
+                raise t.exception()
+    finally:
+        # prazo, cancelamento ou passo com erro: os demais param e devolvem a conexão
+        for t in tasks.values():
+            if not t.done():
+                abort(t)
+    return _merge(plan, results, errors)
+
+def run_composite(plan: CompositePlan, args: Dict[str, Any]) -> Dict[str, Any]:
+    """Modo sync: nível a nível, cada nível em paralelo num pool de threads."""
+    with deadline(plan.deadline, plan.name):
+        return _run_sync(plan, args)
+
+def _run_sync(plan: CompositePlan, args: Dict[str, Any]) -> Dict[str, Any]:
+    ctx = args_ctx(args)
+    results: Dict[str, Any] = {}
+    errors: Dict[str, str] = {}
+
+    def run(step: Step):
+        reason = _blocked(step, errors)
+        if reason:
+            errors[step.id] = reason
+            return
+        try:
+            results[step.id] = _payload(*http_call(step.plan, _step_ctx(ctx, dict(results))))
+        except Exception as e:
+            if step.on_error == "fail":
+                raise StepFailed(f"{plan.name}: passo '{step.id}' falhou: {e}") from e
+            errors[step.id] = str(e)
+
+    with ThreadPoolExecutor(max_workers=plan.max_concurrency) as pool:
+        for level in plan.levels:
+            # cada passo no contexto de quem chamou (prazo da tool); um Context por thread
+            for f in [pool.submit(contextvars.copy_context().run, run, s) for s in level]:
+                f.result()
+    return _merge(plan, results, errors)
@@ -0,0 +1,268 @@
+from __future__ import annotations
+
+import time
+import asyncio
+import inspect
+import functools
+import contextvars
+from contextlib import contextmanager
+from typing import Any, Awaitable, Callable, Dict, Optional, Set
+
+import anyio
+import httpx
+
+from .settings import settings
+from .utils import debug
+
+# =========================
+# Prazo por chamada ("deadline" / CALL_DEADLINE)
+# =========================
+#   "http": { "url": "...", "deadline": 8 }            por definição http (default CALL_DEADLINE)
+#   { "name": "...", "steps": [...], "deadline": 20 }   tool composta: vale para todos os passos
+# Um orçamento único por chamada, dividido entre token oauth2, fila dos limites, tentativas
+# (retries e o reenvio após 401) e leitura do corpo. Antes cada envio tinha o próprio timeout e
+# token + 1ª tentativa + reenvio podiam somar 3x HTTP_TIMEOUT.
+# O prazo é absoluto (monotonic) e fica num ContextVar: escopos aninhados só encurtam, nunca
+# estendem. Os timeouts connect/read/write/pool de cada envio são limitados ao que resta e um
+# retry cujo backoff não cabe no resto não é tentado. No modo async o escopo também cancela o que
+# estiver esperando (fila, lock do token, corpo); no sync valem os timeouts por fase e as checagens
+# entre as etapas. Respostas "stream" só têm prazo com "deadline" explícito no bloco http.
+# Tarefas em background (revalidação do cache, refresh do token, lotes, coalescência) rodam fora
+# do prazo de quem as disparou (detached_context).
+
+_DEADLINE: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar("hub_deadline", default=None)
+_STATS = {"exceeded": 0, "retries_skipped": 0, "disconnects": 0}
+
+class DeadlineExceeded(TimeoutError):
+    pass
+
+def deadline_for(value: Any, explicit_only: bool = False) -> Optional[float]:
+    """Segundos do "deadline" da definição (ausente: CALL_DEADLINE); None = sem prazo próprio."""
+    if value is None:
+        if explicit_only:
+            return None
+        value = settings.CALL_DEADLINE
+    value = float(value)
+    return value if value > 0 else None
+
+def remaining() -> float:
+    """Segundos até o prazo da chamada atual (inf sem prazo)."""
+    d = _DEADLINE.get()
+    return float("inf") if d is None else d - time.monotonic()
+
+def expired() -> bool:
+    return remaining() <= 0
+
+def _exceeded(what: str) -> DeadlineExceeded:
+    _STATS["exceeded"] += 1
+    debug("deadline: prazo esgotado em %s", what)
+    return DeadlineExceeded(f"prazo da chamada esgotado ({what})" if what else "prazo da chamada esgotado")
+
+def check_deadline(what: str = ""):
+    if expired():
+        raise _exceeded(what)
+
+def _tighten(seconds: Optional[float]) -> Optional[contextvars.Token]:
+    if seconds is None:
+        return None
+    new = time.monotonic() + seconds
+    current = _DEADLINE.get()
+    if current is not None and current <= new:
+        return None  # o prazo de fora já é mais curto
+    return _DEADLINE.set(new)
+
+@contextmanager
+def deadline(seconds: Optional[float], what: str = ""):
+    """Escopo sync: timeout de fase cortado pelo prazo vira DeadlineExceeded."""
+    token = _tighten(seconds)
+    try:
+        yield
+    except httpx.TimeoutException as e:
+        if expired():
+            raise _exceeded(what) from e
+        raise
+    finally:
+        if token is not None:
+            _DEADLINE.reset(token)
+
+@contextmanager
+def adeadline(seconds: Optional[float], what: str = ""):
+    """Escopo async: como deadline(), e cancela o que estiver em andamento quando o prazo vence."""
+    token = _tighten(seconds)
+    left = remaining()
+    if left == float("inf"):
+        yield
+        return
+    cancelled = False
+    try:
+        with anyio.CancelScope(deadline=anyio.current_time() + left) as scope:
+            yield
+        cancelled = scope.cancelled_caught
+    except httpx.TimeoutException as e:
+        if expired():
+            raise _exceeded(what) from e
+        raise
+    finally:
+        if token is not None:
+            _DEADLINE.reset(token)
+    if cancelled:
+        raise _exceeded(what)
+
+def detached_context() -> contextvars.Context:
+    """Contexto para tasks em background: cópia do atual, sem o prazo da chamada."""
+    ctx = contextvars.copy_context()
+    ctx.run(_DEADLINE.set, None)
+    return ctx
+
+def clamp_timeout(timeout: httpx.Timeout) -> httpx.Timeout:
+    """Timeout por fase limitado ao que resta do prazo."""
+    left = remaining()
+    if left == float("inf"):
+        return timeout
+    if left <= 0:
+        raise _exceeded("antes do envio")
+
+    def _min(v: Optional[float]) -> float:
+        return left if v is None else min(v, left)
+
+    return httpx.Timeout(connect=_min(timeout.connect), read=_min(timeout.read),
+                         write=_min(timeout.write), pool=_min(timeout.pool))
+
+def retry_fits(delay: float) -> bool:
+    """Se ainda cabe esperar delay s e tentar de novo."""
+    if delay < remaining():
+        return True
+    _STATS["retries_skipped"] += 1
+    return False
+
+# =========================
+# Tasks abortáveis (hedge, passos de tool composta, coalescência, lotes)
+# =========================
+# task.cancel() direto interrompe o httpcore no meio da limpeza e a conexão fica presa como
+# ACTIVE no pool; cancelar pelo cancel scope do anyio deixa o httpcore fechá-la (blindado).
+_SCOPES: Dict[asyncio.Task, anyio.CancelScope] = {}
+
+def spawn(coro: Awaitable[Any], detached: bool = False) -> asyncio.Task:
+    """Task que abort() cancela devolvendo a conexão; detached: fora do prazo de quem criou."""
+    scope = anyio.CancelScope()
+
+    async def _run():
+        with scope:
+            return await coro
+        raise asyncio.CancelledError()
+
+    task = asyncio.get_running_loop().create_task(_run(), context=detached_context() if detached else None)
+    _SCOPES[task] = scope
+    task.add_done_callback(_forget)
+    return task
+
+def _forget(task: asyncio.Task):
+    _SCOPES.pop(task, None)
+
+def abort(task: asyncio.Task):
+    scope = _SCOPES.get(task)
+    if scope is not None:
+        scope.cancel()
+    else:
+        task.cancel()
+
+# =========================
+# Cancelamento quando o cliente desconecta (CANCEL_ON_DISCONNECT)
+# =========================
+# O transporte streamable-http não cancela o handler quando o cliente fecha a conexão: a ida ao
+# upstream seguia até o fim, ocupando conexão do pool e vaga dos limites. DisconnectWatcher
+# (middleware ASGI em volta do app) acompanha cada POST depois de lido o corpo; se o cliente sair
+# antes da resposta, cancela os handlers async daquela requisição, o que aborta o envio httpx em
+# andamento e devolve a conexão. notifications/cancelled do MCP já cancela o handler pelo SDK.
+# Handlers sync (HTTP_ASYNC=false) não são interrompidos.
+
+_CALLS_KEY = "hub.calls"
+
+class ClientDisconnected(RuntimeError):
+    pass
+
+class _Calls:
+    """Cancel scopes dos handlers em andamento de uma requisição HTTP."""
+    __slots__ = ("scopes", "gone")
+
+    def __init__(self):
+        self.scopes: Set[anyio.CancelScope] = set()
+        self.gone = False
+
+    def cancel(self):
+        self.gone = True
+        if self.scopes:
+            _STATS["disconnects"] += len(self.scopes)
+            debug("deadline: cliente desconectou; cancelando %d chamada(s)", len(self.scopes))
+        for scope in list(self.scopes):
+            scope.cancel()
+
+class DisconnectWatcher:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "POST":
+            await self.app(scope, receive, send)
+            return
+        calls = scope[_CALLS_KEY] = _Calls()
+        watching = finished = False
+
+        async def _watch():
+            while (await receive())["type"] != "http.disconnect":
+                pass
+            if not finished:  # uvicorn também devolve http.disconnect depois da resposta completa
+                calls.cancel()
+
+        async with anyio.create_task_group() as tg:
+            async def _receive():
+                nonlocal watching
+                message = await receive()
+                if not watching and message["type"] == "http.request" and not message.get("more_body"):
+                    watching = True  # corpo lido: o próximo evento só pode ser a desconexão
+                    tg.start_soon(_watch)
+                return message
+
+            async def _send(message):
+                nonlocal finished
+                if message["type"] == "http.response.body" and not message.get("more_body"):
+                    finished = True
+                await send(message)
+
+            try:
+                await self.app(scope, _receive, _send)
+            finally:
+                tg.cancel_scope.cancel()
+
+def _current_calls() -> Optional[_Calls]:
+    from mcp.server.lowlevel.server import request_ctx
+    try:
+        request = request_ctx.get().request
+    except LookupError:
+        return None
+    scope = getattr(request, "scope", None)
+    return scope.get(_CALLS_KEY) if scope is not None else None
+
+def cancel_on_disconnect(fn: Callable) -> Callable:
+    """Handler async cancelável pela desconexão do cliente (sync volta como está)."""
+    if not settings.CANCEL_ON_DISCONNECT or not inspect.iscoroutinefunction(fn):
+        return fn
+
+    @functools.wraps(fn)
+    async def wrapper(*args, **kwargs):
+        calls = _current_calls()
+        if calls is None:
+            return await fn(*args, **kwargs)
+        if not calls.gone:
+            with anyio.CancelScope() as scope:
+                calls.scopes.add(scope)
+                try:
+                    return await fn(*args, **kwargs)
+                finally:
+                    calls.scopes.discard(scope)
+        raise ClientDisconnected("cliente desconectou; chamada cancelada")
+    return wrapper
+
+def deadline_stats() -> Dict[str, Any]:
+    return {"call_deadline_s": settings.CALL_DEADLINE, "cancel_on_disconnect": settings.CANCEL_ON_DISCONNECT,
+            **_STATS}
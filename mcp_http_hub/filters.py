@@ -0,0 +1,398 @@
+from __future__ import annotations
+
+import re
+import json
+import heapq
+import itertools
+from typing import Any, Callable, Iterable, Iterator, List, Optional, Tuple
+
+from .templates import compile_obj, render_obj
+
+# =========================
+# Filtros de resposta JSON (bloco "filter" dentro de "http")
+# =========================
+#   "filter": {
+#     "path": "data.items",                        # onde está a lista (default: raiz; "$", "$.a[*]" também)
+#     "where_contains": {"title": "{q}"},          # substring, sem diferenciar maiúsculas
+#     "where": {
+#       "meta.origin": "{origin}",                 # atalho para eq
+#       "price": {"gte": "{min}", "lt": 10},       # eq ne gt gte lt lte in nin contains regex exists
+#       "title": {"regex": "^cof", "ignore_case": true}
+#     },
+#     "distinct": "meta.origin",                   # true (item inteiro) | campo | [campos]
+#     "sort": ["-price", "id"],                    # "-" = decrescente
+#     "offset": "{offset}", "limit": 10,
+#     "select": ["id", "title", "meta.origin"]     # ou {"alias": "caminho"}
+#   }
+# Compilado uma vez no load; por chamada só os placeholders são resolvidos.
+# Predicados com valor vazio (ex.: arg opcional "") são ignorados, como no where_contains.
+# O pipeline é um iterador: sem sort/distinct, limit encerra a varredura cedo;
+# com sort + limit usa top-k (heapq) em vez de ordenar tudo.
+
+_MISSING = object()
+OPERATORS = ("eq", "ne", "gt", "gte", "lt", "lte", "in", "nin", "contains", "regex", "exists")
+
+def compile_path(path: str) -> Callable[[Any], Any]:
+    """'a.b.0.c' -> getter(item) (índices numéricos em listas); _MISSING se ausente."""
+    keys = tuple(int(p) if p.isdigit() else p for p in str(path).split("."))
+    if len(keys) == 1 and isinstance(keys[0], str):
+        key = keys[0]
+        return lambda item: item.get(key, _MISSING) if isinstance(item, dict) else _MISSING
+
+    def get(item):
+        if isinstance(item, dict) and path in item:  # chave literal com "." (compat.)
+            return item[path]
+        cur = item
+        for k in keys:
+            if isinstance(cur, dict):
+                cur = cur.get(str(k) if isinstance(k, int) else k, _MISSING)
+            elif isinstance(cur, list) and isinstance(k, int):
+                cur = cur[k] if -len(cur) <= k < len(cur) else _MISSING
+            else:
+                return _MISSING
+            if cur is _MISSING:
+                return _MISSING
+        return cur
+    return get
+
+def list_path(path: Any) -> Optional[str]:
+    """Aceita também o estilo JSONPath simples: "$[*]" -> raiz, "$.data.items[*]" -> "data.items"."""
+    p = str(path or "").strip()
+    if p.startswith("$"):
+        p = p[1:]
+    p = re.sub(r"\[(\d+)\]", r".\1", p.replace("[*]", "")).strip(".")
+    return p or None
+
+# ---------- coerção de valores vindos de template (sempre str)
+def _as_number(v: Any) -> Optional[float]:
+    if isinstance(v, bool):
+        return None
+    if isinstance(v, (int, float)):
+        return v
+    try:
+        return float(v)
+    except (TypeError, ValueError):
+        return None
+
+_TRUE = ("1", "true", "t", "yes", "y", "sim", "s")
+
+def _eq(val: Any, needle: Any, num: Optional[float]) -> bool:
+    if val is _MISSING:
+        return False
+    if not isinstance(needle, str):
+        return val == needle  # literal do JSON de config (número, bool, null)
+    # needle veio de template (str): compara no tipo do item
+    if isinstance(val, str):
+        return val == needle
+    if isinstance(val, bool):
+        return val == (needle.lower() in _TRUE)
+    if isinstance(val, (int, float)):
+        return num is not None and val == num
+    if val is None:
+        return needle in ("null", "None")
+    return str(val) == needle
+
+def _cmp_pair(val: Any, needle: Any, num: Optional[float]):
+    """(a, b) comparáveis ou None: número com número, texto com texto."""
+    if val is _MISSING or val is None or isinstance(val, bool):
+        return None
+    if isinstance(val, (int, float)):
+        return (val, num) if num is not None else None
+    if isinstance(val, str) and isinstance(needle, str):
+        return (val, needle)
+    return None
+
+_RANGE = {
+    "gt": lambda a, b: a > b,
+    "gte": lambda a, b: a >= b,
+    "lt": lambda a, b: a < b,
+    "lte": lambda a, b: a <= b,
+}
+
+def _predicate(getter, op: str, needle: Any, opts: dict) -> Optional[Callable[[Any], bool]]:
+    """Predicado já com o valor resolvido da chamada; None = ignorar (valor vazio)."""
+    if needle == "" or (needle is None and op not in ("eq", "ne")):
+        return None
+    if op == "exists":
+        want = needle if isinstance(needle, bool) else str(needle).lower() in _TRUE
+        return lambda item: (getter(item) is not _MISSING) == want
+    if op in ("eq", "ne"):
+        num = _as_number(needle) if isinstance(needle, str) else None
+        if op == "eq":
+            return lambda item: _eq(getter(item), needle, num)
+        return lambda item: not _eq(getter(item), needle, num)
+    if op in _RANGE:
+        num = _as_number(needle)
+        cmp = _RANGE[op]
+        if num is not None:
+            n = float(num)
+            # v > n  <=>  n < v: método do float, sem lambda por item
+            fast = {"gt": n.__lt__, "gte": n.__le__, "lt": n.__gt__, "lte": n.__ge__}[op]
+
+            def rng_num(item):
+                v = getter(item)
+                t = type(v)
+                if t is float or t is int:
+                    return fast(v)
+                pair = _cmp_pair(v, needle, num)
+                return pair is not None and cmp(*pair)
+            return rng_num
+
+        def rng(item):
+            pair = _cmp_pair(getter(item), needle, num)
+            return pair is not None and cmp(*pair)
+        return rng
+    if op in ("in", "nin"):
+        values = needle if isinstance(needle, list) else [v.strip() for v in str(needle).split(",")]
+        pairs = [(v, _as_number(v) if isinstance(v, str) else None) for v in values if v != ""]
+        if not pairs:
+            return None
+        if op == "in":
+            return lambda item: any(_eq(getter(item), v, n) for v, n in pairs)
+        return lambda item: not any(_eq(getter(item), v, n) for v, n in pairs)
+    if op == "contains":
+        low = str(needle).lower()
+
+        def contains(item):
+            val = getter(item)
+            if val is _MISSING:
+                return False
+            if isinstance(val, list):
+                return any(low in (x if isinstance(x, str) else str(x)).lower() for x in val)
+            return low in (val if isinstance(val, str) else str(val)).lower()
+        return contains
+    if op == "regex":
+        rx = re.compile(str(needle), re.IGNORECASE if opts.get("ignore_case") else 0)
+
+        def regex(item):
+            val = getter(item)
+            return val is not _MISSING and val is not None and rx.search(val if isinstance(val, str) else str(val)) is not None
+        return regex
+    raise ValueError(f"filter: operador '{op}' não suportado (use {', '.join(OPERATORS)})")
+
+# ---------- ordenação
+class _Desc:
+    """Inverte a comparação de um valor (ordem decrescente sem reverse=True)."""
+    __slots__ = ("v",)
+
+    def __init__(self, v):
+        self.v = v
+
+    def __lt__(self, other):
+        return other.v < self.v
+
+    def __eq__(self, other):
+        return self.v == other.v
+
+def _sort_key(getter, desc: bool = False):
+    # None/ausente por último em qualquer direção; números antes de textos (tipos misturados
+    # não quebram o sort). Só o valor é invertido no decrescente, o "ausente" fica fora dele.
+    def key(item):
+        v = getter(item)
+        if v is _MISSING or v is None:
+            return (1, None)
+        if isinstance(v, (int, float)) and not isinstance(v, bool):
+            rank = (0, v)
+        else:
+            rank = (1, v if isinstance(v, str) else json.dumps(v, sort_keys=True, default=str))
+        return (0, _Desc(rank) if desc else rank)
+    return key
+
+def _param(tmpl: Any, ctx) -> Any:
+    """Resolve um parâmetro (template ou literal); placeholder não resolvido vira None."""
+    if tmpl is None:
+        return None
+    val = render_obj(tmpl, ctx)
+    if isinstance(val, str):
+        val = val.strip()
+        if val == "" or (val.startswith("{") and val.endswith("}")):
+            return None
+    return val
+
+def _as_int(name: str, val: Any) -> Optional[int]:
+    if val is None:
+        return None
+    try:
+        n = int(val)
+    except (TypeError, ValueError):
+        raise ValueError(f"filter.{name} inválido: {val!r}")
+    return max(n, 0)
+
+class CompiledFilter:
+    """Bloco 'filter' compilado: caminhos, templates e operadores validados no load."""
+
+    def __init__(self, flt: dict):
+        self.source = flt
+        path = list_path(flt.get("path"))
+        self.path = compile_path(path) if path else None
+        # (getter, op, valor compilado, opções)
+        self.where: List[tuple] = []
+        for field, needle in (flt.get("where_contains") or {}).items():
+            self.where.append((compile_path(field), "contains", compile_obj(needle), {}))
+        for field, cond in (flt.get("where") or {}).items():
+            getter = compile_path(field)
+            if not isinstance(cond, dict):
+                cond = {"eq": cond}
+            opts = {"ignore_case": bool(cond.get("ignore_case"))}
+            for op, needle in cond.items():
+                if op == "ignore_case":
+                    continue
+                if op not in OPERATORS:
+                    raise ValueError(f"filter.where.{field}: operador '{op}' não suportado (use {', '.join(OPERATORS)})")
+                self.where.append((getter, op, compile_obj(needle), opts))
+
+        distinct = flt.get("distinct")
+        if distinct is True:
+            self.distinct = True
+        elif distinct:
+            self.distinct = [compile_path(p) for p in ([distinct] if isinstance(distinct, str) else distinct)]
+        else:
+            self.distinct = None
+
+        sort = flt.get("sort") or []
+        self.sort = []
+        for s in ([sort] if isinstance(sort, str) else sort):
+            self.sort.append(_sort_key(compile_path(s.lstrip("-+")), desc=s.startswith("-")))
+
+        self.offset = compile_obj(flt["offset"]) if flt.get("offset") is not None else None
+        self.limit = compile_obj(flt["limit"]) if flt.get("limit") is not None else None
+
+        select = flt.get("select")
+        if isinstance(select, str):
+            select = [select]
+        if isinstance(select, list):
+            select = {p: p for p in select}
+        self.select = [(alias, compile_path(p)) for alias, p in select.items()] if select else None
+
+    # ---------- etapas
+    def _predicates(self, ctx) -> List[Callable[[Any], bool]]:
+        preds = []
+        for getter, op, node, opts in self.where:
+            needle = render_obj(node, ctx)
+            pred = _predicate(getter, op, needle, opts)
+            if pred is not None:
+                preds.append(pred)
+        return preds
+
+    def _distinct_key(self, item: Any) -> str:
+        if self.distinct is True:
+            return json.dumps(item, sort_keys=True, default=str)
+        return json.dumps([None if (v := g(item)) is _MISSING else v for g in self.distinct],
+                          sort_keys=True, default=str)
+
+    def _distinct(self, items: Iterable[Any]) -> Iterator[Any]:
+        seen = set()
+        for item in items:
+            key = self._distinct_key(item)
+            if key not in seen:
+                seen.add(key)
+                yield item
+
+    def _sorted(self, items: Iterable[Any], top: Optional[int]) -> List[Any]:
+        # a direção já está em cada chave: sempre crescente (e estável), com uma ou várias chaves
+        keys = self.sort
+        key = keys[0] if len(keys) == 1 else (lambda item: tuple(k(item) for k in keys))
+        if top is not None:
+            return heapq.nsmallest(top, items, key=key)
+        return sorted(items, key=key)
+
+    def _project(self, item: Any) -> Any:
+        out = {}
+        for alias, getter in self.select:
+            v = getter(item)
+            if v is not _MISSING:
+                out[alias] = v
+        return out
+
+    def apply(self, data: Any, ctx) -> Any:
+        return self.apply_counted(data, ctx)[0]
+
+    def apply_counted(self, data: Any, ctx) -> Tuple[Any, int]:
+        """(resultado, itens na entrada) — a contagem alimenta a métrica de redução do filtro."""
+        if self.path is not None:
+            data = self.path(data)
+        if not isinstance(data, list):
+            return [], 0
+        items: Iterable[Any] = data
+        preds = self._predicates(ctx)
+        if len(preds) == 1:
+            items = filter(preds[0], items)
+        elif preds:
+            items = (x for x in items if all(p(x) for p in preds))
+        if self.distinct is not None:
+            items = self._distinct(items)
+
+        offset = _as_int("offset", _param(self.offset, ctx)) or 0
+        limit = _as_int("limit", _param(self.limit, ctx))
+        if self.sort:
+            items = self._sorted(items, None if limit is None else offset + limit)
+        if offset or limit is not None:
+            items = itertools.islice(items, offset, None if limit is None else offset + limit)
+        if self.select:
+            return [self._project(x) for x in items], len(data)
+        return (items if isinstance(items, list) else list(items)), len(data)
+
+class PageMerge:
+    """Filtro aplicado página a página (http.paginate): where/distinct na chegada, o resto no fim."""
+
+    def __init__(self, flt: Optional[CompiledFilter], ctx, max_items: int = 0):
+        self.flt = flt
+        self.max_items = max_items      # itens lidos do upstream (0 = sem teto)
+        self.items: List[Any] = []
+        self.received = 0
+        self.truncated = False
+        self.want: Optional[int] = None
+        if flt is None:
+            self.preds: List[Callable[[Any], bool]] = []
+            self.seen = None
+            self.offset, self.limit = 0, None
+            return
+        self.preds = flt._predicates(ctx)
+        self.seen = set() if flt.distinct is not None else None
+        self.offset = _as_int("offset", _param(flt.offset, ctx)) or 0
+        self.limit = _as_int("limit", _param(flt.limit, ctx))
+        if self.limit is not None and not flt.sort:
+            self.want = self.offset + self.limit  # sem sort, os primeiros que passam já são o resultado
+
+    def feed(self, page: List[Any]) -> bool:
+        """Junta uma página; True = não precisa de mais páginas."""
+        if self.max_items > 0 and self.received + len(page) >= self.max_items:
+            if self.received + len(page) > self.max_items:
+                self.truncated = True
+            page = page[:self.max_items - self.received]
+        self.received += len(page)
+        preds, seen, items = self.preds, self.seen, self.items
+        for item in page:
+            if preds and not all(p(item) for p in preds):
+                continue
+            if seen is not None:
+                key = self.flt._distinct_key(item)
+                if key in seen:
+                    continue
+                seen.add(key)
+            items.append(item)
+            if self.want is not None and len(items) >= self.want:
+                return True
+        return self.max_items > 0 and self.received >= self.max_items
+
+    @property
+    def satisfied(self) -> bool:
+        return self.want is not None and len(self.items) >= self.want
+
+    def result(self) -> List[Any]:
+        flt, items = self.flt, self.items
+        if flt is None:
+            return items
+        end = None if self.limit is None else self.offset + self.limit
+        if flt.sort:
+            items = flt._sorted(items, end)
+        if self.offset or end is not None:
+            items = items[self.offset:end]
+        if flt.select:
+            return [flt._project(x) for x in items]
+        return items
+
+def compile_filter(flt: "dict | CompiledFilter | None") -> Optional[CompiledFilter]:
+    if not flt or isinstance(flt, CompiledFilter):
+        return flt or None
+    return CompiledFilter(flt)
@@ -3,29 +3,35 @@ from __future__ import annotations
 import os
 import json
 import time
+import asyncio
+import threading
 import httpx
+from collections import ChainMap
+from dataclasses import dataclass
 from typing import Any, Tuple, Dict, Optional
 
 from .settings import settings
-from .utils import safe_format, resolve_template_obj, extract_filter, info, debug, warn
-
-# =========================
-# Suporte a arquivos
-# =========================
-def _read_file_safely(path: str, max_mb: float) -> bytes:
-    max_bytes = int(max_mb * 1024 * 1024)
-    with open(path, "rb") as f:
-        data = f.read(max_bytes + 1)
-    if len(data) > max_bytes:
-        raise ValueError(f"Arquivo '{path}' excede o limite de {max_mb} MB")
-    return data
+from .http_pool import get_client, get_async_client, build_timeout
+from .response_cache import ResponseCache, CacheEntry, get_cache
+from .blobs import StreamedBody, BodyTooLarge, stream_options, store_blob
+from .uploads import open_upload, compression_options, compress_request
+from .limits import Limiter, limiter_for, origin
+from .resilience import RetryPolicy, HedgePolicy, Breaker, retry_policy, hedge_policy, breaker_for
+from .coalesce import COALESCE_METHODS, coalesced, acoalesced
+from .deadlines import (deadline, adeadline, deadline_for, clamp_timeout, retry_fits, check_deadline,
+                        detached_context, spawn, abort)
+from .oauth import oauth_token, aoauth_token, oauth_token_after_401, aoauth_token_after_401
+from .templates import compile_template, compile_obj, render_obj
+from .filters import CompiledFilter, PageMerge, compile_filter
+from .paginate import PageWalk, page_plan
+from .warmup import note_upstream
+from .metrics import trace_request, upstream_call, observe_response, observe_bytes, observe_filter
+from .serializer import loads
+from .utils import safe_format, info, debug, warn
 
 # =========================
 # Auth helpers
 # =========================
-_OAUTH_CACHE: dict[str, dict] = {}
-# cache key -> {"token": "...", "exp": epoch_seconds}
-
 def _merge_no_overwrite(dst: Dict[str, str], src: Dict[str, str], overwrite: bool = False):
     """Mescla src em dst, sem sobrescrever chaves existentes a menos que overwrite=True."""
     for k, v in src.items():
@@ -117,171 +123,751 @@ def _resolve_auth_headers_and_query(auth_cfg: Optional[dict], ctx: dict) -> tupl
             raise ValueError("auth.type=oauth2_client_credentials requer token_url, client_id e client_secret")
 
         cache_key = json.dumps({"u": token_url, "id": client_id, "sc": scope, "au": audience}, sort_keys=True)
-        now = int(time.time())
-        tok = _OAUTH_CACHE.get(cache_key)
-        if not tok or now >= tok.get("exp", 0):
-            # obter novo token
-            data = {
-                "grant_type": "client_credentials",
-                "client_id": client_id,
-                "client_secret": client_secret,
-            }
-            if scope:
-                data["scope"] = scope
-            if audience:
-                data["audience"] = audience
-            # merge extra (stringify via template)
-            for k, v in (extra or {}).items():
-                data[k] = safe_format(str(v), ctx)
-
-            verify_flag = settings.HTTP_VERIFY_SSL
-            timeout = float(auth_cfg.get("timeout", settings.HTTP_TIMEOUT))
-            headers_token = {"Content-Type": "application/x-www-form-urlencoded"}
-            with httpx.Client(timeout=timeout, verify=verify_flag) as c:
-                resp = c.post(token_url, data=data, headers=headers_token)
-                resp.raise_for_status()
-                j = resp.json()
-            access = j.get("access_token")
-            if not access:
-                raise RuntimeError("Falha ao obter access_token em oauth2 client credentials")
-            expires_in = int(j.get("expires_in", 3600))
-            _OAUTH_CACHE[cache_key] = {"token": access, "exp": now + max(expires_in - 30, 30)}  # margem de 30s
-            debug("oauth2: token obtido e cacheado")
-            tok = _OAUTH_CACHE[cache_key]
-
-        _merge_no_overwrite(headers_add, {"Authorization": f"Bearer {tok['token']}"}, overwrite)
-        oauth_meta = {"type": "oauth2_client_credentials", "cache_key": cache_key}
+        data = {
+            "grant_type": "client_credentials",
+            "client_id": client_id,
+            "client_secret": client_secret,
+        }
+        if scope:
+            data["scope"] = scope
+        if audience:
+            data["audience"] = audience
+        # merge extra (stringify via template)
+        for k, v in (extra or {}).items():
+            data[k] = safe_format(str(v), ctx)
+
+        # o token em si vem do TokenManager (oauth.py), a partir deste meta
+        oauth_meta = {
+            "type": "oauth2_client_credentials",
+            "cache_key": cache_key,
+            "token_url": token_url,
+            "data": data,
+            "timeout": auth_cfg.get("timeout"),
+            "pool": auth_cfg.get("pool"),
+            "overwrite": overwrite,
+        }
 
     else:
         raise ValueError(f"auth.type desconhecido: {typ}")
 
     return headers_add, query_add, oauth_meta
 
-def _invalidate_oauth_cache(meta: Optional[dict]):
-    if meta and meta.get("type") == "oauth2_client_credentials":
-        ck = meta.get("cache_key")
-        if ck and ck in _OAUTH_CACHE:
-            _OAUTH_CACHE.pop(ck, None)
-            warn("oauth2: invalidando token cache após 401")
-
 # =========================
 # HTTP principal
 # =========================
-def http_call(http_cfg: dict, ctx: dict) -> Tuple[str, Any]:
+@dataclass
+class PreparedRequest:
+    """Requisição já resolvida (templates + auth), pronta para envio sync ou async."""
+    method: str
+    url: str
+    params: Dict[str, str]
+    headers: Dict[str, str]
+    timeout: httpx.Timeout
+    pool_cfg: Optional[dict] = None
+    json_body: Any = None
+    data_body: Any = None
+    files_body: Any = None
+    basic_auth: Optional[tuple] = None
+    oauth_meta: Optional[dict] = None
+    response_mode: str = "json"
+    flt: Optional[CompiledFilter] = None
+    stream_opts: Optional[dict] = None
+    compress: Optional[dict] = None
+    limiter: Optional[Limiter] = None
+    retry: Optional[RetryPolicy] = None
+    hedge: Optional[HedgePolicy] = None
+    breaker: Optional[Breaker] = None
+    name: str = ""
+
+    def build_kwargs(self) -> Dict[str, Any]:
+        return {
+            "params": self.params,
+            "headers": self.headers,
+            "json": self.json_body,
+            "data": self.data_body,
+            "files": self.files_body,
+            "timeout": clamp_timeout(self.timeout),  # cada fase limitada ao que resta do prazo
+        }
+
+    def identity(self) -> tuple:
+        """Chave da requisição resolvida (antes do token oauth2, que é injetado no envio)."""
+        return (
+            self.method, self.url,
+            tuple(sorted(self.params.items())), tuple(sorted(self.headers.items())),
+            self.response_mode, self.basic_auth,
+            self.oauth_meta["cache_key"] if self.oauth_meta else None,
+        )
+
+    def set_bearer(self, token: str, overwrite: bool = False):
+        _merge_no_overwrite(self.headers, {"Authorization": f"Bearer {token}"}, overwrite)
+
+    def build(self, client: "httpx.Client | httpx.AsyncClient") -> httpx.Request:
+        request = compress_request(client.build_request(self.method, self.url, **self.build_kwargs()), self.compress)
+        return trace_request(request, origin(self.url), isinstance(client, httpx.AsyncClient))
+
+class HttpPlan:
     """
-    method/url/query/headers/body/form/multipart/timeout/response/filter/auth
-    Retorna: ("json"|"text"|"bytes", payload)
+    Bloco 'http' compilado uma única vez (no load): templates já parseados,
+    partes constantes dobradas, timeout/cache resolvidos e a lista de
+    placeholders referenciados. Na chamada só os placeholders são consultados.
     """
-    method = (http_cfg.get("method") or "GET").upper()
-    url_tmpl = http_cfg["url"]
-    response_mode = (http_cfg.get("response") or "json").lower()
-    query_tmpl = http_cfg.get("query") or {}
-    headers_tmpl = http_cfg.get("headers") or {}
-    body_tmpl = http_cfg.get("body")
-    form_tmpl = http_cfg.get("form")
-    multipart_tmpl = http_cfg.get("multipart")
-    timeout = float(http_cfg.get("timeout", settings.HTTP_TIMEOUT))
-    flt = http_cfg.get("filter")
-    auth_cfg = http_cfg.get("auth")  # <---- NOVO
-
-    url = safe_format(url_tmpl, ctx)
-    qparams = {k: safe_format(str(v), ctx) for k, v in query_tmpl.items()}
-    headers = {k: safe_format(str(v), ctx) for k, v in headers_tmpl.items()}
-
-    # -------- autenticação
-    add_h, add_q, oauth_meta = _resolve_auth_headers_and_query(auth_cfg, {**os.environ, **ctx})
+    __slots__ = (
+        "cfg", "method", "url", "query", "headers", "body", "body_kind",
+        "timeout", "pool_cfg", "auth_cfg", "response_mode", "flt", "cache", "stream", "compress", "coalesce", "limits", "retry", "hedge", "breaker", "deadline", "paginate", "name", "placeholders",
+    )
+
+    def __init__(self, http_cfg: dict):
+        self.cfg = http_cfg
+        self.method = (http_cfg.get("method") or "GET").upper()
+        self.url = compile_template(http_cfg["url"])
+        self.query = tuple((k, compile_template(str(v))) for k, v in (http_cfg.get("query") or {}).items())
+        self.headers = tuple((k, compile_template(str(v))) for k, v in (http_cfg.get("headers") or {}).items())
+        self.timeout = build_timeout(http_cfg.get("timeout"))
+        self.pool_cfg = http_cfg.get("pool")
+        note_upstream(self.url, self.pool_cfg)  # host estático: DNS e conexões aquecidos em background
+        self.auth_cfg = http_cfg.get("auth")
+        self.response_mode = (http_cfg.get("response") or "json").lower()
+        self.flt = compile_filter(http_cfg.get("filter"))
+        self.compress = compression_options(http_cfg.get("compress"))
+        self.name = f"{self.method} {http_cfg['url']}"
+        self.limits = http_cfg.get("limits")
+        self.retry = retry_policy(http_cfg.get("retry"), self.method)
+        self.hedge = hedge_policy(http_cfg.get("hedge"), self.method)  # não usado em respostas stream
+        self.breaker = http_cfg.get("breaker")
+        # "response": "stream" (bytes) ou "stream": {...}/true junto de "response": "text"
+        self.stream = None
+        if self.response_mode == "stream" or (http_cfg.get("stream") and self.response_mode in ("text", "bytes")):
+            self.stream = stream_options(http_cfg.get("stream"))
+        # prazo total da chamada; downloads em stream só com "deadline" explícito
+        self.deadline = deadline_for(http_cfg.get("deadline"), explicit_only=self.stream is not None)
+        # corpos em stream não passam pelo cache de respostas
+        self.cache = None if self.stream else get_cache(http_cfg)
+        # single-flight de chamadas idênticas simultâneas (só métodos idempotentes)
+        self.coalesce = bool(http_cfg.get("coalesce")) and not self.stream
+        if self.coalesce and self.method not in COALESCE_METHODS:
+            warn(f"coalesce ignorado para {self.method} {http_cfg['url']} (apenas {', '.join(COALESCE_METHODS)})")
+            self.coalesce = False
+        # seguir as páginas do upstream: resultado = itens de todas as páginas, já filtrados
+        self.paginate = page_plan(self.name, http_cfg.get("paginate"), http_cfg.get("filter"))
+        if self.paginate is not None:
+            if self.response_mode != "json" or self.stream:
+                raise ValueError(f"{self.name}: paginate exige \"response\": \"json\"")
+            if self.cache is not None or self.coalesce:
+                warn(f"cache/coalesce ignorados para {self.name} (respostas paginadas)")
+            self.cache, self.coalesce = None, False
+
+        # prioridade: multipart > form > body
+        self.body = None
+        self.body_kind = None
+        if http_cfg.get("multipart") is not None:
+            self.body_kind, self.body = "multipart", compile_obj(http_cfg["multipart"])
+        elif http_cfg.get("form") is not None:
+            self.body_kind, self.body = "form", compile_obj(http_cfg["form"])
+        elif http_cfg.get("body") is not None:
+            body_tmpl = http_cfg["body"]
+            if isinstance(body_tmpl, dict):
+                self.body_kind, self.body = "json", compile_obj(body_tmpl)
+            else:
+                self.body_kind, self.body = "raw", compile_obj(str(body_tmpl))
+
+        fields = set(self.url.fields)
+        for _, t in self.query + self.headers:
+            fields |= t.fields
+        if self.body is not None:
+            fields |= self.body.fields
+        self.placeholders = frozenset(fields)
+
+    def values(self, ctx) -> Dict[str, Any]:
+        """Só os placeholders referenciados, resolvidos uma vez por chamada."""
+        return {n: ctx[n] for n in self.placeholders if n in ctx}
+
+def check_http(http_cfg: Any, where: str = "http"):
+    """
+    Validação do catálogo preguiçoso: url, templates e filtro compilam. Não cria cache, pool nem
+    batcher (isso fica para o HttpPlan na 1ª chamada); só registra a origem estática para o warm-up.
+    """
+    if not isinstance(http_cfg, dict) or not http_cfg.get("url"):
+        raise ValueError(f"{where}: 'url' é obrigatório")
+    url = compile_template(http_cfg["url"])
+    for part in ("query", "headers"):
+        for v in (http_cfg.get(part) or {}).values():
+            compile_template(str(v))
+    for part in ("multipart", "form", "body"):
+        if http_cfg.get(part) is not None:
+            compile_obj(http_cfg[part])
+    compile_filter(http_cfg.get("filter"))
+    note_upstream(url, http_cfg.get("pool"))  # mesmo registro que o HttpPlan faria
+
+def note_http(http_cfg: dict):
+    """Só o registro do upstream para o warm-up (catálogo restaurado do snapshot, sem validação)."""
+    note_upstream(compile_template(http_cfg["url"]), http_cfg.get("pool"))
+
+def compile_http(http_cfg: "dict | HttpPlan") -> HttpPlan:
+    return http_cfg if isinstance(http_cfg, HttpPlan) else HttpPlan(http_cfg)
+
+def prepare_request(plan: HttpPlan, ctx) -> PreparedRequest:
+    """
+    method/url/query/headers/body/form/multipart/timeout/pool/response/filter/auth
+    Resolve templates e auth; o token oauth2 fica a cargo de quem envia.
+    """
+    auth_cfg = plan.auth_cfg
+    vals = plan.values(ctx)
+    url = plan.url.render(vals)
+    qparams = {k: t.render(vals) for k, t in plan.query}
+    headers = {k: t.render(vals) for k, t in plan.headers}
+
+    # -------- autenticação (env em camada, sem copiar os.environ)
+    add_h, add_q, oauth_meta = _resolve_auth_headers_and_query(auth_cfg, ChainMap(ctx, os.environ))
     # mescla sem sobrescrever (a menos que overwrite=true dentro do auth_cfg)
     _merge_no_overwrite(headers, add_h, overwrite=bool(auth_cfg and auth_cfg.get("overwrite")))
     _merge_no_overwrite(qparams, add_q, overwrite=bool(auth_cfg and auth_cfg.get("overwrite")))
 
-    json_body = None
-    data_body = None
-    files_body = None
-    basic_auth = None  # httpx basic auth tuple
+    req = PreparedRequest(
+        method=plan.method, url=url, params=qparams, headers=headers, timeout=plan.timeout,
+        pool_cfg=plan.pool_cfg, response_mode=plan.response_mode, flt=plan.flt, stream_opts=plan.stream,
+        compress=plan.compress, limiter=limiter_for(plan.limits, url, plan.name),
+        retry=plan.retry, hedge=plan.hedge, breaker=breaker_for(plan.breaker, url), name=plan.name,
+    )
 
     # se basic foi solicitado, setar auth tuple
     if oauth_meta and oauth_meta.get("type") == "basic":
-        basic_auth = (oauth_meta["username"], oauth_meta["password"])
+        req.basic_auth = (oauth_meta["username"], oauth_meta["password"])
+    elif oauth_meta and oauth_meta.get("type") == "oauth2_client_credentials":
+        req.oauth_meta = oauth_meta
 
-    # prioridade: multipart > form > body
-    if multipart_tmpl is not None:
-        resolved = resolve_template_obj(multipart_tmpl, ctx)
+    if plan.body_kind == "multipart":
+        resolved = render_obj(plan.body, vals)
         data_body = {}
         files_list = []
         default_per_file_mb = 10.0
-        max_multipart_mb = settings.MAX_MULTIPART_MB
+        max_total = int(settings.MAX_MULTIPART_MB * 1024 * 1024)
         total_bytes = 0
         for field, value in (resolved or {}).items():
             if isinstance(value, dict) and "file" in value:
-                fpath = value.get("file")
-                if not fpath or not os.path.exists(fpath):
-                    raise ValueError(f"Caminho inválido para campo '{field}': {fpath!r}")
+                # só os.stat aqui: o conteúdo é lido do disco em chunks durante o envio
                 per_file_mb = float(value.get("max_mb", default_per_file_mb))
-                content = _read_file_safely(fpath, per_file_mb)
-                total_bytes += len(content)
-                if total_bytes > int(max_multipart_mb * 1024 * 1024):
-                    raise ValueError(f"Soma dos arquivos excede {max_multipart_mb} MB")
-                filename = value.get("filename") or os.path.basename(fpath)
+                upload = open_upload(field, value.get("file"), int(per_file_mb * 1024 * 1024))
+                total_bytes += upload.size
+                if total_bytes > max_total:
+                    raise ValueError(f"Soma dos arquivos excede {settings.MAX_MULTIPART_MB} MB")
+                filename = value.get("filename") or os.path.basename(upload.path)
                 ctype = value.get("content_type")
-                files_list.append((field, (filename, content, ctype)))
+                files_list.append((field, (filename, upload, ctype)))
             else:
                 data_body[field] = "" if value is None else str(value)
-        files_body = files_list
+        req.data_body = data_body
+        req.files_body = files_list
         headers.pop("Content-Type", None)
 
-    elif form_tmpl is not None:
-        resolved = resolve_template_obj(form_tmpl, ctx)
+    elif plan.body_kind == "form":
+        resolved = render_obj(plan.body, vals)
         if not isinstance(resolved, dict):
             raise ValueError("http.form deve ser um objeto (dict)")
-        data_body = {k: "" if v is None else str(v) for k, v in resolved.items()}
+        req.data_body = {k: "" if v is None else str(v) for k, v in resolved.items()}
         headers.pop("Content-Type", None)
 
-    elif body_tmpl is not None:
-        if isinstance(body_tmpl, dict):
-            json_body = resolve_template_obj(body_tmpl, ctx)
-            headers.setdefault("Content-Type", "application/json")
-        else:
-            data_body = safe_format(str(body_tmpl), ctx)
-
-    verify_flag = settings.HTTP_VERIFY_SSL
-
-    def _do_request():
-        with httpx.Client(timeout=timeout, verify=verify_flag) as client:
-            return client.request(
-                method,
-                url,
-                params=qparams,
-                headers=headers,
-                json=json_body,
-                data=data_body,
-                files=files_body,
-                auth=basic_auth,
-            )
-
-    # 1ª tentativa
-    resp = _do_request()
-    # se deu 401 e usamos oauth2, tenta renovar e repetir uma vez
-    if resp.status_code == 401 and auth_cfg and (auth_cfg.get("type") == "oauth2_client_credentials"):
-        _invalidate_oauth_cache(oauth_meta)
-        add_h2, add_q2, _ = _resolve_auth_headers_and_query(auth_cfg, {**os.environ, **ctx})
-        _merge_no_overwrite(headers, add_h2, overwrite=True)  # agora força atualizar Authorization
-        _merge_no_overwrite(qparams, add_q2, overwrite=True)
-        resp = _do_request()
+    elif plan.body_kind == "json":
+        req.json_body = render_obj(plan.body, vals)
+        headers.setdefault("Content-Type", "application/json")
+
+    elif plan.body_kind == "raw":
+        req.data_body = render_obj(plan.body, vals)
+
+    return req
 
+def decode_response(req: PreparedRequest, resp: httpx.Response) -> Tuple[str, Any]:
+    """Valida o status e decodifica o corpo conforme http.response (sem filtro)."""
     resp.raise_for_status()
 
-    if response_mode == "text":
+    if req.response_mode == "text":
         return ("text", resp.text)
-    elif response_mode == "bytes":
+    elif req.response_mode == "bytes":
         return ("bytes", resp.content)
     else:
-        data = resp.json()
-        data = extract_filter(data, flt, ctx)
-        return ("json", data)
+        return ("json", loads(resp.content))
+
+def finish_payload(req: PreparedRequest, mode: str, payload: Any, ctx: dict) -> Tuple[str, Any]:
+    """Aplica o filtro (que depende dos args da chamada) sobre o payload decodificado."""
+    if mode == "json" and req.flt is not None:
+        payload, n_in = req.flt.apply_counted(payload, ctx)
+        observe_filter(req.name, n_in, len(payload))
+    return (mode, payload)
+
+def parse_response(req: PreparedRequest, resp: httpx.Response, ctx: dict) -> Tuple[str, Any]:
+    return finish_payload(req, *decode_response(req, resp), ctx)
+
+def _send(req: PreparedRequest, stream: bool = False) -> httpx.Response:
+    """Envio com breaker por host e retries (backoff com jitter) em volta de _send_limited."""
+    attempt = 0
+    while True:
+        if req.breaker is not None:
+            req.breaker.before()  # CircuitOpen: falha na hora em vez de esperar o timeout
+        try:
+            resp = _send_limited(req, stream)
+        except httpx.TransportError as e:
+            if req.breaker is not None:
+                req.breaker.failure(type(e).__name__)
+            if req.retry is None or not req.retry.can_retry(attempt):
+                raise
+            delay = _retry_delay(req, attempt, None, e)
+            if delay is None:
+                raise
+        else:
+            if req.breaker is not None:
+                req.breaker.record(resp)
+            if req.retry is None or resp.status_code not in req.retry.statuses or not req.retry.can_retry(attempt):
+                return resp
+            delay = _retry_delay(req, attempt, resp, None)
+            if delay is None:
+                return resp
+            resp.close()
+        time.sleep(delay)
+        attempt += 1
+
+def _retry_delay(req: PreparedRequest, attempt: int, resp: Optional[httpx.Response],
+                 exc: Optional[BaseException]) -> Optional[float]:
+    """Backoff até a próxima tentativa; None se ela não cabe no prazo da chamada."""
+    delay = req.retry.delay(attempt, resp)
+    reason = f"HTTP {resp.status_code}" if resp is not None else type(exc).__name__
+    if not retry_fits(delay):
+        debug("retry: %s %s (%s); sem prazo para a tentativa %d", req.method, req.url, reason, attempt + 2)
+        return None
+    if req.breaker is not None:
+        req.breaker.count("retries")
+    debug("retry: %s %s (%s); tentativa %d em %.2fs", req.method, req.url, reason, attempt + 2, delay)
+    return delay
+
+def _send_limited(req: PreparedRequest, stream: bool = False) -> httpx.Response:
+    limiter = req.limiter
+    if limiter is None:
+        return _send_auth(req, stream)
+    limiter.acquire()  # espera vaga/token na fila limitada (UpstreamBusy se não der)
+    try:
+        resp = _send_auth(req, stream)
+        limiter.observe(resp)
+        return resp
+    finally:
+        limiter.release()
+
+def _send_auth(req: PreparedRequest, stream: bool = False) -> httpx.Response:
+    token = None
+    if req.oauth_meta:
+        token = oauth_token(req.oauth_meta)
+        req.set_bearer(token, req.oauth_meta.get("overwrite", False))
+
+    # cliente compartilhado: reaproveita conexões keep-alive (DNS/TCP/TLS) entre chamadas
+    client = get_client(req.url, req.pool_cfg)
+
+    upstream = origin(req.url)
+    with upstream_call(upstream):
+        # 1ª tentativa
+        resp = client.send(req.build(client), auth=req.basic_auth, stream=stream)
+        observe_response(upstream, req.method, resp, stream)
+        # se deu 401 e usamos oauth2, renova (uma vez por token, não por chamada) e repete
+        if resp.status_code == 401 and req.oauth_meta:
+            resp.close()
+            token = oauth_token_after_401(req.oauth_meta, token)
+            req.set_bearer(token, overwrite=True)  # agora força atualizar Authorization
+            resp = client.send(req.build(client), auth=req.basic_auth, stream=stream)
+            observe_response(upstream, req.method, resp, stream)
+    return resp
+
+async def _asend(req: PreparedRequest, stream: bool = False) -> httpx.Response:
+    attempt = 0
+    while True:
+        if req.breaker is not None:
+            req.breaker.before()
+        try:
+            if req.hedge is not None and not stream:
+                resp = await _asend_hedged(req)
+            else:
+                resp = await _asend_limited(req, stream)
+        except httpx.TransportError as e:
+            if req.breaker is not None:
+                req.breaker.failure(type(e).__name__)
+            if req.retry is None or not req.retry.can_retry(attempt):
+                raise
+            delay = _retry_delay(req, attempt, None, e)
+            if delay is None:
+                raise
+        else:
+            if req.breaker is not None:
+                req.breaker.record(resp)
+            if req.retry is None or resp.status_code not in req.retry.statuses or not req.retry.can_retry(attempt):
+                return resp
+            delay = _retry_delay(req, attempt, resp, None)
+            if delay is None:
+                return resp
+            await resp.aclose()
+        await asyncio.sleep(delay)
+        attempt += 1
+
+async def _asend_hedged(req: PreparedRequest) -> httpx.Response:
+    """Se a 1ª tentativa passar do atraso (p95 recente), dispara uma 2ª e usa a primeira que responder."""
+    hedge = req.hedge
+    after = hedge.delay()
+    start = time.monotonic()
+    first = spawn(_asend_limited(req))
+    tasks = {first}
+    try:
+        done, _ = await asyncio.wait(tasks, timeout=after)
+        if not done:
+            if req.breaker is not None:
+                req.breaker.count("hedges")
+            tasks.add(spawn(_asend_limited(req)))
+        error: Optional[BaseException] = None
+        while tasks:
+            done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+            for t in done:
+                if t.exception() is not None:
+                    error = t.exception()
+                    continue
+                hedge.record(time.monotonic() - start)
+                if t is not first and req.breaker is not None:
+                    req.breaker.count("hedge_wins")
+                for other in done - {t}:  # empate: descarta a outra resposta
+                    if other.exception() is None:
+                        await other.result().aclose()
+                return t.result()
+        raise error
+    finally:
+        for t in tasks:
+            if t.done() and not t.cancelled() and t.exception() is None:
+                await t.result().aclose()  # perdedora que terminou junto
+            abort(t)  # a perdedora em andamento fecha a conexão (sem ficar presa no pool)
+
+async def _asend_limited(req: PreparedRequest, stream: bool = False) -> httpx.Response:
+    limiter = req.limiter
+    if limiter is None:
+        return await _asend_auth(req, stream)
+    await limiter.aacquire()
+    try:
+        resp = await _asend_auth(req, stream)
+        limiter.observe(resp)
+        return resp
+    finally:
+        limiter.release()
+
+async def _asend_auth(req: PreparedRequest, stream: bool = False) -> httpx.Response:
+    token = None
+    if req.oauth_meta:
+        token = await aoauth_token(req.oauth_meta)
+        req.set_bearer(token, req.oauth_meta.get("overwrite", False))
+
+    client = get_async_client(req.url, req.pool_cfg)
+
+    upstream = origin(req.url)
+    with upstream_call(upstream):
+        resp = await client.send(req.build(client), auth=req.basic_auth, stream=stream)
+        observe_response(upstream, req.method, resp, stream)
+        if resp.status_code == 401 and req.oauth_meta:
+            await resp.aclose()
+            token = await aoauth_token_after_401(req.oauth_meta, token)
+            req.set_bearer(token, overwrite=True)
+            resp = await client.send(req.build(client), auth=req.basic_auth, stream=stream)
+            observe_response(upstream, req.method, resp, stream)
+    return resp
+
+# =========================
+# Corpos em stream ("response": "stream")
+# =========================
+def _open_body(req: PreparedRequest, resp: httpx.Response) -> StreamedBody:
+    opts = req.stream_opts
+    declared = resp.headers.get("content-length")
+    if declared and declared.isdigit() and int(declared) > opts["max_bytes"]:
+        raise BodyTooLarge(f"Resposta ({declared} bytes) excede o limite de {opts['max_bytes']} bytes")
+    return StreamedBody(opts, text=req.response_mode == "text",
+                        encoding=resp.charset_encoding, mime=resp.headers.get("content-type"))
+
+def _stream_result(body: StreamedBody) -> Tuple[str, Any]:
+    """Pequeno: devolve inteiro; grande: vira blob servido em partes."""
+    if body.inline():
+        return ("text" if body.text else "bytes", body.read_all())
+    return ("stream", store_blob(body))
+
+def _read_stream(req: PreparedRequest, resp: httpx.Response) -> Tuple[str, Any]:
+    try:
+        if resp.status_code >= 400:
+            resp.read()
+            resp.raise_for_status()
+        body = _open_body(req, resp)
+        for chunk in resp.iter_bytes(req.stream_opts["chunk_bytes"]):
+            check_deadline(req.name)
+            body.write(chunk)
+    finally:
+        resp.close()
+        observe_bytes(origin(req.url), resp.num_bytes_downloaded)
+    return _stream_result(body)
+
+async def _aread_stream(req: PreparedRequest, resp: httpx.Response) -> Tuple[str, Any]:
+    try:
+        if resp.status_code >= 400:
+            await resp.aread()
+            resp.raise_for_status()
+        body = _open_body(req, resp)
+        async for chunk in resp.aiter_bytes(req.stream_opts["chunk_bytes"]):
+            body.write(chunk)
+    finally:
+        await resp.aclose()
+        observe_bytes(origin(req.url), resp.num_bytes_downloaded)
+    return _stream_result(body)
+
+# =========================
+# Integração com o cache de respostas
+# =========================
+_BACKGROUND: set = set()  # tasks de revalidação em andamento (evita GC)
+
+def _raise_status(req: PreparedRequest, status: int):
+    httpx.Response(status, request=httpx.Request(req.method, req.url)).raise_for_status()
+
+def _cached_result(req: PreparedRequest, entry: CacheEntry, ctx: dict) -> Tuple[str, Any]:
+    if entry.negative:
+        _raise_status(req, entry.status)
+    return finish_payload(req, entry.mode, entry.payload, ctx)
+
+def _add_validators(req: PreparedRequest, entry: CacheEntry):
+    if entry.etag:
+        req.headers.setdefault("If-None-Match", entry.etag)
+    if entry.last_modified:
+        req.headers.setdefault("If-Modified-Since", entry.last_modified)
+
+def _store_response(cache: ResponseCache, key: tuple, req: PreparedRequest,
+                    resp: httpx.Response, entry: Optional[CacheEntry]) -> Tuple[str, Any]:
+    """Atualiza o cache com a resposta do upstream; devolve (mode, payload) sem filtro."""
+    if resp.status_code == 304 and entry is not None:
+        cache.refresh(key, entry, resp.headers)
+        return entry.mode, entry.payload
+    if resp.status_code >= 400:
+        cache.store(key, resp.status_code, resp.headers, req.response_mode, None, 0, req.headers)
+        resp.raise_for_status()
+    mode, payload = decode_response(req, resp)
+    cache.store(key, resp.status_code, resp.headers, mode, payload, len(resp.content), req.headers)
+    return mode, payload
+
+def _revalidate(cache: ResponseCache, key: tuple, entry: CacheEntry, plan: HttpPlan, ctx):
+    try:
+        with deadline(plan.deadline, plan.name):
+            req = prepare_request(plan, ctx)
+            _add_validators(req, entry)
+            _store_response(cache, key, req, _send(req), entry)
+    except Exception as e:
+        debug("cache: revalidação em background falhou (%s): %s", cache.name, e)
+    finally:
+        entry.revalidating = False
+
+async def _arevalidate(cache: ResponseCache, key: tuple, entry: CacheEntry, plan: HttpPlan, ctx):
+    try:
+        with adeadline(plan.deadline, plan.name):
+            req = prepare_request(plan, ctx)
+            _add_validators(req, entry)
+            _store_response(cache, key, req, await _asend(req), entry)
+    except Exception as e:
+        debug("cache: revalidação em background falhou (%s): %s", cache.name, e)
+    finally:
+        entry.revalidating = False
+
+def _fetch(plan: HttpPlan, req: PreparedRequest, key: Optional[tuple] = None,
+           entry: Optional[CacheEntry] = None) -> Tuple[str, Any]:
+    """Ida ao upstream (com cache, se houver); devolve (mode, payload) sem filtro."""
+    def run():
+        if plan.cache is None:
+            return decode_response(req, _send(req))
+        return _store_response(plan.cache, key, req, _send(req), entry)
+    if plan.coalesce:
+        return coalesced(req.identity(), run)
+    return run()
+
+async def _afetch(plan: HttpPlan, req: PreparedRequest, key: Optional[tuple] = None,
+                  entry: Optional[CacheEntry] = None) -> Tuple[str, Any]:
+    async def run():
+        if plan.cache is None:
+            return decode_response(req, await _asend(req))
+        return _store_response(plan.cache, key, req, await _asend(req), entry)
+    if plan.coalesce:
+        return await acoalesced(req.identity(), run)
+    return await run()
+
+# =========================
+# Paginação do upstream ("paginate", ver paginate.py)
+# =========================
+def _page(req: PreparedRequest) -> Tuple[httpx.Response, Any]:
+    resp = _send(req)
+    return resp, decode_response(req, resp)[1]
+
+async def _apage(req: PreparedRequest) -> Tuple[httpx.Response, Any]:
+    resp = await _asend(req)
+    return resp, decode_response(req, resp)[1]
+
+def _quiet(task: asyncio.Task):
+    if not task.cancelled():
+        task.exception()  # página descartada que falhou (ex.: 404 depois da última): sem aviso do asyncio
+
+def _spawn_page(req: PreparedRequest) -> asyncio.Task:
+    task = spawn(_apage(req))
+    task.add_done_callback(_quiet)
+    return task
+
+def _paginate(plan: HttpPlan, req: PreparedRequest, merge: PageMerge):
+    """Modo sync: uma página de cada vez."""
+    pg = plan.paginate
+    cur = pg.first(req)
+    resp, payload = _page(cur)
+    items = pg.items_of(payload)
+    walk = PageWalk(pg, req, payload, items)
+    while True:
+        nxt = walk.following(cur, resp, payload, items)
+        if merge.feed(items) or nxt is None or walk.pages >= pg.max_pages:
+            walk.record(merge, nxt is not None)
+            return
+        cur = nxt
+        try:
+            resp, payload = _page(cur)
+        except httpx.HTTPStatusError as e:
+            if not walk.past_end(e):
+                raise
+            walk.record(merge, False)
+            return
+        items = pg.items_of(payload)
+        walk.pages += 1
+
+async def _apaginate(plan: HttpPlan, req: PreparedRequest, merge: PageMerge):
+    pg = plan.paginate
+    cur = pg.first(req)
+    resp, payload = await _apage(cur)
+    items = pg.items_of(payload)
+    walk = PageWalk(pg, req, payload, items)
+    if pg.numbered:
+        more = await _apages_numbered(walk, items, merge)
+    else:
+        more = await _apages_chained(walk, cur, resp, payload, items, merge)
+    walk.record(merge, more)
+
+async def _apages_chained(walk: PageWalk, cur: PreparedRequest, resp: httpx.Response, payload: Any,
+                          items: list, merge: PageMerge) -> bool:
+    """link/cursor: a próxima página só é conhecida pela atual; ela é buscada enquanto esta é filtrada."""
+    task = None
+    try:
+        while True:
+            nxt = walk.following(cur, resp, payload, items)
+            if nxt is not None and walk.pages < walk.plan.max_pages:
+                task = _spawn_page(nxt)
+            if merge.feed(items) or task is None:
+                return nxt is not None
+            resp, payload = await task
+            cur, task = nxt, None
+            items = walk.plan.items_of(payload)
+            walk.pages += 1
+    finally:
+        if task is not None:
+            abort(task)
+
+async def _apages_numbered(walk: PageWalk, items: list, merge: PageMerge) -> bool:
+    """page/offset: com total conhecido, até concurrency páginas em paralelo; sem total, uma à frente."""
+    ahead = walk.plan.concurrency if walk.count is not None else 2
+    tasks: Dict[int, asyncio.Task] = {}
+    index = 1  # próxima página a disparar
+    try:
+        while True:
+            last = walk.last(items)
+            while not last and len(tasks) < ahead and walk.has(index):
+                tasks[index] = _spawn_page(walk.numbered(index))
+                index += 1
+            if merge.feed(items) or last or not tasks:
+                return not last and (bool(tasks) or walk.count is None or index < walk.count)
+            # na ordem das páginas: o resultado sai igual ao da leitura sequencial
+            try:
+                _, payload = await tasks.pop(min(tasks))
+            except httpx.HTTPStatusError as e:
+                if not walk.past_end(e):
+                    raise
+                return False
+            items = walk.plan.items_of(payload)
+            walk.pages += 1
+    finally:
+        for task in tasks.values():
+            abort(task)
+
+def _paginated_result(req: PreparedRequest, merge: PageMerge) -> Tuple[str, Any]:
+    payload = merge.result()
+    if req.flt is not None:
+        observe_filter(req.name, merge.received, len(payload))
+    return ("json", payload)
+
+def http_call(http_cfg: "dict | HttpPlan", ctx) -> Tuple[str, Any]:
+    """
+    Execução síncrona (fallback; bloqueia a thread chamadora).
+    http_cfg pode ser o dict cru ou um HttpPlan já compilado pelo loader.
+    Retorna: ("json"|"text"|"bytes"|"stream", payload); "stream" traz um Blob
+    O prazo (plan.deadline) vale só para a ida ao upstream: hit no cache não abre escopo.
+    """
+    plan = compile_http(http_cfg)
+    req = prepare_request(plan, ctx)
+    if req.stream_opts:
+        with deadline(plan.deadline, plan.name):
+            return _read_stream(req, _send(req, stream=True))
+    if plan.paginate is not None:
+        merge = PageMerge(req.flt, ctx, plan.paginate.max_items)
+        with deadline(plan.deadline, plan.name):
+            _paginate(plan, req, merge)
+        return _paginated_result(req, merge)
+    cache = plan.cache
+    key = entry = None
+    if cache is not None:
+        key = cache.key_for(req.method, req.url, req.params, req.headers)
+        entry, state = cache.lookup(key, req.headers)
+        if state == "fresh":
+            return _cached_result(req, entry, ctx)
+        if state == "stale":
+            # stale-while-revalidate: responde já e revalida numa thread
+            if cache.begin_revalidation(entry):
+                threading.Thread(target=_revalidate, args=(cache, key, entry, plan, ctx), daemon=True).start()
+            return _cached_result(req, entry, ctx)
+        if state == "expired":
+            cache.count("revalidations")
+            _add_validators(req, entry)
+    with deadline(plan.deadline, plan.name):
+        mode, payload = _fetch(plan, req, key, entry)
+    return finish_payload(req, mode, payload, ctx)
+
+async def http_call_async(http_cfg: "dict | HttpPlan", ctx) -> Tuple[str, Any]:
+    """
+    Execução nativa asyncio (httpx.AsyncClient): não bloqueia o event loop do FastMCP.
+    Retorna: ("json"|"text"|"bytes"|"stream", payload); "stream" traz um Blob
+    """
+    plan = compile_http(http_cfg)
+    req = prepare_request(plan, ctx)
+    if req.stream_opts:
+        with adeadline(plan.deadline, plan.name):
+            return await _aread_stream(req, await _asend(req, stream=True))
+    if plan.paginate is not None:
+        merge = PageMerge(req.flt, ctx, plan.paginate.max_items)
+        with adeadline(plan.deadline, plan.name):
+            await _apaginate(plan, req, merge)
+        return _paginated_result(req, merge)
+    cache = plan.cache
+    key = entry = None
+    if cache is not None:
+        key = cache.key_for(req.method, req.url, req.params, req.headers)
+        entry, state = await cache.alookup(key, req.headers)
+        if state == "fresh":
+            return _cached_result(req, entry, ctx)
+        if state == "stale":
+            if cache.begin_revalidation(entry):
+                task = asyncio.get_running_loop().create_task(_arevalidate(cache, key, entry, plan, ctx),
+                                                              context=detached_context())
+                _BACKGROUND.add(task)
+                task.add_done_callback(_BACKGROUND.discard)
+            return _cached_result(req, entry, ctx)
+        if state == "expired":
+            cache.count("revalidations")
+            _add_validators(req, entry)
+    with adeadline(plan.deadline, plan.name):
+        mode, payload = await _afetch(plan, req, key, entry)
+    return finish_payload(req, mode, payload, ctx)
 
 def infer_mime(http_cfg: Dict[str, Any]) -> str:
     resp_mode = (http_cfg.get("response") or "json").lower()
-    if resp_mode == "bytes":
+    if resp_mode in ("bytes", "stream"):
         return "application/octet-stream"
     if resp_mode == "text":
         return "text/plain"
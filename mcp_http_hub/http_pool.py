@@ -0,0 +1,299 @@
+from __future__ import annotations
+
+import time
+import socket
+import ipaddress
+import threading
+import anyio
+import httpx
+import httpcore
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
+
+from .settings import settings
+from .utils import debug, warn
+
+# =========================
+# Registro de clientes HTTP (pool keep-alive por host)
+# =========================
+_CLIENTS: dict[tuple, httpx.Client] = {}
+# (scheme, host, port, verify, http2, max_conn, max_keepalive, keepalive_expiry) -> httpx.Client
+_ASYNC_CLIENTS: dict[tuple, httpx.AsyncClient] = {}
+# mesma chave -> httpx.AsyncClient (vinculado ao event loop do servidor)
+_LOCK = threading.Lock()
+_HTTP2_AVAILABLE: Optional[bool] = None
+_DNS_UNAVAILABLE = False
+
+def _http2_available() -> bool:
+    """HTTP/2 depende do pacote opcional 'h2' (pip install httpx[http2])."""
+    global _HTTP2_AVAILABLE
+    if _HTTP2_AVAILABLE is None:
+        try:
+            import h2  # noqa: F401
+            _HTTP2_AVAILABLE = True
+        except ImportError:
+            _HTTP2_AVAILABLE = False
+            warn("pool: http2 solicitado mas pacote 'h2' não está instalado; usando HTTP/1.1")
+    return _HTTP2_AVAILABLE
+
+def pool_options(pool_cfg: Optional[dict]) -> Dict[str, Any]:
+    """Mescla o bloco 'pool' do http_cfg com os defaults de settings."""
+    pool_cfg = pool_cfg or {}
+    http2 = bool(pool_cfg.get("http2", settings.HTTP_HTTP2))
+    if http2 and not _http2_available():
+        http2 = False
+    return {
+        "max_connections": int(pool_cfg.get("max_connections", settings.HTTP_MAX_CONNECTIONS)),
+        "max_keepalive": int(pool_cfg.get("max_keepalive", settings.HTTP_MAX_KEEPALIVE)),
+        "keepalive_expiry": float(pool_cfg.get("keepalive_expiry", settings.HTTP_KEEPALIVE_EXPIRY)),
+        "http2": http2,
+        "verify": bool(pool_cfg.get("verify_ssl", settings.HTTP_VERIFY_SSL)),
+    }
+
+def build_timeout(timeout_cfg: Any) -> httpx.Timeout:
+    """
+    Aceita o formato antigo (número único) ou um objeto por fase:
+      "timeout": 15
+      "timeout": {"connect": 3, "read": 20, "write": 20, "pool": 5}
+    Fases ausentes caem nos defaults HTTP_*_TIMEOUT de settings.
+    """
+    if timeout_cfg is None:
+        return httpx.Timeout(
+            connect=settings.HTTP_CONNECT_TIMEOUT,
+            read=settings.HTTP_READ_TIMEOUT,
+            write=settings.HTTP_WRITE_TIMEOUT,
+            pool=settings.HTTP_POOL_TIMEOUT,
+        )
+    if isinstance(timeout_cfg, dict):
+        return httpx.Timeout(
+            connect=float(timeout_cfg.get("connect", settings.HTTP_CONNECT_TIMEOUT)),
+            read=float(timeout_cfg.get("read", settings.HTTP_READ_TIMEOUT)),
+            write=float(timeout_cfg.get("write", settings.HTTP_WRITE_TIMEOUT)),
+            pool=float(timeout_cfg.get("pool", settings.HTTP_POOL_TIMEOUT)),
+        )
+    return httpx.Timeout(float(timeout_cfg))
+
+def _client_key(url: str, opts: Dict[str, Any]) -> tuple:
+    u = httpx.URL(url)
+    return (
+        u.scheme, u.host, u.port, opts["verify"], opts["http2"],
+        opts["max_connections"], opts["max_keepalive"], opts["keepalive_expiry"],
+    )
+
+def _client_kwargs(opts: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "verify": opts["verify"],
+        "http2": opts["http2"],
+        "limits": httpx.Limits(
+            max_connections=opts["max_connections"],
+            max_keepalive_connections=opts["max_keepalive"],
+            keepalive_expiry=opts["keepalive_expiry"],
+        ),
+    }
+
+# =========================
+# Cache de DNS em processo (DNS_CACHE_TTL)
+# =========================
+# O httpcore resolve o host a cada conexão nova (getaddrinfo; no async, numa thread). Os clientes
+# do registro conectam por um network backend que consulta este cache antes e conecta direto no IP;
+# SNI e verificação do certificado continuam pelo nome. O getaddrinfo não informa o TTL do
+# registro: vale DNS_CACHE_TTL. Se a resolução falha, o último endereço conhecido segue valendo;
+# se nenhum endereço conecta, a entrada é descartada. O warm-up (warmup.py) renova as entradas
+# dos upstreams conhecidos antes de expirarem.
+_DNS: Dict[Tuple[str, int], Tuple[List[str], float]] = {}
+_DNS_STATS = {"hits": 0, "misses": 0, "stale": 0, "failures": 0}
+
+@lru_cache(maxsize=1024)
+def _is_ip(host: str) -> bool:
+    try:
+        ipaddress.ip_address(host)
+        return True
+    except ValueError:
+        return False
+
+def _dns_cached(host: str, port: int, ahead: float = 0.0) -> Optional[List[str]]:
+    entry = _DNS.get((host, port))
+    if entry is not None and entry[1] - ahead > time.monotonic():
+        _DNS_STATS["hits"] += 1
+        return entry[0]
+    _DNS_STATS["misses"] += 1
+    return None
+
+def _dns_store(host: str, port: int, infos: list) -> List[str]:
+    addrs = list(dict.fromkeys(info[4][0] for info in infos))
+    _DNS[(host, port)] = (addrs, time.monotonic() + settings.DNS_CACHE_TTL)
+    return addrs
+
+def _dns_stale(host: str, port: int, error: OSError) -> List[str]:
+    _DNS_STATS["failures"] += 1
+    entry = _DNS.get((host, port))
+    if entry is None:
+        raise error
+    _DNS_STATS["stale"] += 1
+    debug("dns: %s falhou (%s); usando o último endereço conhecido", host, error)
+    return entry[0]
+
+def resolve(host: str, port: int) -> List[str]:
+    """Endereços de host (do cache ou getaddrinfo)."""
+    if _is_ip(host):
+        return [host]
+    addrs = _dns_cached(host, port)
+    if addrs is not None:
+        return addrs
+    try:
+        infos = socket.getaddrinfo(host, port, type=socket.SOCK_STREAM)
+    except OSError as e:
+        return _dns_stale(host, port, e)
+    return _dns_store(host, port, infos)
+
+async def aresolve(host: str, port: int, ahead: float = 0.0) -> List[str]:
+    """Como resolve(); ahead renova entradas que expiram nos próximos ahead segundos."""
+    if _is_ip(host):
+        return [host]
+    addrs = _dns_cached(host, port, ahead)
+    if addrs is not None:
+        return addrs
+    try:
+        infos = await anyio.getaddrinfo(host, port, type=socket.SOCK_STREAM)
+    except OSError as e:
+        return _dns_stale(host, port, e)
+    return _dns_store(host, port, infos)
+
+class _DNSBackend(httpcore.NetworkBackend):
+    def __init__(self, inner: httpcore.NetworkBackend):
+        self._inner = inner
+
+    def connect_tcp(self, host, port, timeout=None, local_address=None, socket_options=None):
+        try:
+            addrs = resolve(host, port)
+        except OSError as e:
+            raise httpcore.ConnectError(str(e)) from e
+        for i, ip in enumerate(addrs):
+            try:
+                return self._inner.connect_tcp(ip, port, timeout=timeout, local_address=local_address,
+                                               socket_options=socket_options)
+            except (httpcore.ConnectError, httpcore.ConnectTimeout):
+                if i == len(addrs) - 1:
+                    _DNS.pop((host, port), None)
+                    raise
+
+    def connect_unix_socket(self, path, timeout=None, socket_options=None):
+        return self._inner.connect_unix_socket(path, timeout=timeout, socket_options=socket_options)
+
+    def sleep(self, seconds):
+        return self._inner.sleep(seconds)
+
+class _AsyncDNSBackend(httpcore.AsyncNetworkBackend):
+    def __init__(self, inner: httpcore.AsyncNetworkBackend):
+        self._inner = inner
+
+    async def connect_tcp(self, host, port, timeout=None, local_address=None, socket_options=None):
+        try:
+            addrs = await aresolve(host, port)
+        except OSError as e:
+            raise httpcore.ConnectError(str(e)) from e
+        for i, ip in enumerate(addrs):
+            try:
+                return await self._inner.connect_tcp(ip, port, timeout=timeout, local_address=local_address,
+                                                     socket_options=socket_options)
+            except (httpcore.ConnectError, httpcore.ConnectTimeout):
+                if i == len(addrs) - 1:
+                    _DNS.pop((host, port), None)
+                    raise
+
+    async def connect_unix_socket(self, path, timeout=None, socket_options=None):
+        return await self._inner.connect_unix_socket(path, timeout=timeout, socket_options=socket_options)
+
+    async def sleep(self, seconds):
+        return await self._inner.sleep(seconds)
+
+def _connection_pool(client: "httpx.Client | httpx.AsyncClient"):
+    # o httpx não expõe o pool do transporte; sem ele (outra versão) cache de DNS e warm-up desligam
+    return getattr(getattr(client, "_transport", None), "_pool", None)
+
+def _use_dns_cache(client: "httpx.Client | httpx.AsyncClient"):
+    global _DNS_UNAVAILABLE
+    if settings.DNS_CACHE_TTL <= 0:
+        return
+    pool = _connection_pool(client)
+    inner = getattr(pool, "_network_backend", None)
+    if inner is None:
+        if not _DNS_UNAVAILABLE:
+            _DNS_UNAVAILABLE = True
+            warn("dns: cache de DNS indisponível nesta versão do httpx/httpcore; resolvendo a cada conexão")
+        return
+    pool._network_backend = (_AsyncDNSBackend if isinstance(client, httpx.AsyncClient) else _DNSBackend)(inner)
+
+def idle_connections(client: "httpx.Client | httpx.AsyncClient") -> Optional[int]:
+    """Conexões ociosas (e não expiradas) no pool do cliente; None se não dá para saber."""
+    pool = _connection_pool(client)
+    if pool is None or not hasattr(pool, "connections"):
+        return None
+    return sum(1 for c in pool.connections if c.is_idle() and not c.has_expired())
+
+def pooled_idle(url: str, pool_cfg: Optional[dict] = None) -> Optional[int]:
+    """idle_connections do cliente já criado para url (0 se ainda não existe; não cria)."""
+    key = _client_key(url, pool_options(pool_cfg))
+    client = (_ASYNC_CLIENTS if settings.HTTP_ASYNC else _CLIENTS).get(key)
+    return idle_connections(client) if client is not None else 0
+
+def dns_stats() -> Dict[str, Any]:
+    now = time.monotonic()
+    return {"ttl_s": settings.DNS_CACHE_TTL, "entries": len(_DNS), **_DNS_STATS,
+            "hosts": {f"{h}:{p}": {"addrs": a, "expires_in_s": round(exp - now, 1)}
+                      for (h, p), (a, exp) in list(_DNS.items())}}
+
+def get_client(url: str, pool_cfg: Optional[dict] = None) -> httpx.Client:
+    """Devolve (criando se preciso) o httpx.Client compartilhado do host de 'url'."""
+    opts = pool_options(pool_cfg)
+    key = _client_key(url, opts)
+    client = _CLIENTS.get(key)
+    if client is not None:
+        return client
+    with _LOCK:
+        client = _CLIENTS.get(key)
+        if client is None:
+            client = httpx.Client(**_client_kwargs(opts))
+            _use_dns_cache(client)
+            _CLIENTS[key] = client
+            debug(f"pool: novo cliente para {key[0]}://{key[1]}:{key[2] or ''} (http2={opts['http2']})")
+    return client
+
+def get_async_client(url: str, pool_cfg: Optional[dict] = None) -> httpx.AsyncClient:
+    """Equivalente async de get_client; deve ser usado sempre a partir do mesmo event loop."""
+    opts = pool_options(pool_cfg)
+    key = _client_key(url, opts)
+    client = _ASYNC_CLIENTS.get(key)
+    if client is None:
+        # sem await entre o get e o set: não há corrida dentro do event loop
+        client = httpx.AsyncClient(**_client_kwargs(opts))
+        _use_dns_cache(client)
+        _ASYNC_CLIENTS[key] = client
+        debug(f"pool: novo cliente async para {key[0]}://{key[1]}:{key[2] or ''} (http2={opts['http2']})")
+    return client
+
+def close_clients():
+    """Fecha todos os clientes do registro (chamado no shutdown do servidor)."""
+    with _LOCK:
+        clients = list(_CLIENTS.values())
+        _CLIENTS.clear()
+    for c in clients:
+        try:
+            c.close()
+        except Exception as e:  # melhor esforço no shutdown
+            warn(f"pool: erro ao fechar cliente: {e}")
+    if clients:
+        debug(f"pool: {len(clients)} cliente(s) HTTP fechado(s)")
+
+async def aclose_clients():
+    """Fecha os clientes async (no event loop do servidor) e depois os sync."""
+    clients = list(_ASYNC_CLIENTS.values())
+    _ASYNC_CLIENTS.clear()
+    for c in clients:
+        try:
+            await c.aclose()
+        except Exception as e:  # melhor esforço no shutdown
+            warn(f"pool: erro ao fechar cliente async: {e}")
+    if clients:
+        debug(f"pool: {len(clients)} cliente(s) HTTP async fechado(s)")
+    close_clients()
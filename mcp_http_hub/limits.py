@@ -0,0 +1,259 @@
+from __future__ import annotations
+
+import time
+import asyncio
+import threading
+from collections import deque
+from email.utils import parsedate_to_datetime
+from functools import lru_cache
+from typing import Any, Dict, Optional
+
+import httpx
+
+from .settings import settings
+from .deadlines import remaining
+from .utils import debug, warn
+
+# =========================
+# Limites por upstream (bloco "limits" dentro de "http" ou UPSTREAM_* no .env)
+# =========================
+#   "limits": {
+#     "scope": "host",            # "host" (default) | "definition" | nome de um grupo compartilhado
+#     "max_in_flight": 10,        # requisições simultâneas
+#     "rps": 5, "burst": 10,      # token bucket
+#     "max_queue": 100,           # chamadas aguardando; além disso falha na hora
+#     "queue_timeout": 10,        # espera máxima (s) por vaga/token
+#     "respect_retry_after": true # 429/503 com Retry-After pausam o upstream
+#   }
+# Em vez de disparar tudo e receber 429, o excesso espera numa fila limitada;
+# só quem passaria do queue_timeout (ou encontra a fila cheia) falha, e rápido.
+# A espera também não passa do que resta do prazo da chamada (deadlines.py).
+# O limiter de um host (ou grupo) é criado com o bloco da 1ª definição que o usa; outra definição com
+# valores diferentes para o mesmo host gera um aviso (uma vez) e continua valendo o primeiro.
+
+class UpstreamBusy(RuntimeError):
+    pass
+
+def retry_after_seconds(value: Optional[str]) -> Optional[float]:
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+class Limiter:
+    def __init__(self, name: str, cfg: dict):
+        self.name = name
+        self.max_in_flight = int(cfg.get("max_in_flight", settings.UPSTREAM_MAX_IN_FLIGHT))
+        self.rps = float(cfg.get("rps", settings.UPSTREAM_RPS))
+        self.burst = int(cfg.get("burst", settings.UPSTREAM_BURST)) or max(int(self.rps), 1)
+        self.max_queue = int(cfg.get("max_queue", settings.UPSTREAM_MAX_QUEUE))
+        self.queue_timeout = float(cfg.get("queue_timeout", settings.UPSTREAM_QUEUE_TIMEOUT))
+        self.respect_retry_after = bool(cfg.get("respect_retry_after", True))
+        self.cfgs = [cfg]  # blocos já conferidos (identidade), o 1º é o que vale
+        self._lock = threading.Lock()
+        self._cond = threading.Condition(self._lock)
+        self._async_waiters: "deque[asyncio.Future]" = deque()
+        self._tokens = float(self.burst)
+        self._last = time.monotonic()
+        self.blocked_until = 0.0  # monotonic; definido por Retry-After
+        self.in_flight = 0
+        self.queued = 0
+        self.stats = {
+            "acquired": 0, "waited": 0, "rejected": 0, "timeouts": 0,
+            "throttled": 0, "retry_after": 0, "wait_total_s": 0.0, "wait_max_s": 0.0, "max_queue_seen": 0,
+        }
+
+    # ---------- token bucket / Retry-After
+    def _reserve(self, budget: float) -> float:
+        """Reserva um token; devolve quanto esperar (s). UpstreamBusy se passar do budget."""
+        with self._lock:
+            now = time.monotonic()
+            delay = max(self.blocked_until - now, 0.0)
+            if self.rps > 0:
+                self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rps)
+                self._last = now
+                if self._tokens < 1:
+                    delay = max(delay, (1 - self._tokens) / self.rps)
+            if delay > budget:
+                self.stats["timeouts"] += 1
+                raise UpstreamBusy(f"upstream '{self.name}': limite de taxa exigiria esperar {delay:.1f}s "
+                                   f"(máximo {budget:.1f}s)")
+            if self.rps > 0:
+                self._tokens -= 1  # pode ficar negativo: reservas futuras em fila
+            if delay > 0:
+                self.stats["throttled"] += 1
+            return delay
+
+    def observe(self, resp: httpx.Response):
+        """429/503 com Retry-After: pausa novas requisições ao upstream."""
+        if not self.respect_retry_after or resp.status_code not in (429, 503):
+            return
+        secs = retry_after_seconds(resp.headers.get("retry-after"))
+        if secs is None:
+            return
+        secs = min(secs, settings.UPSTREAM_RETRY_AFTER_MAX)
+        with self._lock:
+            self.blocked_until = max(self.blocked_until, time.monotonic() + secs)
+            self.stats["retry_after"] += 1
+        warn(f"limits: upstream '{self.name}' pediu Retry-After {secs:.0f}s")
+
+    # ---------- vagas (in-flight)
+    def _enqueue_check(self):
+        if self.queued >= self.max_queue:
+            self.stats["rejected"] += 1
+            raise UpstreamBusy(f"upstream '{self.name}': fila cheia ({self.max_queue} aguardando)")
+        self.queued += 1
+        self.stats["max_queue_seen"] = max(self.stats["max_queue_seen"], self.queued)
+
+    def _record_wait(self, waited: float):
+        with self._lock:
+            self.stats["acquired"] += 1
+            if waited > 0.001:
+                self.stats["waited"] += 1
+                self.stats["wait_total_s"] += waited
+                self.stats["wait_max_s"] = max(self.stats["wait_max_s"], waited)
+
+    def _budget(self) -> float:
+        """Espera máxima: queue_timeout, ou menos se o prazo da chamada acabar antes."""
+        return max(min(self.queue_timeout, remaining()), 0.0)
+
+    def acquire(self):
+        start = time.monotonic()
+        budget = self._budget()
+        time.sleep(self._reserve(budget))
+        if self.max_in_flight > 0:
+            deadline = start + budget
+            with self._cond:
+                if self.in_flight >= self.max_in_flight or self._async_waiters:
+                    self._enqueue_check()
+                    try:
+                        while self.in_flight >= self.max_in_flight:
+                            remaining = deadline - time.monotonic()
+                            if remaining <= 0:
+                                self.stats["timeouts"] += 1
+                                raise UpstreamBusy(f"upstream '{self.name}': sem vaga após {budget:.1f}s "
+                                                   f"({self.in_flight} em andamento)")
+                            self._cond.wait(remaining)
+                    finally:
+                        self.queued -= 1
+                self.in_flight += 1
+        self._record_wait(time.monotonic() - start)
+
+    async def aacquire(self):
+        start = time.monotonic()
+        budget = self._budget()
+        delay = self._reserve(budget)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        if self.max_in_flight > 0:
+            with self._lock:
+                if self.in_flight < self.max_in_flight and not self._async_waiters:
+                    self.in_flight += 1
+                    fut = None
+                else:
+                    self._enqueue_check()
+                    fut = asyncio.get_running_loop().create_future()
+                    self._async_waiters.append(fut)
+            if fut is not None:
+                try:
+                    # a vaga é repassada já contada em in_flight (FIFO)
+                    await asyncio.wait_for(fut, max(start + budget - time.monotonic(), 0))
+                except asyncio.TimeoutError:
+                    with self._lock:
+                        self.stats["timeouts"] += 1
+                    raise UpstreamBusy(f"upstream '{self.name}': sem vaga após {budget:.1f}s "
+                                       f"({self.in_flight} em andamento)") from None
+                finally:
+                    with self._lock:
+                        self.queued -= 1
+                        if fut in self._async_waiters:
+                            self._async_waiters.remove(fut)
+        self._record_wait(time.monotonic() - start)
+
+    def release(self):
+        if self.max_in_flight <= 0:
+            return
+        with self._cond:
+            while self._async_waiters:
+                fut = self._async_waiters.popleft()
+                if not fut.done():
+                    fut.get_loop().call_soon_threadsafe(self._handoff, fut)
+                    return  # in_flight continua contando a vaga, agora do próximo
+            self.in_flight -= 1
+            self._cond.notify()
+
+    def _handoff(self, fut: asyncio.Future):
+        if fut.done():  # desistiu (timeout/cancelamento) enquanto a vaga vinha
+            self.release()
+        else:
+            fut.set_result(True)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                **self.stats,
+                "wait_total_s": round(self.stats["wait_total_s"], 3),
+                "wait_max_s": round(self.stats["wait_max_s"], 3),
+                "in_flight": self.in_flight, "queued": self.queued,
+                "max_in_flight": self.max_in_flight, "rps": self.rps,
+                "paused_s": round(max(self.blocked_until - time.monotonic(), 0.0), 1),
+            }
+
+# =========================
+# Registro (por host, por definição ou grupo nomeado)
+# =========================
+_LIMITERS: dict[str, Limiter] = {}
+_LOCK = threading.Lock()
+_NO_CFG: dict = {}  # sem bloco (defaults do .env): mesmo objeto em toda chamada
+
+def check_same_cfg(kind: str, name: str, cfgs: list, cfg: dict, ignore: tuple = (),
+                   hint: str = "use os mesmos valores"):
+    """
+    Registro compartilhado por host/grupo: confere (uma vez por bloco) se cfg bate com o 1º bloco
+    que criou o objeto; se não, avisa que o 1º continua valendo. cfgs é a lista do objeto.
+    """
+    with _LOCK:
+        if any(c is cfg for c in cfgs):
+            return
+        cfgs.append(cfg)
+    first = {k: v for k, v in cfgs[0].items() if k not in ignore}
+    other = {k: v for k, v in cfg.items() if k not in ignore}
+    if first != other:
+        warn(f"{kind}: '{name}' já configurado por outra definição com {first or 'os defaults'}; "
+             f"{other or 'os defaults'} ignorado ({hint})")
+
+@lru_cache(maxsize=1024)
+def origin(url: str) -> str:
+    u = httpx.URL(url)
+    return f"{u.scheme}://{u.host}:{u.port or (443 if u.scheme == 'https' else 80)}"
+
+def _defaults_active() -> bool:
+    return settings.UPSTREAM_MAX_IN_FLIGHT > 0 or settings.UPSTREAM_RPS > 0
+
+def limiter_for(cfg: Any, url: str, definition: str) -> Optional[Limiter]:
+    """Limiter da requisição; None sem limites (nem no bloco http, nem no .env)."""
+    if cfg is False or (not cfg and not _defaults_active()):
+        return None
+    cfg = cfg if isinstance(cfg, dict) else _NO_CFG
+    scope = cfg.get("scope") or "host"
+    name = origin(url) if scope == "host" else definition if scope == "definition" else scope
+    lim = _LIMITERS.get(name)
+    if lim is None:
+        with _LOCK:
+            lim = _LIMITERS.get(name)
+            if lim is None:
+                lim = _LIMITERS[name] = Limiter(name, cfg)
+                debug(f"limits: '{name}' (max_in_flight={lim.max_in_flight}, rps={lim.rps})")
+                return lim
+    if not any(c is cfg for c in lim.cfgs):
+        check_same_cfg("limits", name, lim.cfgs, cfg, ignore=("scope",), hint="use um scope próprio ou os mesmos valores")
+    return lim
+
+def limits_stats() -> Dict[str, Dict[str, Any]]:
+    """Fila, espera e vagas por upstream."""
+    return {name: lim.snapshot() for name, lim in list(_LIMITERS.items())}
@@ -8,21 +8,23 @@ from typing import Any, Dict, Optional
 
 from mcp.server.fastmcp import FastMCP
 from ..settings import settings
-from ..utils import coerce_args, pytype, safe_format
-from ..http_client import http_call
+from ..utils import coerce_args, pytype, args_ctx
+from ..prompt_render import RenderPlan
+from ..http_client import http_call, http_call_async, compile_http
+from ..blobs import register_blob_resource
+from ..metrics import instrument
 
 mcp: FastMCP = settings.mcp
 
 def _register_static_prompt(name: str, description: Optional[str], template: str):
     debug(f"  Static prompt: {name} - {description}")
-    @mcp.prompt(name=name, description=description)
     def _p() -> str:
         return template
+    mcp.prompt(name=name, description=description)(instrument("prompt", name, _p))
     return _p
 
 def _register_param_prompt(name: str, description: Optional[str], template: str, param_keys: list[str]):
     debug(f"  Param prompt: {name} - {description}")
-    @mcp.prompt(name=name, description=description)
     def _p(args: dict[str, str]) -> str:
         args = args or {}
         try:
@@ -30,6 +32,7 @@ def _register_param_prompt(name: str, description: Optional[str], template: str,
         except KeyError as e:
             missing = str(e).strip("'")
             return f"[prompt:{name}] argumento obrigatório ausente: {missing}"
+    mcp.prompt(name=name, description=description)(instrument("prompt", name, _p))
     return _p
 
 def _register_http_prompt(defn: dict):
@@ -38,27 +41,23 @@ def _register_http_prompt(defn: dict):
 
     debug(f"  HTTP prompt: {name} - {description}")
 
-    http_cfg = defn["http"]
+    plan = compile_http(defn["http"])  # templates parseados uma vez só
     arg_spec: Dict[str, str] = defn.get("args") or {}
-    render = defn.get("render") or {}
-    template = render.get("template") or "{text}"
-
-    def _p(**arguments) -> str:
-        args = coerce_args(arg_spec, arguments)
-        ctx = {**os.environ, **{k: str(v) for k, v in args.items()}}
-        rmode, payload = http_call(http_cfg, ctx)
-
-        if rmode == "json":
-            titles = []
-            if isinstance(payload, list):
-                titles = [str(x.get("title", "")) for x in payload if isinstance(x, dict)]
-            ctx2 = {**ctx, "titles": ", ".join([t for t in titles if t]),
-                    "json": json.dumps(payload, ensure_ascii=False)}
-            return safe_format(template, ctx2)
-        elif rmode == "text":
-            return safe_format(template, {**ctx, "text": str(payload)})
-        else:
-            return safe_format(template, {**ctx, "text": "<binary>"})
+    if plan.stream:
+        register_blob_resource(mcp)
+    # só as variáveis que o template referencia são calculadas, com teto de tamanho e tempo
+    render = RenderPlan(name, defn.get("render"))
+
+    if settings.HTTP_ASYNC:
+        async def _p(**arguments) -> str:
+            args = coerce_args(arg_spec, arguments)
+            ctx = args_ctx(args)
+            return render.render(ctx, *await http_call_async(plan, ctx))
+    else:
+        def _p(**arguments) -> str:
+            args = coerce_args(arg_spec, arguments)
+            ctx = args_ctx(args)
+            return render.render(ctx, *http_call(plan, ctx))
 
     params = [
         inspect.Parameter(n, kind=inspect.Parameter.KEYWORD_ONLY,
@@ -70,31 +69,45 @@ def _register_http_prompt(defn: dict):
     ann["return"] = str
     _p.__annotations__ = ann
 
-    mcp.prompt(name=name, description=description)(_p)
+    mcp.prompt(name=name, description=description)(instrument("prompt", name, _p))
 
-def load_prompts_from_file(path: str):
-    if not os.path.exists(path):
+def prompt_key(defn: dict) -> Optional[str]:
+    """Nome do prompt, ou None se a definição não é registrável (sem nome ou sem conteúdo)."""
+    name = defn.get("name")
+    if not name or not ("http" in defn or defn.get("content") or defn.get("text")):
+        return None
+    return name
+
+def register_prompt(defn: dict):
+    name = defn["name"]
+    if "http" in defn:
+        _register_http_prompt(defn)
         return
+    template = defn.get("content") or defn.get("text")
+    description = defn.get("description")
+    params = defn.get("params") or []
+    if params:
+        _register_param_prompt(name, description, template, params)
+    else:
+        _register_static_prompt(name, description, template)
+
+def unregister_prompt(name: str):
+    mcp._prompt_manager._prompts.pop(name, None)
+
+def read_prompts_file(path: str) -> list:
+    if not os.path.exists(path):
+        return []
     with open(path, "r", encoding="utf-8") as f:
         items = json.load(f)
     if not isinstance(items, list):
         raise ValueError("prompts.json deve ser uma lista de objetos")
+    return items
+
+def load_prompts_from_file(path: str):
+    items = read_prompts_file(path)
 
     debug(f"Carregando prompts de {path}")
 
     for it in items:
-        name = it.get("name")
-        if not name:
-            continue
-        if "http" in it:
-            _register_http_prompt(it)
-        else:
-            template = it.get("content") or it.get("text")
-            description = it.get("description")
-            params = it.get("params") or []
-            if not template:
-                continue
-            if params:
-                _register_param_prompt(name, description, template, params)
-            else:
-                _register_static_prompt(name, description, template)
+        if prompt_key(it) is not None:
+            register_prompt(it)
@@ -1,16 +1,23 @@
 from __future__ import annotations
-from ..utils import coerce_args, pytype, debug, info
+from ..utils import coerce_args, pytype, debug, info, warn
 
 import os
 import re
 import json
 import inspect
-from typing import Any, Dict
+import anyio
+from typing import Any, Dict, Optional
 
 from mcp.server.fastmcp import FastMCP
 from ..settings import settings
-from ..utils import coerce_args, pytype
-from ..http_client import http_call, infer_mime
+from ..utils import coerce_args, pytype, args_ctx
+from ..http_client import http_call, http_call_async, infer_mime, compile_http
+from ..blobs import register_blob_resource
+from ..batching import make_batcher
+from ..metrics import instrument
+from ..serializer import dumps
+from ..paging import to_text, register_page_tool
+from ..prefetch import prefetch_options, register_prefetch, unregister_prefetch, warm_payload, store_warm
 
 mcp: FastMCP = settings.mcp
 _PLACEHOLDER_RE = re.compile(r"{(\w+)}")
@@ -22,22 +29,61 @@ def _register_http_resource(defn: dict):
     uri = defn["uri"]
     description = defn.get("description")
     http_cfg = defn["http"]
+    plan = compile_http(http_cfg)  # templates parseados uma vez só
     arg_spec: Dict[str, str] = defn.get("args") or {}
+    if plan.stream:
+        register_blob_resource(mcp)
+    batcher = make_batcher(uri, defn, plan)  # agrupa leituras de ids diferentes numa requisição
 
     mime = defn.get("mime_type") or infer_mime(http_cfg)
     placeholders = _placeholders_in_uri(uri)
+    page_chars = int(defn.get("page_chars", settings.RESULT_PAGE_CHARS))
+    if page_chars > 0:
+        register_page_tool(mcp)
+    prefetch = prefetch_options(defn.get("prefetch"))
+    if prefetch is not None and (placeholders or plan.stream):
+        warn(f"resource {uri}: prefetch só vale para URI sem placeholders e sem stream; ignorado")
+        prefetch = None
+
+    def _render(mode: str, payload: Any):
+        if mode == "json":
+            # acima de page_chars: primeira página + cursor para hub_next_page
+            return to_text(payload, page_chars)
+        elif mode == "text":
+            return payload
+        elif mode == "stream":
+            # acima de inline_bytes: manifesto com as partes em blob://{blob_id}/{index}
+            return dumps(payload.manifest())
+        else:
+            return payload  # bytes
+
+    async def _fetch():
+        # busca do resource estático (agendador do prefetch e leitura sem valor quente)
+        if settings.HTTP_ASYNC:
+            return await http_call_async(plan, args_ctx({}))
+        return await anyio.to_thread.run_sync(http_call, plan, args_ctx({}))
 
     def _make_handler(param_names: list[str]):
-        def _handler(**kwargs):
-            args = coerce_args(arg_spec, kwargs) if arg_spec else kwargs
-            ctx = {**os.environ, **{k: str(v) for k, v in args.items()}}
-            mode, payload = http_call(http_cfg, ctx)
-            if mode == "json":
-                return json.dumps(payload, ensure_ascii=False)
-            elif mode == "text":
-                return payload
-            else:
-                return payload  # bytes
+        if prefetch is not None:
+            # resource estático: responde do warm store; na falta dele busca e já o aquece
+            async def _handler():
+                warm = warm_payload(uri)
+                if warm is None:
+                    warm = await _fetch()
+                    store_warm(uri, *warm)
+                return _render(*warm)
+        elif settings.HTTP_ASYNC:
+            async def _handler(**kwargs):
+                args = coerce_args(arg_spec, kwargs) if arg_spec else kwargs
+                if batcher is not None:
+                    return _render(*await batcher.load(args))
+                ctx = args_ctx(args)
+                return _render(*await http_call_async(plan, ctx))
+        else:
+            def _handler(**kwargs):
+                args = coerce_args(arg_spec, kwargs) if arg_spec else kwargs
+                ctx = args_ctx(args)
+                return _render(*http_call(plan, ctx))
 
         params = [
             inspect.Parameter(n, kind=inspect.Parameter.KEYWORD_ONLY,
@@ -54,16 +100,33 @@ def _register_http_resource(defn: dict):
 
     handler = _make_handler(placeholders)
     debug(f"  Resource: {description}")
-    mcp.resource(uri, description=description, mime_type=mime)(handler)
+    mcp.resource(uri, description=description, mime_type=mime)(instrument("resource", uri, handler))
+    if prefetch is not None:
+        register_prefetch(uri, _fetch, prefetch)
 
-def load_resources_from_file(path: str):
+def resource_key(defn: dict) -> Optional[str]:
+    return defn["uri"] if "uri" in defn and "http" in defn else None
+
+def register_resource(defn: dict):
+    _register_http_resource(defn)
+
+def unregister_resource(uri: str):
+    unregister_prefetch(uri)
+    # FastMCP guarda resources fixos e templates ({param}) em dicts separados
+    mcp._resource_manager._resources.pop(uri, None)
+    mcp._resource_manager._templates.pop(uri, None)
+
+def read_resources_file(path: str) -> list:
     if not os.path.exists(path):
-        return
+        return []
     with open(path, "r", encoding="utf-8") as f:
         items = json.load(f)
     if not isinstance(items, list):
         raise ValueError("resources.json deve ser uma lista de objetos")
-    for it in items:
+    return items
+
+def load_resources_from_file(path: str):
+    for it in read_resources_file(path):
         debug(f"Carregando resources de {path}")
-        if "uri" in it and "http" in it:
-            _register_http_resource(it)
+        if resource_key(it) is not None:
+            register_resource(it)
@@ -1,42 +1,149 @@
 from __future__ import annotations
-from ..utils import coerce_args, pytype, debug, info
+from ..utils import coerce_args, pytype, debug, info, warn
 
 import os
 import json
 import inspect
-from typing import Any, Dict
+from typing import Any, Dict, Optional
 
 from mcp.server.fastmcp import FastMCP
 from ..settings import settings
-from ..utils import coerce_args, pytype
-from ..http_client import http_call
+from ..utils import coerce_args, pytype, args_ctx
+from ..http_client import http_call, http_call_async, compile_http, check_http, note_http
+from ..blobs import register_blob_resource
+from ..batching import make_batcher
+from ..composite import CompositePlan, run_composite, run_composite_async
+from ..metrics import instrument
+from ..paging import to_text, register_page_tool
+from ..catalog import install_catalog, add_tool, remove_tool, read_snapshot, write_snapshot
 
 # Reutilizamos o mesmo FastMCP para todo o servidor
 mcp: FastMCP = settings.mcp
 
-def _register_http_tool(defn: dict):
+def _signature(arg_spec: Dict[str, str]) -> inspect.Signature:
+    return inspect.Signature(parameters=[
+        inspect.Parameter(pname, kind=inspect.Parameter.KEYWORD_ONLY, annotation=pytype(typ))
+        for pname, typ in arg_spec.items()
+    ])
+
+def _page_chars(defn: dict) -> int:
+    page_chars = int(defn.get("page_chars", settings.RESULT_PAGE_CHARS))
+    if page_chars > 0:
+        register_page_tool(mcp)  # páginas seguintes de resultados grandes via hub_next_page
+    return page_chars
+
+def _description(defn: dict) -> str:
+    return defn.get("description") or f"{'HTTP' if 'http' in defn else 'Composite'} tool {defn['name']}"
+
+def _result(mode: str, payload: Any, page_chars: int) -> Any:
+    """
+    Sem paginação (page_chars 0), o payload vai como veio e o FastMCP monta o conteúdo estruturado.
+    Com paginação, o JSON é serializado aqui: um bloco de texto, paginado acima de page_chars.
+    """
+    if mode == "stream":
+        payload = payload.manifest()
+    elif mode != "json" or isinstance(payload, str):
+        return payload
+    return to_text(payload, page_chars) if page_chars > 0 else payload
+
+def _build_http_tool(defn: dict):
     name = defn["name"]
-    description = defn.get("description") or f"HTTP tool {name}"
-    http_cfg = defn["http"]
+    description = _description(defn)
+    plan = compile_http(defn["http"])  # templates parseados uma vez só
     arg_spec: Dict[str, str] = defn.get("args") or {}
+    if plan.stream:
+        register_blob_resource(mcp)  # respostas grandes são lidas em partes via blob://
+    batcher = make_batcher(name, defn, plan)
+    page_chars = _page_chars(defn)
 
-    def _impl(**arguments):
-        args = coerce_args(arg_spec, arguments)
-        ctx = {**os.environ, **{k: str(v) for k, v in args.items()}}
-        _, payload = http_call(http_cfg, ctx)
-        return payload
+    if settings.HTTP_ASYNC:
+        async def _impl(**arguments):
+            args = coerce_args(arg_spec, arguments)
+            if batcher is not None:
+                mode, payload = await batcher.load(args)
+            else:
+                mode, payload = await http_call_async(plan, args_ctx(args))
+            return _result(mode, payload, page_chars)
+    else:
+        def _impl(**arguments):
+            args = coerce_args(arg_spec, arguments)
+            ctx = args_ctx(args)
+            mode, payload = http_call(plan, ctx)
+            return _result(mode, payload, page_chars)
 
-    params = [
-        inspect.Parameter(pname, kind=inspect.Parameter.KEYWORD_ONLY, annotation=pytype(typ))
-        for pname, typ in arg_spec.items()
-    ]
-    _impl.__signature__ = inspect.Signature(parameters=params)
+    _impl.__signature__ = _signature(arg_spec)
+    return name, description, _impl
+
+def _build_composite_tool(defn: dict):
+    name = defn["name"]
+    description = _description(defn)
+    plan = CompositePlan(name, defn)  # passos compilados e ordenados no load
+    arg_spec: Dict[str, str] = defn.get("args") or {}
+    if any(s.plan.stream for s in plan.steps):
+        register_blob_resource(mcp)
+    page_chars = _page_chars(defn)
 
+    if settings.HTTP_ASYNC:
+        async def _impl(**arguments):
+            return _result("json", await run_composite_async(plan, coerce_args(arg_spec, arguments)), page_chars)
+    else:
+        def _impl(**arguments):
+            return _result("json", run_composite(plan, coerce_args(arg_spec, arguments)), page_chars)
+
+    _impl.__signature__ = _signature(arg_spec)
+    return name, description, _impl
+
+def build_tool(defn: dict):
+    """(nome, descrição, handler) da definição; compila os templates, então também valida."""
+    return _build_http_tool(defn) if "http" in defn else _build_composite_tool(defn)
+
+def check_tool(defn: dict):
+    """Validação do catálogo preguiçoso: estrutura, templates e filtros, sem montar o handler."""
+    name = defn["name"]
+    if "http" in defn:
+        check_http(defn["http"], name)
+        if isinstance(defn.get("batch"), dict):
+            check_http(defn["batch"].get("http"), f"{name}.batch")
+        return
+    steps = defn.get("steps")
+    if not isinstance(steps, list) or not steps:
+        raise ValueError(f"{name}: 'steps' deve ser uma lista não vazia")
+    for step in steps:
+        if not isinstance(step, dict) or not step.get("id"):
+            raise ValueError(f"{name}: cada passo requer 'id' e 'http'")
+        check_http(step.get("http"), f"{name}.{step['id']}")
+
+def _http_cfgs(defn: dict) -> list:
+    if "http" in defn:
+        batch = defn.get("batch")
+        return [defn["http"]] + ([batch["http"]] if isinstance(batch, dict) and batch.get("http") else [])
+    return [s["http"] for s in defn.get("steps") or []]
+
+def tool_key(defn: dict) -> Optional[str]:
+    """Nome da tool, ou None se a definição não é registrável."""
+    if "name" in defn and ("http" in defn or "steps" in defn):
+        return defn["name"]
+    return None
+
+def register_tool(defn: dict):
+    if settings.CATALOG_LAZY:
+        # só a definição (validada) fica guardada; handler e Tool do FastMCP na primeira chamada
+        check_tool(defn)
+        install_catalog(mcp, build_tool)
+        add_tool(defn["name"], _description(defn), defn)
+        return
+    name, description, fn = build_tool(defn)
     debug(f"  Tool carregada: {name} - {description}")
+    mcp.tool(name=name, description=description)(instrument("tool", name, fn))
 
-    mcp.tool(name=name, description=description)(_impl)
+def unregister_tool(name: str):
+    if settings.CATALOG_LAZY:
+        remove_tool(name)
+    else:
+        mcp._tool_manager._tools.pop(name, None)
+        mcp._mcp_server._tool_cache.pop(name, None)  # schema cacheado pelo servidor low-level
 
-def load_tools_from_file(path: str):
+def read_tools_file(path: str) -> list:
     if not os.path.exists(path):
         raise ValueError("tools.json: arquivo não encontrado")
 
@@ -45,9 +152,46 @@ def load_tools_from_file(path: str):
 
     if not isinstance(items, list):
         raise ValueError("tools.json deve ser uma lista de objetos")
+    return items
+
+def load_tools(path: str) -> Dict[str, dict]:
+    """
+    Carga inicial das tools: nome -> definição registrada.
+    Com CATALOG_SNAPSHOT, um snapshot do mesmo tools.json dispensa a leitura e a validação.
+    """
+    snapshot = settings.CATALOG_SNAPSHOT if settings.CATALOG_LAZY else ""
+    if snapshot and os.path.exists(path):
+        entries = read_snapshot(snapshot, path)
+        if entries is not None:
+            install_catalog(mcp, build_tool)
+            for name, description, defn, schema in entries:
+                add_tool(name, description, defn, schema)
+                for cfg in _http_cfgs(defn):
+                    note_http(cfg)  # hosts para o warm-up, como faria o check_tool
+            info(f"{len(entries)} tools carregadas do snapshot {snapshot}")
+            return {name: defn for name, _, defn, _ in entries}
+
+    loaded: Dict[str, dict] = {}
+    for it in read_tools_file(path):
+        key = tool_key(it) if isinstance(it, dict) else None
+        if key is None:
+            continue
+        if key in loaded:
+            warn(f"tool '{key}' duplicada; mantendo a primeira definição")
+            continue
+        register_tool(it)
+        loaded[key] = it
+    if settings.CATALOG_LAZY:
+        debug(f"  {len(loaded)} tools no catálogo (materializadas sob demanda)")
+    if snapshot:
+        write_snapshot(snapshot, path)
+    return loaded
+
+def load_tools_from_file(path: str):
+    items = read_tools_file(path)
 
     debug(f"Carregando tools de {path}")
 
     for it in items:
-        if "name" in it and "http" in it:
-            _register_http_tool(it)
+        if tool_key(it) is not None:
+            register_tool(it)
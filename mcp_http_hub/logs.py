@@ -0,0 +1,229 @@
+from __future__ import annotations
+
+import os
+import sys
+import json
+import time
+import atexit
+import random
+import logging
+import itertools
+import threading
+import contextvars
+from collections import deque
+from typing import Any, Optional
+
+from .settings import settings
+
+# =========================
+# Logs (LOG_LEVEL / LOG_FORMAT / LOG_ASYNC / LOG_DEBUG_SAMPLE / SLOW_CALL_MS)
+# =========================
+# O nível é checado antes de qualquer formatação: debug("cache: %s", nome) não monta a
+# string quando o nível está acima de DEBUG. Eventos vão para uma fila e uma thread formata e
+# escreve em lotes no stdout (um flush por lote); LOG_ASYNC=false volta à escrita direta.
+#   LOG_FORMAT=text   "INFO:     mensagem chave=valor" (estilo uvicorn)
+#   LOG_FORMAT=json   uma linha JSON por evento: ts, level, msg, logger, request_id, campos extras
+# Os loggers da stdlib (mcp, httpx, uvicorn) passam pela mesma fila (install_stdlib_logging).
+# Os args (%s) são formatados na thread de escrita: passe valores imutáveis.
+
+LEVEL_ORDER = {"DEBUG": 10, "INFO": 20, "WARNING": 30, "ERROR": 40}
+CURRENT_LEVEL = LEVEL_ORDER.get(settings.LOG_LEVEL.upper(), 20)
+DEBUG_ENABLED = CURRENT_LEVEL <= 10
+
+COLORS = {
+    "DEBUG": "\033[94m",   # azul
+    "INFO": "\033[38;5;2m",    # verde
+    "WARNING": "\033[93m", # amarelo
+    "ERROR": "\033[91m",   # vermelho
+}
+RESET = "\033[0m"
+
+# id da chamada em andamento (tools/resources/prompts), incluído em todas as linhas dela
+_REQUEST_ID: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("hub_request_id", default=None)
+_IDS = itertools.count(1)
+_ID_PREFIX = f"{os.getpid():x}-"
+
+# ---------- formatação (na thread de escrita)
+def _message(msg: Any, args: tuple) -> str:
+    msg = str(msg)
+    if args:
+        try:
+            return msg % args
+        except (TypeError, ValueError):
+            return f"{msg} {args!r}"
+    return msg
+
+def _format(item: tuple) -> str:
+    ts, level, msg, args, fields, rid, logger, exc = item
+    text = _message(msg, args)
+    if exc:
+        text += "\n" + logging.Formatter().formatException(exc)
+    if settings.LOG_FORMAT == "json":
+        out = {"ts": round(ts, 6), "level": level.lower(), "msg": text, "logger": logger}
+        if rid is not None:
+            out["request_id"] = rid
+        if fields:
+            out.update(fields)
+        return json.dumps(out, ensure_ascii=False, default=str) + "\n"
+    line = f"{COLORS.get(level, '')}{level}:{RESET}    {text}"
+    if rid is not None:
+        line += f" request_id={rid}"
+    if fields:
+        line += "".join(f" {k}={v}" for k, v in fields.items())
+    return line + "\n"
+
+# ---------- escrita
+class _Writer:
+    """
+    deque + thread que escreve em lotes a cada _INTERVAL s (o chamador só faz um append,
+    sem lock nem sinalização); cheia, descarta as linhas mais antigas e avisa quantas perdeu.
+    """
+
+    def __init__(self, stream, maxsize: int):
+        self.stream = stream
+        self.maxsize = maxsize
+        self.items: "deque[tuple]" = deque(maxlen=maxsize)
+        self.dropped = 0   # total desde o início
+        self._reported = 0
+        self.written = 0
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+        self._write_lock = threading.Lock()
+
+    def put(self, item: tuple):
+        if self._thread is None:
+            self._start()
+        if len(self.items) >= self.maxsize:
+            self.dropped += 1
+        self.items.append(item)
+
+    def _start(self):
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="hub-log-writer", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(_INTERVAL)
+            self.drain()
+
+    def drain(self):
+        with self._write_lock:
+            items = []
+            try:
+                while True:
+                    items.append(self.items.popleft())
+            except IndexError:
+                pass
+            self._write(items)
+
+    def _write(self, items: list):
+        lines = []
+        dropped = self.dropped - self._reported
+        if dropped:
+            self._reported += dropped
+            lines.append(_format((time.time(), "WARNING", "log: %d linhas descartadas (fila cheia)",
+                                  (dropped,), None, None, "hub", None)))
+        for item in items:
+            try:
+                lines.append(_format(item))
+            except Exception as e:  # uma linha ruim não derruba o writer
+                lines.append(f"log: linha não formatada ({type(e).__name__}: {e})\n")
+        if lines:
+            try:
+                self.stream.write("".join(lines))
+                self.stream.flush()
+            except (OSError, ValueError):
+                pass  # stdout fechado (shutdown)
+            self.written += len(lines)
+
+    def flush(self):
+        """Escreve o que estiver na fila (shutdown, testes)."""
+        self.drain()
+
+_INTERVAL = 0.05  # s entre lotes
+_WRITER = _Writer(sys.stdout, max(settings.LOG_QUEUE_SIZE, 1))
+atexit.register(_WRITER.flush)
+
+def _emit(item: tuple):
+    if settings.LOG_ASYNC:
+        _WRITER.put(item)
+    else:
+        with _WRITER._write_lock:
+            _WRITER._write([item])
+
+# ---------- API
+def log(level: str, msg: Any, *args: Any, **fields: Any):
+    level = level.upper()
+    if LEVEL_ORDER.get(level, 0) < CURRENT_LEVEL:
+        return
+    _emit((time.time(), level, msg, args, fields, _REQUEST_ID.get(), "hub", None))
+
+def debug(msg: Any, *args: Any, **fields: Any):
+    if DEBUG_ENABLED:
+        _emit((time.time(), "DEBUG", msg, args, fields, _REQUEST_ID.get(), "hub", None))
+
+def debug_sampled(msg: Any, *args: Any, **fields: Any):
+    """Debug de alto volume (por requisição): só uma fração LOG_DEBUG_SAMPLE é escrita."""
+    if DEBUG_ENABLED and (settings.LOG_DEBUG_SAMPLE >= 1.0 or random.random() < settings.LOG_DEBUG_SAMPLE):
+        _emit((time.time(), "DEBUG", msg, args, fields, _REQUEST_ID.get(), "hub", None))
+
+def info(msg: Any, *args: Any, **fields: Any):  log("INFO", msg, *args, **fields)
+def warn(msg: Any, *args: Any, **fields: Any):  log("WARNING", msg, *args, **fields)
+def error(msg: Any, *args: Any, **fields: Any): log("ERROR", msg, *args, **fields)
+
+def flush_logs():
+    _WRITER.flush()
+
+def log_stats() -> dict:
+    return {"queued": len(_WRITER.items), "dropped": _WRITER.dropped, "written": _WRITER.written}
+
+# =========================
+# Chamadas (request id, duração, chamadas lentas)
+# =========================
+def call_logging() -> bool:
+    """Se vale envolver os handlers para logar as chamadas (debug ativo ou SLOW_CALL_MS > 0)."""
+    return DEBUG_ENABLED or settings.SLOW_CALL_MS > 0
+
+def begin_call() -> contextvars.Token:
+    return _REQUEST_ID.set(_ID_PREFIX + format(next(_IDS), "x"))
+
+def end_call(token: contextvars.Token, kind: str, name: str, seconds: float, err: Optional[BaseException]):
+    ms = round(seconds * 1000.0, 3)
+    try:
+        fields = {"kind": kind, "name": name, "duration_ms": ms}
+        if err is not None:
+            fields["error"] = type(err).__name__
+        if 0 < settings.SLOW_CALL_MS <= ms:
+            warn("chamada lenta: %s %s (%.1f ms)", kind, name, ms, **fields)
+        elif err is not None:
+            debug("chamada: %s %s (%.1f ms)", kind, name, ms, **fields)  # erros fora da amostragem
+        else:
+            debug_sampled("chamada: %s %s (%.1f ms)", kind, name, ms, **fields)
+    finally:
+        _REQUEST_ID.reset(token)
+
+# =========================
+# stdlib logging (mcp, httpx, uvicorn) na mesma fila
+# =========================
+class _QueueHandler(logging.Handler):
+    def emit(self, record: logging.LogRecord):
+        level = record.levelname if record.levelname in LEVEL_ORDER else ("ERROR" if record.levelno >= 40 else "INFO")
+        _emit((record.created, level, record.msg, record.args or (), None, _REQUEST_ID.get(), record.name,
+               record.exc_info))
+
+_INSTALLED = False
+
+def install_stdlib_logging():
+    """Troca os handlers do root (o FastMCP instala um StreamHandler síncrono) pela fila."""
+    global _INSTALLED
+    if _INSTALLED:
+        return
+    _INSTALLED = True
+    root = logging.getLogger()
+    for h in list(root.handlers):
+        root.removeHandler(h)
+    root.addHandler(_QueueHandler())
+    # bibliotecas em DEBUG geram muito volume: o root fica no mínimo em INFO
+    root.setLevel(max(CURRENT_LEVEL, logging.INFO))
@@ -0,0 +1,276 @@
+from __future__ import annotations
+
+import time
+import inspect
+import functools
+import threading
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Optional, Sequence, Tuple
+
+import httpx
+
+from .settings import settings
+from .logs import call_logging, begin_call, end_call
+from .deadlines import cancel_on_disconnect
+
+# =========================
+# Métricas no formato texto do Prometheus (GET /metrics)
+# =========================
+# Sem dependência externa: contadores, gauges e histogramas simples com labels.
+#   mcp_hub_calls_total / mcp_hub_call_errors_total / mcp_hub_call_duration_seconds / mcp_hub_calls_in_flight
+#       por kind (tool|resource|prompt) e name; erros por classe da exceção
+#   mcp_hub_upstream_*          por upstream (scheme://host:port): status, tamanho da resposta,
+#       fases (connect, tls, ttfb, body) via extensão "trace" do httpcore, conexões novas, em andamento
+#   mcp_hub_filter_ratio        itens devolvidos / itens recebidos pelo http.filter
+# Com isso dá para separar o tempo gasto no hub (handler - upstream) do tempo no upstream.
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216, 67108864)
+RATIO_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 0.75, 0.9, 1.0)
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+def _fmt(v: float) -> str:
+    return str(int(v)) if float(v).is_integer() else repr(float(v))
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help_text: str, labels: Sequence[str]):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self._values: Dict[Tuple[str, ...], Any] = {}
+        self._lock = threading.Lock()
+        _REGISTRY.append(self)
+
+    def _labelset(self, values: Tuple[str, ...], extra: str = "") -> str:
+        pairs = [f'{k}="{_escape(str(v))}"' for k, v in zip(self.labels, values)]
+        if extra:
+            pairs.append(extra)
+        return "{" + ",".join(pairs) + "}" if pairs else ""
+
+    def render(self) -> list[str]:
+        out = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for values, v in items:
+            out.extend(self._lines(values, v))
+        return out
+
+    def _lines(self, values: Tuple[str, ...], v: Any) -> list[str]:
+        return [f"{self.name}{self._labelset(values)} {_fmt(v)}"]
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, *values: str, amount: float = 1):
+        with self._lock:
+            self._values[values] = self._values.get(values, 0) + amount
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def inc(self, *values: str, amount: float = 1):
+        with self._lock:
+            self._values[values] = self._values.get(values, 0) + amount
+
+    def dec(self, *values: str):
+        self.inc(*values, amount=-1)
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labels: Sequence[str], buckets: Sequence[float]):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value: float, *values: str):
+        idx = bisect_left(self.buckets, value)
+        with self._lock:
+            h = self._values.get(values)
+            if h is None:
+                # [contagem por bucket (não cumulativa) + overflow, soma]
+                h = self._values[values] = [[0] * (len(self.buckets) + 1), 0.0]
+            h[0][idx] += 1
+            h[1] += value
+
+    def _lines(self, values: Tuple[str, ...], h: Any) -> list[str]:
+        counts, total = h
+        out, acc = [], 0
+        for le, n in zip(self.buckets, counts):
+            acc += n
+            le_label = 'le="%s"' % _fmt(le)
+            out.append(f"{self.name}_bucket{self._labelset(values, le_label)} {acc}")
+        acc += counts[-1]
+        inf_label = 'le="+Inf"'
+        out.append(f"{self.name}_bucket{self._labelset(values, inf_label)} {acc}")
+        out.append(f"{self.name}_sum{self._labelset(values)} {_fmt(round(total, 6))}")
+        out.append(f"{self.name}_count{self._labelset(values)} {acc}")
+        return out
+
+_REGISTRY: list[_Metric] = []
+
+CALLS = Counter("mcp_hub_calls_total", "Chamadas de tools/resources/prompts.", ("kind", "name"))
+CALL_ERRORS = Counter("mcp_hub_call_errors_total", "Chamadas que falharam, por classe da exceção.",
+                      ("kind", "name", "error"))
+CALL_SECONDS = Histogram("mcp_hub_call_duration_seconds", "Duração do handler (hub + upstream).",
+                         ("kind", "name"), LATENCY_BUCKETS)
+CALLS_IN_FLIGHT = Gauge("mcp_hub_calls_in_flight", "Chamadas em andamento.", ("kind", "name"))
+
+UPSTREAM_RESPONSES = Counter("mcp_hub_upstream_responses_total", "Respostas do upstream por status.",
+                             ("upstream", "method", "status"))
+UPSTREAM_ERRORS = Counter("mcp_hub_upstream_errors_total", "Falhas de transporte ao falar com o upstream.",
+                          ("upstream", "error"))
+UPSTREAM_BYTES = Histogram("mcp_hub_upstream_response_bytes", "Tamanho das respostas do upstream (bytes no fio).",
+                           ("upstream",), SIZE_BUCKETS)
+UPSTREAM_PHASE = Histogram("mcp_hub_upstream_phase_seconds",
+                           "Tempo por fase da requisição ao upstream: connect, tls, ttfb, body.",
+                           ("upstream", "phase"), LATENCY_BUCKETS)
+UPSTREAM_CONNECTIONS = Counter("mcp_hub_upstream_connections_total", "Conexões TCP novas (sem reuso do pool).",
+                               ("upstream",))
+UPSTREAM_IN_FLIGHT = Gauge("mcp_hub_upstream_in_flight", "Requisições ao upstream em andamento.", ("upstream",))
+FILTER_RATIO = Histogram("mcp_hub_filter_ratio", "Itens devolvidos / itens recebidos pelo http.filter.",
+                         ("definition",), RATIO_BUCKETS)
+
+def render_metrics() -> str:
+    lines: list[str] = []
+    for m in _REGISTRY:
+        lines.extend(m.render())
+    return "\n".join(lines) + "\n"
+
+# =========================
+# Handlers (tool/resource/prompt)
+# =========================
+def instrument(kind: str, name: str, fn: Callable) -> Callable:
+    """
+    Envolve o handler registrado no FastMCP (preserva assinatura, sync ou async):
+    métricas (METRICS), log por chamada com request id e duração (logs.call_logging) e
+    cancelamento quando o cliente desconecta (deadlines.cancel_on_disconnect).
+    """
+    fn = cancel_on_disconnect(fn)
+    metrics, logged = settings.METRICS, call_logging()
+    if not metrics and not logged:
+        return fn
+
+    def _begin():
+        if metrics:
+            CALLS.inc(kind, name)
+            CALLS_IN_FLIGHT.inc(kind, name)
+        return begin_call() if logged else None
+
+    def _done(token, start: float, error: Optional[BaseException]):
+        elapsed = time.perf_counter() - start
+        if metrics:
+            CALLS_IN_FLIGHT.dec(kind, name)
+            CALL_SECONDS.observe(elapsed, kind, name)
+            if error is not None:
+                CALL_ERRORS.inc(kind, name, type(error).__name__)
+        if token is not None:
+            end_call(token, kind, name, elapsed, error)
+
+    if inspect.iscoroutinefunction(fn):
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            token = _begin()
+            start, error = time.perf_counter(), None
+            try:
+                return await fn(*args, **kwargs)
+            except BaseException as e:
+                error = e
+                raise
+            finally:
+                _done(token, start, error)
+    else:
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            token = _begin()
+            start, error = time.perf_counter(), None
+            try:
+                return fn(*args, **kwargs)
+            except BaseException as e:
+                error = e
+                raise
+            finally:
+                _done(token, start, error)
+    return wrapper
+
+# =========================
+# Upstream (fases via extensão "trace" do httpcore)
+# =========================
+class PhaseTrace:
+    """
+    Callback da extensão "trace": marca o início/fim de cada fase e observa
+    os tempos quando a resposta é fechada (corpo lido por inteiro).
+    Conexões reaproveitadas do pool não têm connect/tls.
+    """
+    __slots__ = ("upstream", "marks")
+
+    _PHASES = (
+        ("connect", "connect_tcp.started", "connect_tcp.complete"),
+        ("tls", "start_tls.started", "start_tls.complete"),
+        ("ttfb", "send_request_headers.started", "receive_response_headers.complete"),
+        ("body", "receive_response_body.started", "receive_response_body.complete"),
+    )
+
+    def __init__(self, upstream: str):
+        self.upstream = upstream
+        self.marks: Dict[str, float] = {}
+
+    def __call__(self, event: str, info: dict):
+        # event: "<conexão|http11|http2>.<fase>.<started|complete|failed>"
+        _, _, ev = event.partition(".")
+        self.marks[ev] = time.perf_counter()
+        if ev == "connect_tcp.complete":
+            UPSTREAM_CONNECTIONS.inc(self.upstream)
+        elif ev == "response_closed.complete":
+            self._observe()
+
+    async def atrace(self, event: str, info: dict):
+        self(event, info)
+
+    def _observe(self):
+        marks = self.marks
+        for phase, begin, end in self._PHASES:
+            if begin in marks and end in marks:
+                UPSTREAM_PHASE.observe(marks[end] - marks[begin], self.upstream, phase)
+        marks.clear()
+
+def trace_request(request, upstream: str, is_async: bool):
+    """Anexa o PhaseTrace à requisição httpx (sem efeito com METRICS=false)."""
+    if settings.METRICS:
+        tracer = PhaseTrace(upstream)
+        request.extensions["trace"] = tracer.atrace if is_async else tracer
+    return request
+
+@contextmanager
+def upstream_call(upstream: str):
+    """Em andamento + falhas de transporte em volta do envio ao upstream."""
+    if not settings.METRICS:
+        yield
+        return
+    UPSTREAM_IN_FLIGHT.inc(upstream)
+    try:
+        yield
+    except httpx.TransportError as e:
+        UPSTREAM_ERRORS.inc(upstream, type(e).__name__)
+        raise
+    finally:
+        UPSTREAM_IN_FLIGHT.dec(upstream)
+
+def observe_response(upstream: str, method: str, resp: httpx.Response, stream: bool = False):
+    """Status e, se o corpo já foi lido (stream=False), o tamanho no fio."""
+    if settings.METRICS:
+        UPSTREAM_RESPONSES.inc(upstream, method, str(resp.status_code))
+        if not stream:
+            UPSTREAM_BYTES.observe(resp.num_bytes_downloaded, upstream)
+
+def observe_bytes(upstream: str, nbytes: int):
+    if settings.METRICS:
+        UPSTREAM_BYTES.observe(nbytes, upstream)
+
+def observe_filter(definition: str, n_in: int, n_out: int):
+    if settings.METRICS and n_in:
+        FILTER_RATIO.observe(n_out / n_in, definition)
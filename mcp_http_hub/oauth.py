@@ -0,0 +1,335 @@
+from __future__ import annotations
+
+import json
+import time
+import random
+import asyncio
+import threading
+from typing import Any, Dict, Optional
+
+import anyio
+
+from .settings import settings
+from .http_pool import get_client, get_async_client, build_timeout
+from .shared_state import shared_store
+from .deadlines import clamp_timeout, check_deadline, expired, detached_context
+from .utils import debug, warn
+
+# =========================
+# Gerenciador de tokens OAuth2 (client credentials)
+# =========================
+# - single-flight: um único refresh por cache_key; os demais aguardam o resultado
+# - refresh antecipado em background (OAUTH_REFRESH_AHEAD s antes de expirar)
+# - rajada de 401 com o mesmo token dispara um único refresh
+# - falha no token endpoint entra em backoff exponencial com jitter
+# - com SHARED_STATE_FILE (vários workers) o token fica no store compartilhado: um worker
+#   busca (lease por cache_key) e os demais adotam o mesmo token em vez de pedir outro
+
+_TOKEN_HEADERS = {"Content-Type": "application/x-www-form-urlencoded"}
+_BACKGROUND: set = set()  # refresh em andamento (evita GC das tasks)
+_LEASE_SECONDS = 10.0     # tempo máximo esperando outro worker buscar o token
+_LEASE_POLL = 0.05
+
+class TokenManager:
+    def __init__(self, key: str):
+        self.key = key
+        self.token: Optional[str] = None
+        self.exp = 0.0          # validade efetiva (já com margem de 30s)
+        self.refresh_at = 0.0   # a partir daqui renova em background
+        self.fetched_at = 0.0
+        self.last_used = 0.0
+        self.failures = 0
+        self.retry_at = 0.0
+        self.last_error: Optional[BaseException] = None
+        self._lock = threading.Lock()
+        self._alock: Optional[asyncio.Lock] = None
+        self._refreshing = False
+        self._task: Optional[asyncio.Task] = None
+        self.stats = {"fetches": 0, "failures": 0, "background_refreshes": 0, "invalidations": 0, "shared": 0}
+
+    # ---------- estado
+    def _valid(self, now: float) -> bool:
+        return self.token is not None and now < self.exp
+
+    def _store(self, j: dict) -> str:
+        access = j.get("access_token")
+        if not access:
+            raise RuntimeError("Falha ao obter access_token em oauth2 client credentials")
+        expires_in = int(j.get("expires_in", 3600))
+        now = time.time()
+        lifetime = max(expires_in - 30, 30)  # margem de 30s
+        self.token = access
+        self.exp = now + lifetime
+        self.refresh_at = self.exp - min(settings.OAUTH_REFRESH_AHEAD, lifetime / 2)
+        self.fetched_at = now
+        self.failures = 0
+        self.retry_at = 0.0
+        self.last_error = None
+        self.stats["fetches"] += 1
+        debug("oauth2: token obtido e cacheado")
+        store = shared_store()
+        if store is not None:
+            store.put("oauth", self.key, (access, self.exp, self.refresh_at, now), self.exp - now)
+        return access
+
+    def _adopt_shared(self, now: float) -> bool:
+        """Usa o token que outro worker buscou depois do nosso (se ainda válido)."""
+        store = shared_store()
+        if store is None:
+            return False
+        return self._adopt(store.get("oauth", self.key), now)
+
+    async def _aadopt_shared(self, now: float) -> bool:
+        store = shared_store()
+        if store is None:
+            return False
+        return self._adopt(await store.aget("oauth", self.key), now)
+
+    def _adopt(self, value: Any, now: float) -> bool:
+        if value is None:
+            return False
+        token, exp, refresh_at, fetched_at = value
+        if fetched_at <= self.fetched_at or now >= exp:
+            return False
+        self.token, self.exp, self.refresh_at, self.fetched_at = token, exp, refresh_at, fetched_at
+        self.failures = 0
+        self.retry_at = 0.0
+        self.stats["shared"] += 1
+        debug("oauth2: token adotado do estado compartilhado")
+        return True
+
+    def _fail(self, e: BaseException):
+        self.failures += 1
+        self.stats["failures"] += 1
+        delay = min(settings.OAUTH_BACKOFF_MAX, settings.OAUTH_BACKOFF_BASE * (2 ** (self.failures - 1)))
+        delay *= random.uniform(0.5, 1.0)
+        self.retry_at = time.time() + delay
+        self.last_error = e
+        warn(f"oauth2: falha ao obter token ({e}); nova tentativa em {delay:.1f}s")
+
+    def _check_backoff(self, now: float):
+        if now < self.retry_at:
+            raise RuntimeError(
+                f"oauth2: token endpoint em backoff por mais {self.retry_at - now:.1f}s "
+                f"(último erro: {self.last_error})"
+            )
+
+    def invalidate(self, used_token: Optional[str]) -> bool:
+        """Invalida só se o token que levou 401 ainda for o atual (evita refresh em cascata)."""
+        if used_token is not None and self.token == used_token:
+            self.token = None
+            self.exp = 0.0
+            self.stats["invalidations"] += 1
+            warn("oauth2: invalidando token cache após 401")
+            store = shared_store()
+            if store is not None:  # só se outro worker ainda não publicou um token novo
+                store.delete("oauth", self.key, only_if=lambda shared: shared[0] == used_token)
+            return True
+        return False
+
+    # ---------- sync
+    def _fetch(self, meta: dict) -> str:
+        try:
+            c = get_client(meta["token_url"], meta.get("pool"))
+            resp = c.post(meta["token_url"], data=meta["data"], headers=_TOKEN_HEADERS,
+                          timeout=clamp_timeout(build_timeout(meta.get("timeout"))))
+            resp.raise_for_status()
+            return self._store(resp.json())
+        except Exception as e:
+            if not expired():  # prazo curto de um chamador não põe o token endpoint em backoff
+                self._fail(e)
+            raise
+
+    def _fetch_shared(self, meta: dict) -> str:
+        """_fetch coordenado entre workers: quem não pega o lease espera o token do outro."""
+        store = shared_store()
+        if store is None:
+            return self._fetch(meta)
+        deadline = time.time() + _LEASE_SECONDS
+        while not store.acquire("oauth", self.key, _LEASE_SECONDS):
+            time.sleep(_LEASE_POLL)
+            check_deadline("token oauth2")
+            if self._adopt_shared(time.time()):
+                return self.token
+            if time.time() >= deadline:
+                break
+        try:
+            return self._fetch(meta)
+        finally:
+            store.release("oauth", self.key)
+
+    def get(self, meta: dict) -> str:
+        now = time.time()
+        self.last_used = now
+        if self._valid(now):
+            if now >= self.refresh_at and now >= self.retry_at and not self._refreshing:
+                self._refreshing = True
+                threading.Thread(target=self._refresh_ahead, args=(meta,), daemon=True).start()
+            return self.token
+        with self._lock:
+            now = time.time()
+            if self._valid(now) or self._adopt_shared(now):  # outro chamador (ou worker) já renovou
+                return self.token
+            self._check_backoff(now)
+            return self._fetch_shared(meta)
+
+    def _refresh_ahead(self, meta: dict):
+        try:
+            with self._lock:
+                if time.time() < self.refresh_at:
+                    return
+                if self._adopt_shared(time.time()) and time.time() < self.refresh_at:
+                    return  # outro worker já renovou
+                self.stats["background_refreshes"] += 1
+                self._fetch_shared(meta)
+        except Exception:
+            pass  # token atual segue válido; _fail já agendou o backoff
+        finally:
+            self._refreshing = False
+
+    # ---------- async
+    def _async_lock(self) -> asyncio.Lock:
+        if self._alock is None:
+            self._alock = asyncio.Lock()
+        return self._alock
+
+    async def _afetch(self, meta: dict) -> str:
+        try:
+            c = get_async_client(meta["token_url"], meta.get("pool"))
+            resp = await c.post(meta["token_url"], data=meta["data"], headers=_TOKEN_HEADERS,
+                                timeout=clamp_timeout(build_timeout(meta.get("timeout"))))
+            resp.raise_for_status()
+            token = self._store(resp.json())
+        except Exception as e:
+            if not expired():
+                self._fail(e)
+            raise
+        self._schedule(meta)
+        return token
+
+    async def _afetch_shared(self, meta: dict) -> str:
+        store = shared_store()
+        if store is None:
+            return await self._afetch(meta)
+        deadline = time.time() + _LEASE_SECONDS
+        while not await store.aacquire("oauth", self.key, _LEASE_SECONDS):
+            await asyncio.sleep(_LEASE_POLL)
+            if await self._aadopt_shared(time.time()):
+                self._schedule(meta)
+                return self.token
+            if time.time() >= deadline:
+                break
+        try:
+            return await self._afetch(meta)
+        finally:
+            with anyio.CancelScope(shield=True):  # cancelado no meio: o lease é liberado mesmo assim
+                await store.arelease("oauth", self.key)
+
+    async def aget(self, meta: dict) -> str:
+        now = time.time()
+        self.last_used = now
+        if self._valid(now):
+            if now >= self.refresh_at and now >= self.retry_at and not self._refreshing:
+                self._refreshing = True
+                # em background: fora do prazo da chamada que o disparou
+                task = asyncio.get_running_loop().create_task(self._arefresh_ahead(meta),
+                                                              context=detached_context())
+                _BACKGROUND.add(task)
+                task.add_done_callback(_BACKGROUND.discard)
+            return self.token
+        async with self._async_lock():
+            now = time.time()
+            if self._valid(now):
+                return self.token
+            if await self._aadopt_shared(now):
+                self._schedule(meta)
+                return self.token
+            self._check_backoff(now)
+            return await self._afetch_shared(meta)
+
+    async def _arefresh_ahead(self, meta: dict):
+        try:
+            async with self._async_lock():
+                if time.time() < self.refresh_at:
+                    return
+                if await self._aadopt_shared(time.time()) and time.time() < self.refresh_at:
+                    self._schedule(meta)  # outro worker já renovou
+                    return
+                self.stats["background_refreshes"] += 1
+                await self._afetch_shared(meta)
+        except Exception:
+            pass  # token atual segue válido; _fail já agendou o backoff
+        finally:
+            self._refreshing = False
+
+    def _schedule(self, meta: dict):
+        """Agenda o refresh antecipado; só renova de novo se o token foi usado nesse meio tempo."""
+        if self._task is not None and not self._task.done() and self._task is not asyncio.current_task():
+            self._task.cancel()
+        fetched_at = self.fetched_at
+
+        async def _later():
+            await asyncio.sleep(max(self.refresh_at - time.time(), 0))
+            if self.fetched_at == fetched_at and self.last_used > fetched_at and not self._refreshing:
+                self._refreshing = True
+                await self._arefresh_ahead(meta)
+
+        self._task = asyncio.get_running_loop().create_task(_later(), context=detached_context())
+
+    def cancel(self):
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+        self._task = None
+
+    def snapshot(self) -> Dict[str, Any]:
+        now = time.time()
+        return {
+            **self.stats,
+            "valid": self._valid(now),
+            "expires_in": max(round(self.exp - now, 1), 0),
+            "backoff": max(round(self.retry_at - now, 1), 0),
+        }
+
+# =========================
+# Registro por cache_key
+# =========================
+_MANAGERS: dict[str, TokenManager] = {}
+_LOCK = threading.Lock()
+
+def token_manager(meta: dict) -> TokenManager:
+    key = meta["cache_key"]
+    mgr = _MANAGERS.get(key)
+    if mgr is None:
+        with _LOCK:
+            mgr = _MANAGERS.get(key)
+            if mgr is None:
+                mgr = _MANAGERS[key] = TokenManager(key)
+    return mgr
+
+def oauth_token(meta: dict) -> str:
+    return token_manager(meta).get(meta)
+
+async def aoauth_token(meta: dict) -> str:
+    return await token_manager(meta).aget(meta)
+
+def oauth_token_after_401(meta: dict, used_token: Optional[str]) -> str:
+    mgr = token_manager(meta)
+    mgr.invalidate(used_token)
+    return mgr.get(meta)
+
+async def aoauth_token_after_401(meta: dict, used_token: Optional[str]) -> str:
+    mgr = token_manager(meta)
+    mgr.invalidate(used_token)
+    return await mgr.aget(meta)
+
+def cancel_refreshes():
+    """Cancela os refresh agendados (shutdown)."""
+    for mgr in list(_MANAGERS.values()):
+        mgr.cancel()
+
+def oauth_stats() -> Dict[str, Dict[str, Any]]:
+    out = {}
+    for key, mgr in list(_MANAGERS.items()):
+        k = json.loads(key)
+        out[f"{k.get('u')} ({k.get('id')})"] = mgr.snapshot()
+    return out
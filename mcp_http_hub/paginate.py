@@ -0,0 +1,191 @@
+from __future__ import annotations
+
+import math
+import threading
+from dataclasses import replace
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+from .settings import settings
+from .filters import compile_path, list_path, _MISSING
+from .utils import debug
+
+# =========================
+# Seguir a paginação do upstream (bloco "paginate" dentro de "http")
+# =========================
+#   "paginate": {
+#     "style": "cursor",            # link | cursor | page | offset
+#     "items_path": "data",         # onde está a lista de cada página (default: filter.path ou raiz)
+#     "max_pages": 20, "max_items": 10000, "concurrency": 4,
+#     "cursor_path": "meta.next_cursor", "cursor_param": "cursor",          # cursor
+#     "page_param": "page", "start": 1,                                     # page
+#     "offset_param": "offset", "start": 0,                                 # offset
+#     "page_size": 100, "size_param": "per_page",                           # page/offset
+#     "total_path": "meta.total", "total_pages_path": "meta.pages"          # page/offset
+#   }
+#   "paginate": "link"  equivale a { "style": "link" }  (header Link: <...>; rel="next")
+# O resultado é a lista de itens de todas as páginas, já passada pelo "filter" página a página:
+# where/distinct na chegada, sort/offset/limit/select no fim. Sem sort, quando offset+limit itens
+# passaram pelo filtro não pede mais páginas (e cancela as que estão em andamento).
+# page/offset com total conhecido (total_path/total_pages_path) buscam as páginas restantes em
+# paralelo (até concurrency); sem total, e em link/cursor, uma página à frente enquanto a atual é
+# filtrada. Páginas não passam pelo cache nem pela coalescência. No modo sync, uma de cada vez.
+
+STYLES = ("link", "cursor", "page", "offset")
+
+_STATS: Dict[str, Dict[str, int]] = {}
+_LOCK = threading.Lock()
+
+class PagePlan:
+    """Bloco "paginate" compilado no load (HttpPlan.paginate)."""
+    __slots__ = ("style", "items", "max_pages", "max_items", "concurrency", "param", "start",
+                 "size", "size_param", "cursor", "total", "total_pages", "stats")
+
+    def __init__(self, name: str, cfg: Any, filter_path: Optional[str] = None):
+        cfg = {"style": cfg} if isinstance(cfg, str) else (cfg if isinstance(cfg, dict) else {})
+        self.style = (cfg.get("style") or ("cursor" if cfg.get("cursor_path") else "link")).lower()
+        if self.style not in STYLES:
+            raise ValueError(f"{name}: paginate.style deve ser {', '.join(STYLES)}")
+        items_path = list_path(cfg.get("items_path") or filter_path)
+        self.items = compile_path(items_path) if items_path else None
+        self.max_pages = max(int(cfg.get("max_pages", settings.PAGINATE_MAX_PAGES)), 1)
+        self.max_items = int(cfg.get("max_items", settings.PAGINATE_MAX_ITEMS))
+        self.concurrency = max(int(cfg.get("concurrency", settings.PAGINATE_CONCURRENCY)), 1)
+        self.cursor = compile_path(cfg.get("cursor_path") or "next_cursor")
+        self.param = cfg.get({"cursor": "cursor_param", "page": "page_param", "offset": "offset_param"}
+                             .get(self.style, ""), {"cursor": "cursor", "page": "page", "offset": "offset"}
+                             .get(self.style))
+        self.start = int(cfg.get("start", 1 if self.style == "page" else 0))
+        self.size = int(cfg["page_size"]) if cfg.get("page_size") else None
+        self.size_param = cfg.get("size_param")
+        self.total = compile_path(cfg["total_path"]) if cfg.get("total_path") else None
+        self.total_pages = compile_path(cfg["total_pages_path"]) if cfg.get("total_pages_path") else None
+        with _LOCK:
+            self.stats = _STATS.setdefault(name, {"calls": 0, "pages": 0, "items": 0,
+                                                  "early_stops": 0, "truncated": 0})
+
+    @property
+    def numbered(self) -> bool:
+        return self.style in ("page", "offset")
+
+    def items_of(self, payload: Any) -> List[Any]:
+        items = self.items(payload) if self.items is not None else payload
+        if not isinstance(items, list):
+            raise ValueError("paginate: a página não tem uma lista em items_path")
+        return items
+
+    # ---------- page / offset
+    def first(self, req):
+        """1ª página; page/offset com page_size mandam size_param desde o início."""
+        if not self.numbered:
+            return req
+        return self.numbered_request(req, 0, self.size)
+
+    def numbered_request(self, req, index: int, size: Optional[int]):
+        value = self.start + index if self.style == "page" else self.start + index * (size or 0)
+        params = {**req.params, self.param: str(value)}
+        if self.size_param and self.size:
+            params[self.size_param] = str(self.size)
+        return replace(req, params=params, headers=dict(req.headers))
+
+    def page_count(self, payload: Any, first_items: List[Any]) -> Optional[int]:
+        """Total de páginas se o upstream informa (total_pages_path ou total_path / tamanho)."""
+        if self.total_pages is not None:
+            n = _as_count(self.total_pages(payload))
+            if n is not None:
+                return n
+        if self.total is not None:
+            total = _as_count(self.total(payload))
+            size = self.size or len(first_items)
+            if total is not None and size:
+                return math.ceil(total / size)
+        return None
+
+    def is_last(self, items: List[Any], size: Optional[int]) -> bool:
+        return not items or (size is not None and len(items) < size)
+
+    # ---------- link / cursor
+    def next_request(self, req, resp: httpx.Response, payload: Any):
+        """Requisição da página seguinte (None na última)."""
+        if self.style == "link":
+            url = resp.links.get("next", {}).get("url")
+            if not url:
+                return None
+            # a query do Link manda; o que ela não traz (ex.: api key do auth) continua
+            url = resp.url.join(url)
+            return replace(req, url=str(url.copy_with(query=None)), params={**req.params, **dict(url.params)},
+                           headers=dict(req.headers))
+        cursor = self.cursor(payload)
+        if cursor is _MISSING or cursor is None or cursor == "":
+            return None
+        return replace(req, params={**req.params, self.param: str(cursor)}, headers=dict(req.headers))
+
+class PageWalk:
+    """Uma chamada paginada: tamanho e total vistos na 1ª página, páginas lidas."""
+    __slots__ = ("plan", "base", "size", "count", "pages")
+
+    def __init__(self, plan: PagePlan, base, payload: Any, items: List[Any]):
+        self.plan = plan
+        self.base = base            # requisição original (page/offset numeram a partir dela)
+        self.size = plan.size or len(items) or None
+        self.count = plan.page_count(payload, items) if plan.numbered else None
+        self.pages = 1
+
+    def has(self, index: int) -> bool:
+        """Se a página index (0 = 1ª) cabe em max_pages/max_items e existe, até onde se sabe."""
+        plan = self.plan
+        if index >= plan.max_pages or (self.count is not None and index >= self.count):
+            return False
+        return not (plan.max_items > 0 and self.size and index * self.size >= plan.max_items)
+
+    def last(self, items: List[Any]) -> bool:
+        """page/offset sem total: página vazia ou menor que as outras encerra."""
+        return not items or (self.count is None and self.plan.is_last(items, self.size))
+
+    def past_end(self, error: Exception) -> bool:
+        """page/offset sem total: 404 numa página depois da 1ª = acabou (a anterior veio cheia)."""
+        return (self.plan.numbered and self.count is None and isinstance(error, httpx.HTTPStatusError)
+                and error.response.status_code == 404)
+
+    def numbered(self, index: int):
+        return self.plan.numbered_request(self.base, index, self.size)
+
+    def following(self, cur, resp: httpx.Response, payload: Any, items: List[Any]):
+        """Página seguinte a cur, em sequência (None na última)."""
+        if not self.plan.numbered:
+            return self.plan.next_request(cur, resp, payload)
+        if self.last(items):
+            return None
+        return self.numbered(self.pages) if self.count is None or self.pages < self.count else None
+
+    def record(self, merge, more: bool):
+        """more: parou com páginas por ler (limit atendido, max_pages ou max_items)."""
+        s = self.plan.stats
+        with _LOCK:
+            s["calls"] += 1
+            s["pages"] += self.pages
+            s["items"] += merge.received
+            if more and merge.satisfied:
+                s["early_stops"] += 1
+            elif more or merge.truncated:
+                s["truncated"] += 1
+        if more and not merge.satisfied:
+            debug("paginate: parou em %d páginas / %d itens (max_pages/max_items)", self.pages, merge.received)
+
+def _as_count(value: Any) -> Optional[int]:
+    if value is _MISSING or value is None or isinstance(value, bool):
+        return None
+    try:
+        return max(int(value), 0)
+    except (TypeError, ValueError):
+        return None
+
+def page_plan(name: str, cfg: Any, filter_cfg: Optional[dict]) -> Optional[PagePlan]:
+    if not cfg:
+        return None
+    return PagePlan(name, cfg, (filter_cfg or {}).get("path"))
+
+def paginate_stats() -> Dict[str, Dict[str, int]]:
+    with _LOCK:
+        return {name: dict(s) for name, s in _STATS.items()}
@@ -0,0 +1,157 @@
+from __future__ import annotations
+
+import time
+import uuid
+import threading
+from collections import OrderedDict
+from typing import Any, List, Optional, Tuple
+
+import anyio
+
+from .settings import settings
+from .serializer import dumps
+from .shared_state import shared_store
+from .utils import debug
+
+# =========================
+# Resultados grandes paginados no servidor (RESULT_PAGE_CHARS)
+# =========================
+# Um resultado JSON maior que o orçamento (caracteres do JSON) não vai inteiro para o cliente:
+# a lista é cortada em páginas guardadas aqui, a resposta traz a primeira e um cursor, e a
+# tool hub_next_page(cursor) devolve as seguintes.
+#   lista        {"items": [...], "_page": {...}}
+#   objeto       o mesmo objeto com a sua maior lista cortada, + "_page"
+#   "_page":     {"index": 0, "pages": 7, "total_items": 12000, "next_cursor": "<id>:1"}
+# Outros payloads (texto, objeto sem lista) voltam inteiros; para corpos brutos grandes use
+# "response": "stream". As páginas ficam já serializadas, com TTL (RESULT_PAGE_TTL) e teto de
+# memória (RESULT_PAGES_MAX_BYTES, os conjuntos mais antigos saem primeiro); com
+# SHARED_STATE_FILE vão também para o store compartilhado (o cursor vale em qualquer worker).
+
+NEXT_PAGE_TOOL = "hub_next_page"
+_META_RESERVE = 160  # caracteres reservados para o "_page" de cada página
+
+class _PageSet:
+    __slots__ = ("id", "prefix", "pages", "total", "size", "expires")
+
+    def __init__(self, id: str, prefix: str, pages: List[str], total: int, expires: float):
+        self.id = id
+        self.prefix = prefix    # JSON até a lista paginada, ex.: '{"count":12000,"results":'
+        self.pages = pages      # JSON de cada fatia da lista ("[...]")
+        self.total = total
+        self.size = len(prefix) + sum(len(p) for p in pages)
+        self.expires = expires
+
+    def render(self, index: int) -> str:
+        nxt = f"{self.id}:{index + 1}" if index + 1 < len(self.pages) else None
+        meta = {"index": index, "pages": len(self.pages), "total_items": self.total, "next_cursor": nxt}
+        return f'{self.prefix}{self.pages[index]},"_page":{dumps(meta)}}}'
+
+_SETS: "OrderedDict[str, _PageSet]" = OrderedDict()
+_BYTES = 0
+_LOCK = threading.Lock()
+
+def _split(payload: Any) -> Optional[Tuple[str, list]]:
+    """(prefixo do envelope, lista a paginar), ou None se não há lista para cortar."""
+    if isinstance(payload, list):
+        return '{"items":', payload
+    if isinstance(payload, dict):
+        key = max((k for k, v in payload.items() if isinstance(v, list)),
+                  key=lambda k: len(payload[k]), default=None)
+        if key is None:
+            return None
+        rest = dumps({k: v for k, v in payload.items() if k != key})
+        head = "{" if rest == "{}" else rest[:-1] + ","
+        return f"{head}{dumps(str(key))}:", payload[key]
+    return None
+
+def _cut(items: list, budget: int) -> List[str]:
+    pages: List[str] = []
+    current: List[str] = []
+    used = 2
+    for item in items:
+        text = dumps(item)
+        if current and used + len(text) + 1 > budget:
+            pages.append("[" + ",".join(current) + "]")
+            current, used = [], 2
+        current.append(text)
+        used += len(text) + 1
+    pages.append("[" + ",".join(current) + "]")
+    return pages
+
+def to_text(payload: Any, page_chars: int) -> str:
+    """JSON do payload; acima de page_chars, a primeira página (as demais ficam guardadas)."""
+    text = dumps(payload)
+    if page_chars <= 0 or len(text) <= page_chars:
+        return text
+    split = _split(payload)
+    if split is None or len(split[1]) < 2:
+        debug("paging: resultado de %d caracteres sem lista para paginar; devolvido inteiro", len(text))
+        return text
+    prefix, items = split
+    pages = _cut(items, max(page_chars - len(prefix) - _META_RESERVE, 1))
+    if len(pages) == 1:
+        return text  # o prefixo é o que passa do orçamento: cortar não ajuda
+    ps = _PageSet(uuid.uuid4().hex, prefix, pages, len(items), time.time() + settings.RESULT_PAGE_TTL)
+    _store(ps)
+    debug("paging: %s (%d itens, %d páginas, %d caracteres)", ps.id, ps.total, len(pages), ps.size)
+    return ps.render(0)
+
+def _store(ps: _PageSet):
+    global _BYTES
+    now = time.time()
+    with _LOCK:
+        for old in [s for s in _SETS.values() if now >= s.expires]:
+            _BYTES -= _SETS.pop(old.id).size
+        _SETS[ps.id] = ps
+        _BYTES += ps.size
+        while _BYTES > settings.RESULT_PAGES_MAX_BYTES and len(_SETS) > 1:
+            _, old = _SETS.popitem(last=False)
+            _BYTES -= old.size
+    store = shared_store()
+    if store is not None:
+        store.put("page", ps.id, (ps.prefix, ps.pages, ps.total, ps.expires), ps.expires - now)
+
+def _open_shared(set_id: str) -> Optional[_PageSet]:
+    store = shared_store()
+    value = store.get("page", set_id) if store is not None else None
+    if value is None:
+        return None
+    prefix, pages, total, expires = value
+    return _PageSet(set_id, prefix, list(pages), total, expires)
+
+def next_page(cursor: str) -> str:
+    set_id, _, index = str(cursor).partition(":")
+    ps = _SETS.get(set_id) or _open_shared(set_id)
+    if ps is None or time.time() >= ps.expires or not index.isdigit():
+        raise ValueError(f"cursor '{cursor}' inválido ou expirado; repita a chamada original")
+    i = int(index)
+    if i >= len(ps.pages):
+        raise ValueError(f"cursor '{cursor}': página {i} fora do intervalo (0..{len(ps.pages) - 1})")
+    return ps.render(i)
+
+def paging_stats() -> dict:
+    with _LOCK:
+        return {"sets": len(_SETS), "bytes": _BYTES}
+
+_REGISTERED = False
+
+async def anext_page(cursor: str) -> str:
+    """next_page para o handler async: conjunto de outro worker é lido do SQLite fora do event loop."""
+    set_id = str(cursor).partition(":")[0]
+    if set_id not in _SETS and shared_store() is not None:
+        return await anyio.to_thread.run_sync(next_page, cursor)
+    return next_page(cursor)
+
+def register_page_tool(mcp):
+    """Registra (uma vez) a tool que devolve as páginas seguintes."""
+    global _REGISTERED
+    if _REGISTERED:
+        return
+    _REGISTERED = True
+
+    async def hub_next_page(cursor: str):  # sem "-> str": evita o structuredContent duplicando a página
+        return await anext_page(cursor)
+
+    mcp.tool(name=NEXT_PAGE_TOOL,
+             description="Próxima página de um resultado grande: passe o _page.next_cursor da resposta anterior")(hub_next_page)
+    debug(f"  Tool: {NEXT_PAGE_TOOL} (páginas de resultados grandes)")
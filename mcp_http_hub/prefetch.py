@@ -0,0 +1,233 @@
+from __future__ import annotations
+
+import os
+import sys
+import time
+import random
+import marshal
+import asyncio
+import threading
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from .settings import settings
+from .shared_state import shared_store
+from .utils import debug, debug_sampled, info, warn
+
+# =========================
+# Prefetch de resources estáticos ("prefetch" na definição)
+# =========================
+#   { "uri": "content://coffee/hot", "http": {...}, "prefetch": { "interval": 300, "jitter": 0.1, "max_age": 3600 } }
+#   "prefetch": 300  equivale a { "interval": 300 }
+# Só para URIs sem placeholders (o resultado é o mesmo para todos). Um agendador em background
+# busca o upstream a cada interval (± jitter, para os resources não baterem juntos) e guarda o
+# payload no warm store; a leitura do resource responde dele sem ir ao upstream. Enquanto o
+# upstream falha, o último valor bom continua valendo até max_age (default: 5x interval).
+# PREFETCH_SNAPSHOT=arquivo grava o warm store (marshal) e o recarrega na inicialização: depois de
+# um restart a primeira leitura já vem quente. Com SHARED_STATE_FILE, um lease por resource faz
+# um único worker buscar o upstream; os outros leem o valor do store compartilhado.
+
+SNAPSHOT_VERSION = 1
+_TICK = 0.5             # s entre verificações do agendador
+_SAVE_EVERY = 5.0       # s mínimos entre gravações do snapshot
+_RETRY_MIN = 5.0        # s até a nova tentativa depois de uma falha (no máximo interval)
+
+def prefetch_options(cfg: Any) -> Optional[Dict[str, float]]:
+    """Normaliza o bloco "prefetch" (número = interval); None se ausente/desligado."""
+    if cfg is None or cfg is False:
+        return None
+    if not isinstance(cfg, dict):
+        cfg = {"interval": cfg}
+    interval = float(cfg.get("interval", 0))
+    if interval <= 0:
+        raise ValueError("prefetch.interval deve ser > 0")
+    return {
+        "interval": interval,
+        "jitter": min(max(float(cfg.get("jitter", 0.1)), 0.0), 1.0),
+        "max_age": float(cfg.get("max_age", interval * 5)),
+    }
+
+class _Warm:
+    __slots__ = ("mode", "payload", "fetched")
+
+    def __init__(self, mode: str, payload: Any, fetched: float):
+        self.mode = mode
+        self.payload = payload
+        self.fetched = fetched
+
+class _Job:
+    __slots__ = ("uri", "fetch", "interval", "jitter", "max_age", "due", "refreshes", "failures",
+                 "hits", "misses", "last_error")
+
+    def __init__(self, uri: str, fetch: Callable[[], Awaitable[Tuple[str, Any]]], opts: Dict[str, float]):
+        self.uri = uri
+        self.fetch = fetch
+        self.interval = opts["interval"]
+        self.jitter = opts["jitter"]
+        self.max_age = opts["max_age"]
+        self.due = 0.0
+        self.refreshes = 0
+        self.failures = 0
+        self.hits = 0
+        self.misses = 0
+        self.last_error: Optional[str] = None
+
+    def next_due(self, now: float) -> float:
+        return now + self.interval * (1.0 + random.uniform(-self.jitter, self.jitter))
+
+_JOBS: Dict[str, _Job] = {}
+_WARM: Dict[str, _Warm] = {}
+_LOCK = threading.Lock()
+_DIRTY = False
+
+# ---------- registro (resources_loader)
+def register_prefetch(uri: str, fetch: Callable[[], Awaitable[Tuple[str, Any]]], opts: Dict[str, float]):
+    job = _Job(uri, fetch, opts)
+    warm = _WARM.get(uri)
+    # valor do snapshot ainda novo: a primeira busca espera o resto do intervalo
+    job.due = warm.fetched + job.interval if warm is not None else 0.0
+    with _LOCK:
+        _JOBS[uri] = job
+    debug("prefetch: %s a cada %.0fs", uri, job.interval)
+
+def unregister_prefetch(uri: str):
+    with _LOCK:
+        _JOBS.pop(uri, None)
+        _WARM.pop(uri, None)
+
+# ---------- leitura
+def warm_payload(uri: str) -> Optional[Tuple[str, Any]]:
+    """(mode, payload) do warm store, ou None (ausente ou mais velho que max_age)."""
+    job = _JOBS.get(uri)
+    warm = _WARM.get(uri)
+    if job is None:
+        return None
+    if warm is None or time.time() - warm.fetched > job.max_age:
+        job.misses += 1
+        return None
+    job.hits += 1
+    return warm.mode, warm.payload
+
+def store_warm(uri: str, mode: str, payload: Any, fetched: Optional[float] = None):
+    """Guarda um resultado (do agendador ou de uma leitura que foi ao upstream)."""
+    global _DIRTY
+    if uri not in _JOBS or mode == "stream":
+        return  # blobs expiram: o manifesto não pode ficar no warm store
+    _WARM[uri] = _Warm(mode, payload, time.time() if fetched is None else fetched)
+    _DIRTY = True
+
+# ---------- agendador
+async def _refresh(job: _Job):
+    now = time.time()
+    store = shared_store()
+    if store is not None and not await store.aacquire("prefetch", job.uri, job.interval):
+        # outro worker está com o lease: usa o que ele publicou
+        value = await store.aget("prefetch", job.uri)
+        if value is not None:
+            store_warm(job.uri, *value)
+        job.due = job.next_due(now)
+        return
+    try:
+        mode, payload = await job.fetch()
+    except Exception as e:
+        first = job.last_error is None
+        job.failures += 1
+        job.last_error = f"{type(e).__name__}: {str(e).splitlines()[0] if str(e) else ''}"
+        job.due = now + min(_RETRY_MIN, job.interval)
+        if first:  # uma linha por sequência de falhas, não por tentativa
+            warn(f"prefetch: {job.uri} falhou ({job.last_error}); mantendo o último valor")
+        else:
+            debug("prefetch: %s ainda falhando (%s)", job.uri, job.last_error)
+        return
+    if job.last_error is not None:
+        info(f"prefetch: {job.uri} voltou a responder")
+    job.refreshes += 1
+    job.last_error = None
+    job.due = job.next_due(now)
+    fetched = time.time()
+    store_warm(job.uri, mode, payload, fetched)
+    if store is not None and mode != "stream":
+        store.put("prefetch", job.uri, (mode, payload, fetched), job.max_age)
+    debug_sampled("prefetch: %s atualizado", job.uri)
+
+async def run_prefetch():
+    """Agendador: roda no event loop do servidor até ser cancelado (grava o snapshot no fim)."""
+    running: Dict[str, asyncio.Task] = {}
+    sem = asyncio.Semaphore(max(settings.PREFETCH_CONCURRENCY, 1))
+    last_save = time.monotonic()
+
+    async def _run(job: _Job):
+        async with sem:
+            await _refresh(job)
+
+    try:
+        while True:
+            now = time.time()
+            for job in list(_JOBS.values()):
+                if job.due <= now and job.uri not in running:
+                    task = asyncio.create_task(_run(job))
+                    running[job.uri] = task
+                    task.add_done_callback(lambda t, uri=job.uri: running.pop(uri, None))
+            if _DIRTY and time.monotonic() - last_save >= _SAVE_EVERY:
+                save_warm()
+                last_save = time.monotonic()
+            await asyncio.sleep(_TICK)
+    finally:
+        for task in list(running.values()):
+            task.cancel()
+        save_warm()
+
+# =========================
+# Snapshot do warm store (PREFETCH_SNAPSHOT, marshal)
+# =========================
+def load_warm(path: Optional[str] = None):
+    """Carrega o snapshot antes dos resources (chamado por load_all)."""
+    path = settings.PREFETCH_SNAPSHOT if path is None else path
+    if not path:
+        return
+    try:
+        with open(path, "rb") as f:
+            header, entries = marshal.loads(f.read())
+    except FileNotFoundError:
+        return
+    except (OSError, EOFError, ValueError, TypeError) as e:
+        warn(f"prefetch: snapshot {path} ilegível ({e}); ignorado")
+        return
+    if tuple(header) != (SNAPSHOT_VERSION, tuple(sys.version_info[:2])):
+        debug(f"prefetch: snapshot {path} de outra versão; ignorado")
+        return
+    for uri, (mode, payload, fetched) in entries.items():
+        _WARM[uri] = _Warm(mode, payload, fetched)
+    info(f"prefetch: {len(entries)} resources quentes carregados de {path}")
+
+def save_warm(path: Optional[str] = None):
+    global _DIRTY
+    path = settings.PREFETCH_SNAPSHOT if path is None else path
+    if not path or not _DIRTY:
+        return
+    _DIRTY = False
+    entries = {uri: (w.mode, w.payload, w.fetched) for uri, w in list(_WARM.items()) if uri in _JOBS}
+    tmp = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp, "wb") as f:
+            f.write(marshal.dumps(((SNAPSHOT_VERSION, tuple(sys.version_info[:2])), entries)))
+        os.replace(tmp, path)  # atômico (vários workers podem gravar o mesmo arquivo)
+    except (OSError, ValueError) as e:
+        warn(f"prefetch: não foi possível gravar o snapshot {path}: {e}")
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+
+def prefetch_stats() -> Dict[str, Any]:
+    now = time.time()
+    out: Dict[str, Any] = {}
+    for uri, job in list(_JOBS.items()):
+        warm = _WARM.get(uri)
+        out[uri] = {
+            "interval_s": job.interval,
+            "age_s": round(now - warm.fetched, 1) if warm is not None else None,
+            "next_in_s": round(max(job.due - now, 0.0), 1),
+            "refreshes": job.refreshes, "failures": job.failures,
+            "hits": job.hits, "misses": job.misses, "last_error": job.last_error,
+        }
+    return out
@@ -0,0 +1,173 @@
+from __future__ import annotations
+
+import time
+from typing import Any, Dict, Optional
+
+from .settings import settings
+from .serializer import dumps
+from .filters import compile_path, list_path, _MISSING
+from .templates import compile_template
+from .utils import debug
+
+# =========================
+# Renderização de prompts HTTP (bloco "render")
+# =========================
+#   "render": {
+#     "template": "Cafés para {q}: {titles}\n\n{top}",
+#     "vars": {
+#       "titles": { "join": "title", "sep": ", ", "max_items": 50 },      # campo de cada item
+#       "top":    { "json": "data.items", "max_items": 20, "max_chars": 4000 },
+#       "total":  { "count": "data.items" },
+#       "first":  { "value": "data.items.0.title", "max_chars": 200 }
+#     },
+#     "max_chars": 20000, "budget_ms": 100
+#   }
+# O template é analisado no load e só as variáveis que ele referencia são calculadas na chamada
+# ({titles} e {json} continuam existindo: join de "title" e o payload inteiro). Args e env são lidos
+# direto do contexto em camadas, sem cópia. "path" (em join) ou o valor de json/count/value é o
+# caminho até o dado (true/ausente = payload inteiro).
+# Tamanho e tempo limitados: json serializa item a item e para ao atingir max_chars (default: o
+# max_chars do render, PROMPT_MAX_CHARS) ou max_items, sem serializar o que seria descartado; join
+# idem. budget_ms (PROMPT_RENDER_MS) corta as variáveis que passarem do tempo. O que foi cortado
+# termina em "… (+N)". O texto final também é limitado a max_chars.
+
+KINDS = ("join", "json", "count", "value")
+BUILTIN_VARS = {"titles": {"join": "title"}, "json": {"json": True}}
+ELLIPSIS = "…"
+_CHECK_EVERY = 64  # itens entre consultas ao relógio
+
+_STATS = {"renders": 0, "truncated": 0, "over_budget": 0}
+
+def _cap(a: int, b: int) -> int:
+    """Menor limite positivo (0 = sem limite)."""
+    if a <= 0:
+        return max(b, 0)
+    return a if b <= 0 else min(a, b)
+
+def _clip(text: str, max_chars: int) -> str:
+    if max_chars <= 0 or len(text) <= max_chars:
+        return text
+    _STATS["truncated"] += 1
+    return text[:max_chars] + ELLIPSIS
+
+def _more(left: int) -> str:
+    _STATS["truncated"] += 1
+    return f" {ELLIPSIS} (+{left})" if left > 0 else f" {ELLIPSIS}"
+
+class _Budget:
+    __slots__ = ("until", "hit")
+
+    def __init__(self, ms: float):
+        self.until = time.perf_counter() + ms / 1000.0 if ms > 0 else None
+        self.hit = False
+
+    def over(self) -> bool:
+        if not self.hit and self.until is not None and time.perf_counter() >= self.until:
+            self.hit = True
+            _STATS["over_budget"] += 1
+        return self.hit
+
+class RenderVar:
+    """Variável derivada do payload, compilada no load."""
+    __slots__ = ("kind", "path", "field", "sep", "max_items", "max_chars")
+
+    def __init__(self, name: str, spec: Any, max_chars: int):
+        if not isinstance(spec, dict) or sum(k in spec for k in KINDS) != 1:
+            raise ValueError(f"render.vars.{name}: use um (e só um) de {', '.join(KINDS)}")
+        self.kind = next(k for k in KINDS if k in spec)
+        target = spec[self.kind]
+        self.field = None
+        if self.kind == "join":
+            self.field = compile_path(target) if isinstance(target, str) else None  # true = o próprio item
+            target = spec.get("path")
+        path = list_path(target if isinstance(target, str) else None)
+        self.path = compile_path(path) if path else None
+        self.sep = str(spec.get("sep", ", "))
+        self.max_items = int(spec["max_items"]) if spec.get("max_items") is not None else 0
+        self.max_chars = _cap(int(spec.get("max_chars", 0)), max_chars)
+
+    def compute(self, payload: Any, budget: _Budget) -> str:
+        data = self.path(payload) if self.path is not None else payload
+        if data is _MISSING or data is None:
+            return ""
+        if self.kind == "count":
+            return str(len(data)) if isinstance(data, (list, dict)) else ""
+        if self.kind == "join":
+            return self._join(data, budget) if isinstance(data, list) else ""
+        if self.kind == "value" and not isinstance(data, (list, dict)):
+            return _clip(data if isinstance(data, str) else dumps(data), self.max_chars)
+        return self._json(data, budget)
+
+    def _join(self, data: list, budget: _Budget) -> str:
+        field, sep, max_items, max_chars = self.field, self.sep, self.max_items, self.max_chars
+        out = []
+        used = 0
+        for i, item in enumerate(data):
+            if (max_items and len(out) >= max_items) or (i % _CHECK_EVERY == 0 and i and budget.over()):
+                return sep.join(out) + _more(len(data) - i)
+            v = field(item) if field is not None else item
+            if v is _MISSING or v is None or v == "":
+                continue
+            s = v if isinstance(v, str) else str(v)
+            if max_chars and used + len(s) > max_chars:
+                return sep.join(out) + _more(len(data) - i)
+            out.append(s)
+            used += len(s) + len(sep)
+        return sep.join(out)
+
+    def _json(self, data: Any, budget: _Budget) -> str:
+        max_items, max_chars = self.max_items, self.max_chars
+        if not isinstance(data, (list, dict)):
+            return _clip(dumps(data), max_chars)
+        if not max_items and not max_chars and budget.until is None:
+            return dumps(data)
+        if isinstance(data, list):
+            parts = (dumps(x) for x in data)
+            head, tail = "[", "]"
+        else:
+            parts = (f"{dumps(str(k))}:{dumps(v)}" for k, v in data.items())
+            head, tail = "{", "}"
+        out = []
+        used = 2
+        for i, part in enumerate(parts):
+            if (max_items and i >= max_items) or (i % _CHECK_EVERY == 0 and i and budget.over()):
+                return head + ",".join(out) + tail + _more(len(data) - i)
+            if max_chars and used + len(part) > max_chars:
+                if not out:  # um único item já passa do limite: vai cortado
+                    return head + part[:max(max_chars - 2, 0)] + _more(len(data) - 1)
+                return head + ",".join(out) + tail + _more(len(data) - i)
+            out.append(part)
+            used += len(part) + 1
+        return head + ",".join(out) + tail
+
+class RenderPlan:
+    """Bloco "render" de um prompt HTTP: template + variáveis que ele usa."""
+    __slots__ = ("template", "vars", "max_chars", "budget_ms")
+
+    def __init__(self, name: str, render: Optional[dict]):
+        render = render or {}
+        self.template = compile_template(render.get("template") or "{text}")
+        self.max_chars = int(render.get("max_chars", settings.PROMPT_MAX_CHARS))
+        self.budget_ms = float(render.get("budget_ms", settings.PROMPT_RENDER_MS))
+        specs = {**BUILTIN_VARS, **(render.get("vars") or {})}
+        compiled = {var: RenderVar(var, spec, self.max_chars) for var, spec in specs.items()}
+        # template legado (specs aninhados etc.): não dá para saber o que usa, calcula todas
+        uses = compiled.keys() if self.template.legacy else self.template.fields
+        self.vars: Dict[str, RenderVar] = {var: v for var, v in compiled.items() if var in uses}
+        debug("  render %s: variáveis %s", name, ", ".join(self.vars) or "-")
+
+    def render(self, ctx, mode: str, payload: Any) -> str:
+        _STATS["renders"] += 1
+        if mode == "json":
+            budget = _Budget(self.budget_ms)
+            extra = {var: v.compute(payload, budget) for var, v in self.vars.items()}
+        elif mode == "text":
+            extra = {"text": _clip(str(payload), self.max_chars)}
+        elif mode == "stream":
+            extra = {"text": dumps(payload.manifest())}
+        else:
+            extra = {"text": "<binary>"}
+        return _clip(self.template.render(ctx.new_child(extra)), self.max_chars)
+
+def render_stats() -> Dict[str, Any]:
+    return {"max_chars": settings.PROMPT_MAX_CHARS, "budget_ms": settings.PROMPT_RENDER_MS, **_STATS}
@@ -0,0 +1,259 @@
+from __future__ import annotations
+
+import os
+import json
+import signal
+import asyncio
+import weakref
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import anyio
+from mcp import types
+from mcp.server.lowlevel.server import NotificationOptions
+
+from .settings import settings
+from .response_cache import discard_cache, restore_cache
+from .prefetch import load_warm
+from .loaders.tools_loader import read_tools_file, tool_key, register_tool, unregister_tool, load_tools
+from .loaders.resources_loader import read_resources_file, resource_key, register_resource, unregister_resource
+from .loaders.prompts_loader import read_prompts_file, prompt_key, register_prompt, unregister_prompt
+from .utils import debug, info, warn, error
+
+# =========================
+# Hot-reload das definições (TOOLS_FILE / RESOURCES_FILE / PROMPTS_FILE)
+# =========================
+# Gatilhos: CONFIG_WATCH_INTERVAL > 0 (verifica mtime/tamanho dos arquivos), SIGHUP ou POST /hub/reload.
+# Compara cada definição com a registrada (JSON canônico) e só registra/substitui/remove
+# o que mudou; pools de conexão, tokens oauth2 e caches das definições inalteradas ficam.
+# Sessões que já listaram tools/resources/prompts recebem notifications/*/list_changed.
+# Arquivo inválido (JSON/estrutura) mantém o que está no ar; definição que falha ao registrar
+# volta para a versão anterior.
+
+class _Kind:
+    __slots__ = ("name", "path", "read", "key", "register", "unregister", "notify", "load")
+
+    def __init__(self, name: str, path: Callable[[], str], read, key, register, unregister, notify, load=None):
+        self.name = name
+        self.path = path
+        self.read = read
+        self.key = key
+        self.register = register
+        self.unregister = unregister
+        self.notify = notify
+        self.load = load  # carga inicial própria (chave -> definição), ex.: catálogo de tools
+
+_KINDS: Tuple[_Kind, ...] = (
+    _Kind("tools", lambda: settings.TOOLS_FILE, read_tools_file, tool_key, register_tool, unregister_tool,
+          lambda s: s.send_tool_list_changed(), load_tools),
+    _Kind("resources", lambda: settings.RESOURCES_FILE, read_resources_file, resource_key, register_resource,
+          unregister_resource, lambda s: s.send_resource_list_changed()),
+    _Kind("prompts", lambda: settings.PROMPTS_FILE, read_prompts_file, prompt_key, register_prompt,
+          unregister_prompt, lambda s: s.send_prompt_list_changed()),
+)
+
+# definições registradas por tipo: chave -> definição (o JSON canônico só é gerado no reload)
+_LOADED: Dict[str, Dict[str, dict]] = {k.name: {} for k in _KINDS}
+# sessões que pediram a lista de cada tipo (só elas precisam saber que mudou)
+_SESSIONS: Dict[str, "weakref.WeakSet"] = {k.name: weakref.WeakSet() for k in _KINDS}
+_STATS: Dict[str, Any] = {"reloads": 0, "failed": 0, "last": None}
+_RELOAD_LOCK: Optional[asyncio.Lock] = None
+_BACKGROUND: set = set()
+
+def _canonical(defn: dict) -> str:
+    return json.dumps(defn, sort_keys=True, ensure_ascii=False, default=str)
+
+def _http_cfgs(defn: dict) -> List[dict]:
+    cfgs = [defn["http"]] if isinstance(defn.get("http"), dict) else []
+    cfgs += [s["http"] for s in defn.get("steps") or [] if isinstance(s.get("http"), dict)]
+    if isinstance(defn.get("batch"), dict) and isinstance(defn["batch"].get("http"), dict):
+        cfgs.append(defn["batch"]["http"])
+    return cfgs
+
+def _desired(kind: _Kind, items: list) -> Dict[str, Tuple[str, dict]]:
+    out: Dict[str, Tuple[str, dict]] = {}
+    for it in items:
+        key = kind.key(it) if isinstance(it, dict) else None
+        if key is None:
+            continue
+        if key in out:
+            warn(f"reload: {kind.name} '{key}' duplicado; mantendo a primeira definição")
+            continue
+        out[key] = (_canonical(it), it)
+    return out
+
+def load_all():
+    """Carga inicial (mesma ordem e tratamento de erros dos loaders), registrando o que foi carregado."""
+    load_warm()  # resources com prefetch já sobem quentes (PREFETCH_SNAPSHOT)
+    for kind in _KINDS:
+        path = kind.path()
+        debug(f"Carregando {kind.name} de {path}")
+        if kind.load is not None:
+            _LOADED[kind.name].update(kind.load(path))
+            continue
+        for key, (canon, defn) in _desired(kind, kind.read(path)).items():
+            kind.register(defn)
+            _LOADED[kind.name][key] = defn
+
+def _sync(kind: _Kind, desired: Dict[str, Tuple[str, dict]]) -> Dict[str, List[str]]:
+    current = _LOADED[kind.name]
+    result: Dict[str, List[str]] = {"added": [], "changed": [], "removed": [], "failed": []}
+    for key in [k for k in current if k not in desired]:
+        kind.unregister(key)
+        for cfg in _http_cfgs(current.pop(key)):
+            discard_cache(cfg)
+        result["removed"].append(key)
+    for key, (canon, defn) in desired.items():
+        old = current.get(key)
+        if old is not None and _canonical(old) == canon:
+            continue
+        dropped = []
+        if old is not None:
+            kind.unregister(key)
+            # antes de registrar: senão a versão nova reaproveita o cache (de mesmo nome) com o cfg antigo
+            dropped = [c for cfg in _http_cfgs(old) if (c := discard_cache(cfg)) is not None]
+        try:
+            kind.register(defn)
+        except Exception as e:
+            error(f"reload: {kind.name} '{key}' inválido: {e}")
+            result["failed"].append(key)
+            if old is not None:
+                kind.unregister(key)
+                for cache in dropped:
+                    restore_cache(cache)
+                kind.register(old)  # a versão anterior segue no ar, com o cache que tinha
+            continue
+        current[key] = defn
+        result["changed" if old is not None else "added"].append(key)
+    return result
+
+async def reload_config(reason: str = "manual") -> Dict[str, Any]:
+    """Relê os três arquivos e aplica só as diferenças; notifica as sessões dos tipos alterados."""
+    global _RELOAD_LOCK
+    if _RELOAD_LOCK is None:
+        _RELOAD_LOCK = asyncio.Lock()
+    async with _RELOAD_LOCK:
+        summary: Dict[str, Any] = {"reason": reason}
+        changed_kinds = []
+        for kind in _KINDS:
+            try:
+                desired = _desired(kind, kind.read(kind.path()))
+            except Exception as e:
+                # arquivo inválido: mantém as definições atuais desse tipo
+                error(f"reload: {kind.path()} ignorado: {e}")
+                summary[kind.name] = {"error": str(e)}
+                _STATS["failed"] += 1
+                continue
+            result = _sync(kind, desired)
+            summary[kind.name] = {k: v for k, v in result.items() if v}
+            if result["added"] or result["changed"] or result["removed"]:
+                changed_kinds.append(kind)
+        _STATS["reloads"] += 1
+        _STATS["last"] = summary
+        if changed_kinds:
+            info(f"reload ({reason}): " + "; ".join(
+                f"{k.name}: " + ", ".join(f"{n} {len(v)}" for n, v in summary[k.name].items())
+                for k in changed_kinds))
+            summary["notified"] = await _notify(changed_kinds)
+        else:
+            debug(f"reload ({reason}): nenhuma definição alterada")
+        return summary
+
+async def _notify(kinds: List[_Kind]) -> int:
+    sent = 0
+    for kind in kinds:
+        for session in list(_SESSIONS[kind.name]):
+            try:
+                with anyio.fail_after(2):
+                    await kind.notify(session)
+                sent += 1
+            except Exception as e:  # sessão encerrada ou transporte fechado
+                _SESSIONS[kind.name].discard(session)
+                debug(f"reload: notificação {kind.name}/list_changed descartada: {type(e).__name__}")
+    return sent
+
+# =========================
+# Integração com o FastMCP
+# =========================
+def install_list_changed(mcp):
+    """
+    Anuncia listChanged na inicialização e guarda as sessões que listam
+    tools/resources/prompts (para notificá-las depois de um reload).
+    """
+    server = mcp._mcp_server
+    create_options = server.create_initialization_options
+
+    def _with_list_changed(notification_options=None, experimental_capabilities=None):
+        opts = notification_options or NotificationOptions(
+            prompts_changed=True, resources_changed=True, tools_changed=True)
+        return create_options(opts, experimental_capabilities)
+
+    server.create_initialization_options = _with_list_changed
+
+    def _track(kind: str, request_type):
+        handler = server.request_handlers.get(request_type)
+        if handler is None:
+            return
+
+        async def _tracked(req):
+            try:
+                _SESSIONS[kind].add(server.request_context.session)
+            except LookupError:
+                pass
+            return await handler(req)
+
+        server.request_handlers[request_type] = _tracked
+
+    _track("tools", types.ListToolsRequest)
+    _track("resources", types.ListResourcesRequest)
+    _track("resources", types.ListResourceTemplatesRequest)
+    _track("prompts", types.ListPromptsRequest)
+
+def _fingerprint() -> Tuple:
+    out = []
+    for kind in _KINDS:
+        try:
+            st = os.stat(kind.path())
+            out.append((st.st_mtime_ns, st.st_size))
+        except OSError:
+            out.append(None)
+    return tuple(out)
+
+async def watch_config(interval: Optional[float] = None):
+    """Verifica os arquivos a cada CONFIG_WATCH_INTERVAL segundos (0 = desligado)."""
+    interval = settings.CONFIG_WATCH_INTERVAL if interval is None else interval
+    if interval <= 0:
+        return
+    last = _fingerprint()
+    while True:
+        await asyncio.sleep(interval)
+        current = _fingerprint()
+        if current != last:
+            last = current
+            try:
+                await reload_config("arquivo alterado")
+            except Exception as e:
+                error(f"reload: falhou: {e}")
+
+def install_reload_signal():
+    """SIGHUP -> reload (POSIX; no Windows fica só o watch e POST /hub/reload)."""
+    if not hasattr(signal, "SIGHUP"):
+        return
+    loop = asyncio.get_running_loop()
+
+    def _on_sighup():
+        task = loop.create_task(reload_config("SIGHUP"))
+        _BACKGROUND.add(task)
+        task.add_done_callback(_BACKGROUND.discard)
+
+    try:
+        loop.add_signal_handler(signal.SIGHUP, _on_sighup)
+    except (NotImplementedError, RuntimeError):
+        warn("reload: SIGHUP indisponível neste event loop")
+
+def reload_stats() -> Dict[str, Any]:
+    return {
+        **_STATS,
+        "loaded": {k: len(v) for k, v in _LOADED.items()},
+        "sessions": {k: len(v) for k, v in _SESSIONS.items()},
+        "watch_interval_s": settings.CONFIG_WATCH_INTERVAL,
+    }
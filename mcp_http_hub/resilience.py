@@ -0,0 +1,206 @@
+from __future__ import annotations
+
+import time
+import random
+import threading
+from collections import deque
+from typing import Any, Dict, Optional
+
+import httpx
+
+from .settings import settings
+from .limits import origin, retry_after_seconds, check_same_cfg
+from .utils import debug, warn
+
+# =========================
+# Retries, hedging e circuit breaker (blocos "retry", "hedge", "breaker" em "http")
+# =========================
+#   "retry":   { "attempts": 2, "backoff": 0.2, "max_backoff": 5, "statuses": [502, 503, 504] }
+#   "hedge":   { "after_ms": 300 }  ou  { "percentile": 95, "min_samples": 20 }  ou  true
+#   "breaker": { "failures": 5, "reset_timeout": 30, "half_open_max": 1 }   (false desliga)
+# Retries só em métodos idempotentes (a menos que "methods" diga o contrário), com
+# backoff exponencial com jitter (ou o Retry-After do upstream, se maior).
+# Hedge (só async, só GET/HEAD/OPTIONS): se a 1ª tentativa passar do p95 recente,
+# dispara uma 2ª e fica com a que terminar primeiro.
+# Breaker por host: N falhas seguidas (erro de transporte ou 5xx) abrem o circuito;
+# aberto falha na hora; após reset_timeout deixa passar sondas (half-open).
+# Desligado por padrão (BREAKER_FAILURES=0): liga por definição com o bloco "breaker" (true usa
+# DEFAULT_BREAKER_FAILURES) ou para todos os hosts com BREAKER_FAILURES > 0. Vale o bloco da 1ª
+# definição do host; blocos diferentes para o mesmo host geram um aviso.
+
+IDEMPOTENT_METHODS = ("GET", "HEAD", "OPTIONS", "PUT", "DELETE")
+HEDGE_METHODS = ("GET", "HEAD", "OPTIONS")
+DEFAULT_RETRY_STATUSES = (429, 502, 503, 504)
+DEFAULT_BREAKER_FAILURES = 5  # bloco "breaker" sem "failures" com BREAKER_FAILURES=0
+
+class CircuitOpen(RuntimeError):
+    pass
+
+# ---------- retry
+class RetryPolicy:
+    def __init__(self, cfg: dict):
+        self.attempts = int(cfg.get("attempts", settings.HTTP_RETRIES))
+        self.backoff = float(cfg.get("backoff", settings.HTTP_RETRY_BACKOFF))
+        self.max_backoff = float(cfg.get("max_backoff", settings.HTTP_RETRY_BACKOFF_MAX))
+        self.statuses = frozenset(cfg.get("statuses") or DEFAULT_RETRY_STATUSES)
+        self.methods = tuple(m.upper() for m in (cfg.get("methods") or IDEMPOTENT_METHODS))
+
+    def can_retry(self, attempt: int) -> bool:
+        return attempt < self.attempts
+
+    def delay(self, attempt: int, resp: Optional[httpx.Response] = None) -> float:
+        # "full jitter": uniforme entre 0 e o teto exponencial
+        d = random.uniform(0, min(self.max_backoff, self.backoff * (2 ** attempt)))
+        if resp is not None:
+            ra = retry_after_seconds(resp.headers.get("retry-after"))
+            if ra is not None:
+                d = max(d, min(ra, self.max_backoff))
+        return d
+
+def retry_policy(cfg: Any, method: str) -> Optional[RetryPolicy]:
+    if cfg is False:
+        return None
+    policy = RetryPolicy(cfg if isinstance(cfg, dict) else {})
+    if policy.attempts <= 0 or method not in policy.methods:
+        return None
+    return policy
+
+# ---------- hedge
+class HedgePolicy:
+    """Atraso do hedge: fixo (after_ms) ou percentil das latências recentes da definição."""
+
+    def __init__(self, cfg: dict):
+        self.after = float(cfg["after_ms"]) / 1000.0 if cfg.get("after_ms") is not None else None
+        self.percentile = float(cfg.get("percentile", 95))
+        self.min_samples = int(cfg.get("min_samples", 20))
+        self.min_after = float(cfg.get("min_after_ms", 10)) / 1000.0
+        self._samples: "deque[float]" = deque(maxlen=int(cfg.get("window", 200)))
+
+    def record(self, seconds: float):
+        self._samples.append(seconds)
+
+    def delay(self) -> Optional[float]:
+        if self.after is not None:
+            return self.after
+        if len(self._samples) < self.min_samples:
+            return None  # sem histórico suficiente: não faz hedge
+        ordered = sorted(self._samples)
+        idx = min(int(len(ordered) * self.percentile / 100.0), len(ordered) - 1)
+        return max(ordered[idx], self.min_after)
+
+def hedge_policy(cfg: Any, method: str) -> Optional[HedgePolicy]:
+    if not cfg or method not in HEDGE_METHODS:
+        return None
+    return HedgePolicy(cfg if isinstance(cfg, dict) else {})
+
+# ---------- breaker
+class Breaker:
+    def __init__(self, name: str, cfg: dict):
+        self.name = name
+        self.threshold = _threshold(cfg)
+        self.reset_timeout = float(cfg.get("reset_timeout", settings.BREAKER_RESET_TIMEOUT))
+        self.half_open_max = max(int(cfg.get("half_open_max", settings.BREAKER_HALF_OPEN_MAX)), 1)
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self.probes = 0
+        self.probe_at = 0.0
+        self.last_error: Optional[str] = None
+        self._lock = threading.Lock()
+        self.cfgs = [cfg]  # blocos já conferidos (identidade), o 1º é o que vale
+        self.stats = {"opened": 0, "short_circuited": 0, "failures": 0, "successes": 0,
+                      "retries": 0, "hedges": 0, "hedge_wins": 0}
+
+    def before(self):
+        """Chamado antes de cada tentativa; CircuitOpen se o host estiver em quarentena."""
+        with self._lock:
+            if self.state == "closed":
+                return
+            now = time.monotonic()
+            if self.state == "open":
+                wait = self.opened_at + self.reset_timeout - now
+                if wait > 0:
+                    self.stats["short_circuited"] += 1
+                    raise CircuitOpen(f"circuito aberto para {self.name}: upstream indisponível "
+                                      f"(nova sonda em {wait:.1f}s; último erro: {self.last_error})")
+                self.state, self.probes = "half_open", 0
+                debug("breaker: %s half-open (sondando)", self.name)
+            if self.probes >= self.half_open_max and now - self.probe_at < self.reset_timeout:
+                self.stats["short_circuited"] += 1
+                raise CircuitOpen(f"circuito half-open para {self.name}: aguardando resultado da sonda")
+            if self.probes >= self.half_open_max:
+                self.probes = 0  # sonda sem resultado (cancelada): libera outra
+            self.probes += 1
+            self.probe_at = now
+
+    def success(self):
+        with self._lock:
+            self.stats["successes"] += 1
+            self.failures = 0
+            recovered = self.state != "closed"
+            self.state = "closed"
+        if recovered:
+            debug("breaker: %s fechado (upstream respondeu)", self.name)
+
+    def failure(self, reason: str):
+        with self._lock:
+            self.stats["failures"] += 1
+            self.failures += 1
+            self.last_error = reason
+            if self.state == "half_open" or (self.state == "closed" and self.failures >= self.threshold):
+                self.state = "open"
+                self.opened_at = time.monotonic()
+                self.stats["opened"] += 1
+                opened = True
+            else:
+                opened = False
+        if opened:
+            warn(f"breaker: circuito aberto para {self.name} por {self.reset_timeout:.0f}s ({reason})")
+
+    def record(self, resp: httpx.Response):
+        if resp.status_code >= 500:
+            self.failure(f"HTTP {resp.status_code}")
+        else:
+            self.success()
+
+    def count(self, stat: str):
+        with self._lock:
+            self.stats[stat] += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            out = {**self.stats, "state": self.state, "consecutive_failures": self.failures,
+                   "threshold": self.threshold, "last_error": self.last_error}
+            if self.state == "open":
+                out["retry_in_s"] = round(max(self.opened_at + self.reset_timeout - time.monotonic(), 0), 1)
+            return out
+
+_BREAKERS: dict[str, Breaker] = {}
+_LOCK = threading.Lock()
+
+_NO_CFG: dict = {}  # sem bloco (BREAKER_* do .env): mesmo objeto em toda chamada
+
+def _threshold(cfg: dict) -> int:
+    return int(cfg.get("failures", settings.BREAKER_FAILURES or DEFAULT_BREAKER_FAILURES))
+
+def breaker_for(cfg: Any, url: str) -> Optional[Breaker]:
+    """Breaker do host da requisição; None se desligado (sem bloco e BREAKER_FAILURES=0, ou breaker=false)."""
+    if cfg is False or (not cfg and settings.BREAKER_FAILURES <= 0):
+        return None
+    cfg = cfg if isinstance(cfg, dict) else _NO_CFG
+    if _threshold(cfg) <= 0:
+        return None
+    name = origin(url)
+    br = _BREAKERS.get(name)
+    if br is None:
+        with _LOCK:
+            br = _BREAKERS.get(name)
+            if br is None:
+                br = _BREAKERS[name] = Breaker(name, cfg)
+                return br
+    if not any(c is cfg for c in br.cfgs):
+        check_same_cfg("breaker", name, br.cfgs, cfg)
+    return br
+
+def breaker_stats() -> Dict[str, Dict[str, Any]]:
+    return {name: br.snapshot() for name, br in list(_BREAKERS.items())}
@@ -0,0 +1,335 @@
+from __future__ import annotations
+
+import time
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Dict, Optional
+
+from .shared_state import shared_store
+from .utils import debug
+
+# =========================
+# Cache de respostas (bloco "cache" dentro de "http")
+# =========================
+#   "cache": {
+#     "ttl": 60,                     # segundos (default quando o upstream não manda max-age)
+#     "max_entries": 256,
+#     "max_bytes": 10485760,
+#     "vary": ["Accept-Language"],   # headers da requisição que entram na chave
+#     "stale_while_revalidate": 30,  # serve vencido enquanto revalida em background
+#     "negative_ttl": 5,             # cacheia erros (404/410/5xx) por pouco tempo
+#     "respect_cache_control": true,
+#     "name": "coffee"               # opcional: compartilha/separa caches entre definições
+#   }
+# Com SHARED_STATE_FILE (vários workers) as entradas gravadas também vão para o store
+# compartilhado; um worker sem a entrada (ou com ela vencida) procura lá antes do upstream.
+
+CACHEABLE_METHODS = ("GET", "HEAD")
+DEFAULT_NEGATIVE_STATUSES = (404, 410, 500, 502, 503, 504)
+
+def parse_cache_control(value: Optional[str]) -> Dict[str, Optional[str]]:
+    out: Dict[str, Optional[str]] = {}
+    for part in (value or "").split(","):
+        part = part.strip()
+        if not part:
+            continue
+        k, _, v = part.partition("=")
+        out[k.strip().lower()] = v.strip().strip('"') if v else None
+    return out
+
+def _cc_seconds(cc: dict, name: str) -> Optional[int]:
+    try:
+        return int(cc[name]) if cc.get(name) is not None else None
+    except ValueError:
+        return None
+
+@dataclass
+class CacheEntry:
+    status: int
+    mode: str = "json"
+    payload: Any = None
+    size: int = 0
+    expires: float = 0.0
+    stale_until: float = 0.0
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+    vary: Dict[str, str] = field(default_factory=dict)
+    revalidating: bool = False
+
+    @property
+    def negative(self) -> bool:
+        return self.status >= 400
+
+    def has_validators(self) -> bool:
+        return bool(self.etag or self.last_modified)
+
+class ResponseCache:
+    """LRU limitado por número de entradas e bytes, com TTL e revalidação condicional."""
+
+    def __init__(self, name: str, cfg: dict):
+        self.name = name
+        self.ttl = float(cfg.get("ttl", 60))
+        self.max_entries = int(cfg.get("max_entries", 256))
+        self.max_bytes = int(cfg.get("max_bytes", 10 * 1024 * 1024))
+        self.vary = [h.lower() for h in (cfg.get("vary") or [])]
+        self.swr = float(cfg.get("stale_while_revalidate", 0))
+        self.negative_ttl = float(cfg.get("negative_ttl", 0))
+        self.negative_statuses = tuple(cfg.get("negative_statuses") or DEFAULT_NEGATIVE_STATUSES)
+        self.respect_cache_control = bool(cfg.get("respect_cache_control", True))
+        self._entries: "OrderedDict[tuple, CacheEntry]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.shared = shared_store()
+        self.stats = {
+            "hits": 0, "misses": 0, "stale_hits": 0, "negative_hits": 0,
+            "revalidations": 0, "not_modified": 0, "stores": 0, "evictions": 0, "shared_hits": 0,
+        }
+
+    # ---------- chave / lookup
+    def key_for(self, method: str, url: str, params: Dict[str, str], headers: Dict[str, str]) -> tuple:
+        lower = {k.lower(): v for k, v in headers.items()}
+        return (
+            method, url,
+            tuple(sorted(params.items())),
+            tuple((h, lower.get(h, "")) for h in self.vary),
+        )
+
+    def lookup(self, key: tuple, headers: Dict[str, str]) -> tuple[Optional[CacheEntry], str]:
+        """
+        Retorna (entry, estado) com estado em:
+          "fresh"   -> dentro do TTL
+          "stale"   -> vencido, mas dentro de stale-while-revalidate
+          "expired" -> vencido com validadores (ETag/Last-Modified): revalidar condicionalmente
+          "miss"    -> ausente (ou inutilizável)
+        """
+        now = time.time()
+        if self.shared is not None:
+            local = self._entries.get(key)
+            if local is None or now >= local.expires:
+                self._load_shared(key, local)  # outro worker pode ter guardado (ou renovado)
+        return self._lookup_local(key, headers, now)
+
+    async def alookup(self, key: tuple, headers: Dict[str, str]) -> tuple[Optional[CacheEntry], str]:
+        """lookup para o código async: a consulta ao SQLite compartilhado roda fora do event loop."""
+        now = time.time()
+        if self.shared is not None:
+            local = self._entries.get(key)
+            if local is None or now >= local.expires:
+                self._adopt_shared(key, local, await self.shared.aget(shared_ns(self.name), key))
+        return self._lookup_local(key, headers, now)
+
+    def _lookup_local(self, key: tuple, headers: Dict[str, str], now: float) -> tuple[Optional[CacheEntry], str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.vary:
+                lower = {k.lower(): v for k, v in headers.items()}
+                if any(lower.get(h, "") != v for h, v in entry.vary.items()):
+                    entry = None
+            if entry is None:
+                self.stats["misses"] += 1
+                return None, "miss"
+            self._entries.move_to_end(key)
+            if now < entry.expires:
+                self.stats["negative_hits" if entry.negative else "hits"] += 1
+                return entry, "fresh"
+            if now < entry.stale_until:
+                self.stats["stale_hits"] += 1
+                return entry, "stale"
+            self.stats["misses"] += 1
+            if entry.has_validators():
+                return entry, "expired"
+            self._drop(key)
+            return None, "miss"
+
+    # ---------- escrita
+    def _lifetimes(self, headers) -> Optional[tuple[float, float]]:
+        """(ttl, swr) a partir de Cache-Control; None se a resposta não pode ser guardada."""
+        ttl, swr = self.ttl, self.swr
+        if self.respect_cache_control:
+            cc = parse_cache_control(headers.get("cache-control"))
+            if "no-store" in cc:
+                return None
+            max_age = _cc_seconds(cc, "s-maxage")
+            if max_age is None:
+                max_age = _cc_seconds(cc, "max-age")
+            if "no-cache" in cc:
+                ttl = 0.0
+            elif max_age is not None:
+                ttl = float(max_age)
+            up_swr = _cc_seconds(cc, "stale-while-revalidate")
+            if up_swr is not None:
+                swr = float(up_swr)
+        return ttl, swr
+
+    def store(self, key: tuple, status: int, headers, mode: str, payload: Any, size: int,
+              req_headers: Dict[str, str]) -> bool:
+        now = time.time()
+        if status >= 400:
+            if not self.negative_ttl or status not in self.negative_statuses:
+                return False
+            entry = CacheEntry(status=status, expires=now + self.negative_ttl, stale_until=now + self.negative_ttl)
+        else:
+            vary_hdr = headers.get("vary") or ""
+            if "*" in vary_hdr:
+                return False
+            life = self._lifetimes(headers)
+            if life is None:
+                return False
+            ttl, swr = life
+            entry = CacheEntry(
+                status=status, mode=mode, payload=payload, size=size,
+                expires=now + ttl, stale_until=now + ttl + swr,
+                etag=headers.get("etag"), last_modified=headers.get("last-modified"),
+            )
+            if ttl <= 0 and swr <= 0 and not entry.has_validators():
+                return False
+            lower = {k.lower(): v for k, v in req_headers.items()}
+            entry.vary = {h.strip().lower(): lower.get(h.strip().lower(), "")
+                          for h in vary_hdr.split(",") if h.strip()}
+        if entry.size > self.max_bytes:
+            return False
+        with self._lock:
+            self._insert(key, entry)
+            self.stats["stores"] += 1
+        self._put_shared(key, entry)
+        return True
+
+    def _insert(self, key: tuple, entry: CacheEntry):
+        self._drop(key)
+        self._entries[key] = entry
+        self._bytes += entry.size
+        while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+            old_key, _ = next(iter(self._entries.items()))
+            self._drop(old_key)
+            self.stats["evictions"] += 1
+
+    def refresh(self, key: tuple, entry: CacheEntry, headers):
+        """Upstream respondeu 304: renova validade da entrada existente."""
+        now = time.time()
+        life = self._lifetimes(headers) or (self.ttl, self.swr)
+        with self._lock:
+            entry.expires = now + life[0]
+            entry.stale_until = entry.expires + life[1]
+            entry.etag = headers.get("etag") or entry.etag
+            entry.last_modified = headers.get("last-modified") or entry.last_modified
+            self.stats["not_modified"] += 1
+            if key not in self._entries:
+                self._entries[key] = entry
+                self._bytes += entry.size
+        self._put_shared(key, entry)
+
+    # ---------- estado compartilhado entre workers
+    def _load_shared(self, key: tuple, current: Optional[CacheEntry]):
+        self._adopt_shared(key, current, self.shared.get(shared_ns(self.name), key))
+
+    def _adopt_shared(self, key: tuple, current: Optional[CacheEntry], value: Any):
+        if value is None:
+            return
+        status, mode, payload, size, expires, stale_until, etag, last_modified, vary = value
+        if size > self.max_bytes or (current is not None and expires <= current.expires):
+            return
+        entry = CacheEntry(status=status, mode=mode, payload=payload, size=size, expires=expires,
+                           stale_until=stale_until, etag=etag, last_modified=last_modified, vary=vary)
+        with self._lock:
+            if self._entries.get(key) is current:
+                self._insert(key, entry)
+                self.stats["shared_hits"] += 1
+
+    def _put_shared(self, key: tuple, entry: CacheEntry):
+        if self.shared is None:
+            return
+        keep = entry.stale_until - time.time()
+        if entry.has_validators():
+            keep += max(self.ttl, 60.0)  # vencida ainda serve para a revalidação condicional
+        self.shared.put(shared_ns(self.name), key, (
+            entry.status, entry.mode, entry.payload, entry.size, entry.expires, entry.stale_until,
+            entry.etag, entry.last_modified, entry.vary,
+        ), keep)
+
+    def begin_revalidation(self, entry: CacheEntry) -> bool:
+        """Marca a entrada como em revalidação; False se já houver uma em andamento."""
+        with self._lock:
+            if entry.revalidating:
+                return False
+            entry.revalidating = True
+            self.stats["revalidations"] += 1
+            return True
+
+    def count(self, stat: str):
+        with self._lock:
+            self.stats[stat] += 1
+
+    def _drop(self, key: tuple):
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self._bytes -= old.size
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {**self.stats, "entries": len(self._entries), "bytes": self._bytes,
+                    "max_entries": self.max_entries, "max_bytes": self.max_bytes}
+
+# =========================
+# Registro de caches
+# =========================
+_CACHES: dict[str, ResponseCache] = {}
+_LOCK = threading.Lock()
+
+def get_cache(http_cfg: dict) -> Optional[ResponseCache]:
+    """Cache da definição (None se não houver bloco 'cache' ou o método não for cacheável)."""
+    cfg = http_cfg.get("cache")
+    if not cfg:
+        return None
+    if cfg is True:
+        cfg = {}
+    method = (http_cfg.get("method") or "GET").upper()
+    if method not in CACHEABLE_METHODS:
+        return None
+    name = _cache_name(http_cfg, cfg)
+    cache = _CACHES.get(name)
+    if cache is None:
+        with _LOCK:
+            cache = _CACHES.get(name)
+            if cache is None:
+                cache = _CACHES[name] = ResponseCache(name, cfg)
+                debug(f"cache: novo cache '{name}' (ttl={cache.ttl}s, max_entries={cache.max_entries})")
+    return cache
+
+def shared_ns(name: str) -> str:
+    return f"cache:{name}"
+
+def _cache_name(http_cfg: dict, cfg: dict) -> str:
+    return cfg.get("name") or f"{(http_cfg.get('method') or 'GET').upper()} {http_cfg['url']}"
+
+def discard_cache(http_cfg: dict) -> Optional[ResponseCache]:
+    """
+    Descarta o cache da definição (reload: definição alterada ou removida) e o devolve.
+    Chamado antes de registrar a versão nova, para que ela crie o cache com o cfg novo.
+    """
+    cfg = http_cfg.get("cache")
+    if not cfg:
+        return None
+    name = _cache_name(http_cfg, {} if cfg is True else cfg)
+    with _LOCK:
+        cache = _CACHES.pop(name, None)
+    if cache is not None:
+        debug(f"cache: '{name}' descartado")
+    store = shared_store()
+    if store is not None:
+        store.delete(shared_ns(name))
+    return cache
+
+def restore_cache(cache: ResponseCache):
+    """Devolve ao registro um cache descartado (reload: a versão nova falhou e a anterior volta)."""
+    with _LOCK:
+        _CACHES[cache.name] = cache
+
+def cache_stats() -> Dict[str, Dict[str, Any]]:
+    """Contadores por cache (hits, misses, evictions, ...) para dimensionamento."""
+    return {name: c.snapshot() for name, c in list(_CACHES.items())}
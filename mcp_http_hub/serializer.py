@@ -0,0 +1,58 @@
+from __future__ import annotations
+
+import json
+from typing import Any, Optional
+
+from .settings import settings
+from .utils import debug, warn
+
+# =========================
+# Serialização JSON (JSON_SERIALIZER=auto|orjson|json)
+# =========================
+# Respostas JSON do upstream são decodificadas e os resultados de tools/resources/prompts
+# serializados por aqui. "auto" usa o orjson quando o pacote está instalado
+# (pip install orjson); sem ele, ou com JSON_SERIALIZER=json, fica o json da stdlib.
+# Saída compacta e sem escapar não-ASCII nos dois casos; o que o orjson não aceita
+# (inteiros > 64 bits, corpo fora de UTF-8) cai no json da stdlib.
+
+_orjson: Any = None
+_BACKEND: Optional[str] = None
+
+def _backend() -> str:
+    global _orjson, _BACKEND
+    if _BACKEND is None:
+        choice = settings.JSON_SERIALIZER
+        if choice in ("auto", "orjson"):
+            try:
+                import orjson
+                _orjson, _BACKEND = orjson, "orjson"
+            except ImportError:
+                _BACKEND = "json"
+                if choice == "orjson":
+                    warn("json: JSON_SERIALIZER=orjson mas o pacote 'orjson' não está instalado; usando json")
+        else:
+            _BACKEND = "json"
+        debug("json: serializador %s", _BACKEND)
+    return _BACKEND
+
+def serializer_name() -> str:
+    return _backend()
+
+def _std_dumps(obj: Any) -> str:
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":"), default=str)
+
+def dumps(obj: Any) -> str:
+    if _backend() == "orjson":
+        try:
+            return _orjson.dumps(obj, default=str, option=_orjson.OPT_NON_STR_KEYS).decode("utf-8")
+        except TypeError:
+            pass  # ex.: inteiro fora de 64 bits
+    return _std_dumps(obj)
+
+def loads(data: "str | bytes") -> Any:
+    if _backend() == "orjson":
+        try:
+            return _orjson.loads(data)
+        except ValueError:
+            pass  # corpo em UTF-16/32 ou inválido: a stdlib detecta a codificação (e gera o erro)
+    return json.loads(data)
@@ -30,18 +30,126 @@ class Settings:
     HOST: str = os.getenv("HOST", "0.0.0.0")
     SERVER_NAME: str = os.getenv("SERVER_NAME", "MCP-HTTP-Hub")
 
+    # processos: WORKERS > 1 sobe um supervisor com N workers na mesma porta (0 = um por CPU)
+    WORKERS: int = _as_int(os.getenv("WORKERS"), 1)
+    # streamable-http sem sessão (obrigatório com vários workers) e respostas JSON em vez de SSE
+    STATELESS_HTTP: bool = _as_bool(os.getenv("STATELESS_HTTP"), False)
+    JSON_RESPONSE: bool = _as_bool(os.getenv("JSON_RESPONSE"), False)
+    # SQLite com tokens oauth2, cache de respostas e blobs vistos por todos os workers
+    # (vazio: só em memória; com WORKERS > 1 o supervisor cria um arquivo temporário)
+    SHARED_STATE_FILE: str = os.getenv("SHARED_STATE_FILE", "")
+
     TOOLS_FILE: str = os.getenv("TOOLS_FILE", "config/tools.json")
     PROMPTS_FILE: str = os.getenv("PROMPTS_FILE", "config/prompts.json")
     RESOURCES_FILE: str = os.getenv("RESOURCES_FILE", "config/resources.json")
+    # hot-reload: intervalo (s) de verificação dos arquivos acima; 0 = só SIGHUP / POST /hub/reload
+    CONFIG_WATCH_INTERVAL: float = _as_float(os.getenv("CONFIG_WATCH_INTERVAL"), 0.0)
+    # POST /hub/reload: exige "Authorization: Bearer <token>"; vazio = só aceito de loopback (127.0.0.1/::1)
+    RELOAD_TOKEN: str = os.getenv("RELOAD_TOKEN", "")
+    # catálogo de tools: Tool do FastMCP criada só na primeira chamada; tools/list paginado (0 = tudo)
+    CATALOG_LAZY: bool = _as_bool(os.getenv("CATALOG_LAZY"), True)
+    CATALOG_SNAPSHOT: str = os.getenv("CATALOG_SNAPSHOT", "")
+    TOOLS_PAGE_SIZE: int = _as_int(os.getenv("TOOLS_PAGE_SIZE"), 1000)
+
+    # resources com "prefetch": snapshot do warm store (recarregado na inicialização) e buscas simultâneas
+    PREFETCH_SNAPSHOT: str = os.getenv("PREFETCH_SNAPSHOT", "")
+    PREFETCH_CONCURRENCY: int = _as_int(os.getenv("PREFETCH_CONCURRENCY"), 4)
 
     HTTP_TIMEOUT: float = _as_float(os.getenv("HTTP_TIMEOUT"), 15.0)
     HTTP_VERIFY_SSL: bool = _as_bool(os.getenv("HTTP_VERIFY_SSL"), False)
     MAX_MULTIPART_MB: float = _as_float(os.getenv("MAX_MULTIPART_MB"), 25.0)
 
+    # prazo total por chamada (s; token + tentativas + corpo; 0 = sem prazo); "deadline" sobrepõe.
+    # CANCEL_ON_DISCONNECT: cliente que fecha a conexão cancela a ida ao upstream
+    CALL_DEADLINE: float = _as_float(os.getenv("CALL_DEADLINE"), 30.0)
+    CANCEL_ON_DISCONNECT: bool = _as_bool(os.getenv("CANCEL_ON_DISCONNECT"), True)
+
+    # timeouts por fase (default: HTTP_TIMEOUT); "timeout" no bloco http sobrepõe
+    HTTP_CONNECT_TIMEOUT: float = _as_float(os.getenv("HTTP_CONNECT_TIMEOUT"), HTTP_TIMEOUT)
+    HTTP_READ_TIMEOUT: float = _as_float(os.getenv("HTTP_READ_TIMEOUT"), HTTP_TIMEOUT)
+    HTTP_WRITE_TIMEOUT: float = _as_float(os.getenv("HTTP_WRITE_TIMEOUT"), HTTP_TIMEOUT)
+    HTTP_POOL_TIMEOUT: float = _as_float(os.getenv("HTTP_POOL_TIMEOUT"), HTTP_TIMEOUT)
+
+    # pool de conexões keep-alive (por host); "pool" no bloco http sobrepõe
+    HTTP_MAX_CONNECTIONS: int = _as_int(os.getenv("HTTP_MAX_CONNECTIONS"), 100)
+    HTTP_MAX_KEEPALIVE: int = _as_int(os.getenv("HTTP_MAX_KEEPALIVE"), 20)
+    HTTP_KEEPALIVE_EXPIRY: float = _as_float(os.getenv("HTTP_KEEPALIVE_EXPIRY"), 30.0)
+    HTTP_HTTP2: bool = _as_bool(os.getenv("HTTP_HTTP2"), False)
+    # cache de DNS em processo (s; 0 = desligado) e warm-up dos upstreams conhecidos: conexões ociosas
+    # mantidas por host (0 = só DNS, o padrão: cada definição liga com "pool": {"warm": N}),
+    # intervalo (0 = só na subida) e caminho do HEAD
+    DNS_CACHE_TTL: float = _as_float(os.getenv("DNS_CACHE_TTL"), 60.0)
+    WARMUP_CONNECTIONS: int = _as_int(os.getenv("WARMUP_CONNECTIONS"), 0)
+    WARMUP_INTERVAL: float = _as_float(os.getenv("WARMUP_INTERVAL"), 20.0)
+    WARMUP_PATH: str = os.getenv("WARMUP_PATH", "/")
+
+    # oauth2: refresh antecipado (s antes de expirar) e backoff do token endpoint
+    OAUTH_REFRESH_AHEAD: float = _as_float(os.getenv("OAUTH_REFRESH_AHEAD"), 60.0)
+    OAUTH_BACKOFF_BASE: float = _as_float(os.getenv("OAUTH_BACKOFF_BASE"), 1.0)
+    OAUTH_BACKOFF_MAX: float = _as_float(os.getenv("OAUTH_BACKOFF_MAX"), 60.0)
+
+    # "response": "stream": teto, tamanho das partes, limite inline e spool em memória
+    STREAM_MAX_BYTES: int = _as_int(os.getenv("STREAM_MAX_BYTES"), 200 * 1024 * 1024)
+    STREAM_CHUNK_BYTES: int = _as_int(os.getenv("STREAM_CHUNK_BYTES"), 1024 * 1024)
+    STREAM_INLINE_BYTES: int = _as_int(os.getenv("STREAM_INLINE_BYTES"), 1024 * 1024)
+    STREAM_SPOOL_BYTES: int = _as_int(os.getenv("STREAM_SPOOL_BYTES"), 1024 * 1024)
+    STREAM_TTL: float = _as_float(os.getenv("STREAM_TTL"), 600.0)
+    STREAM_DIR: str = os.getenv("STREAM_DIR", "")
+
+    # opt-in: resultados JSON acima de RESULT_PAGE_CHARS voltam paginados (0 = inteiros, o padrão);
+    # "page_chars" na definição sobrepõe. Páginas guardadas por RESULT_PAGE_TTL s, até RESULT_PAGES_MAX_BYTES no total
+    RESULT_PAGE_CHARS: int = _as_int(os.getenv("RESULT_PAGE_CHARS"), 0)
+    RESULT_PAGE_TTL: float = _as_float(os.getenv("RESULT_PAGE_TTL"), 600.0)
+    RESULT_PAGES_MAX_BYTES: int = _as_int(os.getenv("RESULT_PAGES_MAX_BYTES"), 64 * 1024 * 1024)
+    # "paginate" no bloco http: teto de páginas e de itens lidos (0 = sem teto) e páginas em paralelo
+    # quando o total é conhecido; o bloco sobrepõe
+    PAGINATE_MAX_PAGES: int = _as_int(os.getenv("PAGINATE_MAX_PAGES"), 20)
+    PAGINATE_MAX_ITEMS: int = _as_int(os.getenv("PAGINATE_MAX_ITEMS"), 10_000)
+    PAGINATE_CONCURRENCY: int = _as_int(os.getenv("PAGINATE_CONCURRENCY"), 4)
+    # prompts HTTP: teto do texto renderizado (0 = sem teto) e tempo para as variáveis do "render"
+    PROMPT_MAX_CHARS: int = _as_int(os.getenv("PROMPT_MAX_CHARS"), 100_000)
+    PROMPT_RENDER_MS: float = _as_float(os.getenv("PROMPT_RENDER_MS"), 250.0)
+    # serializador JSON: auto (orjson se instalado) | orjson | json
+    JSON_SERIALIZER: str = os.getenv("JSON_SERIALIZER", "auto").strip().lower()
+
+    # limites por host upstream (0 = sem limite); "limits" no bloco http sobrepõe
+    UPSTREAM_MAX_IN_FLIGHT: int = _as_int(os.getenv("UPSTREAM_MAX_IN_FLIGHT"), 0)
+    UPSTREAM_RPS: float = _as_float(os.getenv("UPSTREAM_RPS"), 0.0)
+    UPSTREAM_BURST: int = _as_int(os.getenv("UPSTREAM_BURST"), 0)
+    UPSTREAM_MAX_QUEUE: int = _as_int(os.getenv("UPSTREAM_MAX_QUEUE"), 100)
+    UPSTREAM_QUEUE_TIMEOUT: float = _as_float(os.getenv("UPSTREAM_QUEUE_TIMEOUT"), 10.0)
+    UPSTREAM_RETRY_AFTER_MAX: float = _as_float(os.getenv("UPSTREAM_RETRY_AFTER_MAX"), 60.0)
+
+    # retries (métodos idempotentes) e circuit breaker por host; "retry"/"breaker" no bloco http sobrepõem
+    HTTP_RETRIES: int = _as_int(os.getenv("HTTP_RETRIES"), 0)
+    HTTP_RETRY_BACKOFF: float = _as_float(os.getenv("HTTP_RETRY_BACKOFF"), 0.2)
+    HTTP_RETRY_BACKOFF_MAX: float = _as_float(os.getenv("HTTP_RETRY_BACKOFF_MAX"), 5.0)
+    BREAKER_FAILURES: int = _as_int(os.getenv("BREAKER_FAILURES"), 0)
+    BREAKER_RESET_TIMEOUT: float = _as_float(os.getenv("BREAKER_RESET_TIMEOUT"), 30.0)
+    BREAKER_HALF_OPEN_MAX: int = _as_int(os.getenv("BREAKER_HALF_OPEN_MAX"), 1)
+
+    # logs: nível, formato (text|json), escrita em background, amostragem de debug por requisição
+    # e chamadas lentas (ms; 0 = desligado) logadas como WARNING
+    LOG_LEVEL: str = os.getenv("LOG_LEVEL", "info")
+    LOG_FORMAT: str = os.getenv("LOG_FORMAT", "text").strip().lower()
+    LOG_ASYNC: bool = _as_bool(os.getenv("LOG_ASYNC"), True)
+    LOG_QUEUE_SIZE: int = _as_int(os.getenv("LOG_QUEUE_SIZE"), 10000)
+    LOG_DEBUG_SAMPLE: float = _as_float(os.getenv("LOG_DEBUG_SAMPLE"), 1.0)
+    SLOW_CALL_MS: float = _as_float(os.getenv("SLOW_CALL_MS"), 0.0)
+
+    # métricas Prometheus em GET /metrics (handlers, fases do upstream, filtros)
+    METRICS: bool = _as_bool(os.getenv("METRICS"), True)
+
+    # handlers async (httpx.AsyncClient); false volta aos handlers sync bloqueantes
+    HTTP_ASYNC: bool = _as_bool(os.getenv("HTTP_ASYNC"), True)
+
     # instância única do FastMCP (preenchida no __post_init__)
     mcp: FastMCP = field(init=False, repr=False)
 
     def __post_init__(self):
-        object.__setattr__(self, "mcp", FastMCP(self.SERVER_NAME, host=self.HOST, port=self.PORT))
+        object.__setattr__(self, "mcp", FastMCP(
+            self.SERVER_NAME, host=self.HOST, port=self.PORT,
+            stateless_http=self.STATELESS_HTTP, json_response=self.JSON_RESPONSE,
+        ))
 
 settings = Settings()
\ No newline at end of file
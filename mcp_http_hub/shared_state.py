@@ -0,0 +1,244 @@
+from __future__ import annotations
+
+import os
+import json
+import time
+import sqlite3
+import marshal
+import queue
+import threading
+from typing import Any, Callable, Dict, Optional
+
+import anyio
+
+from .settings import settings
+from .utils import debug, warn
+
+# =========================
+# Estado compartilhado entre workers (SHARED_STATE_FILE)
+# =========================
+# Chave/valor com expiração num arquivo SQLite (WAL) do próprio host: tokens oauth2, entradas
+# do cache de respostas e blobs de respostas stream ficam visíveis para todos os workers.
+# Cada processo continua com a sua cópia em memória; o arquivo só é consultado quando ela falta.
+# Falhas do SQLite (arquivo travado, disco cheio) viram "ausente": nunca derrubam a chamada.
+#   namespaces: "oauth", "cache:<nome>", "blob"
+# Valores em marshal (só tipos simples: dict/list/str/bytes/números); chaves em JSON.
+# O SQLite espera até 2 s por um arquivo travado, então nada disso roda no event loop:
+#   put/delete/purge  vão para uma thread de escrita do processo (quem chama não espera);
+#   get/acquire/release  bloqueiam a thread que chama; no código async use aget/aacquire/arelease
+#                        (anyio.to_thread). Leituras/leases seguem vendo o valor local primeiro.
+
+_SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS kv (ns TEXT NOT NULL, key TEXT NOT NULL, value BLOB NOT NULL,"
+    " expires REAL NOT NULL, PRIMARY KEY (ns, key))",
+    "CREATE TABLE IF NOT EXISTS lease (ns TEXT NOT NULL, key TEXT NOT NULL, owner INTEGER NOT NULL,"
+    " until REAL NOT NULL, PRIMARY KEY (ns, key))",
+)
+_PURGE_EVERY = 512  # escritas entre limpezas das linhas vencidas
+_MAX_QUEUED = 10000  # escritas pendentes; além disso (SQLite travado) o put é descartado
+
+def _key(key: Any) -> str:
+    return key if isinstance(key, str) else json.dumps(key, ensure_ascii=False, separators=(",", ":"))
+
+class SharedStore:
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()  # uma conexão por thread
+        self._writes = 0
+        self._lock = threading.Lock()
+        self._queue: "queue.SimpleQueue[tuple]" = queue.SimpleQueue()
+        self._writer: Optional[threading.Thread] = None
+        self.stats = {"gets": 0, "hits": 0, "puts": 0, "deletes": 0, "leases": 0, "errors": 0, "queued": 0}
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=2.0, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            for stmt in _SCHEMA:
+                conn.execute(stmt)
+            self._local.conn = conn
+        return conn
+
+    def _count(self, stat: str):
+        with self._lock:
+            self.stats[stat] += 1
+
+    def _failed(self, op: str, e: Exception):
+        self._count("errors")
+        debug("shared: %s falhou: %s", op, e)
+
+    # ---------- thread de escrita
+    def _submit(self, fn: Callable, *args):
+        with self._lock:
+            self.stats["queued"] += 1
+            if self._writer is None:
+                self._writer = threading.Thread(target=self._write_loop, name="shared-writer", daemon=True)
+                self._writer.start()
+        self._queue.put((fn, args))
+
+    def _write_loop(self):
+        while True:
+            fn, args = self._queue.get()
+            with self._lock:
+                self.stats["queued"] -= 1
+            try:
+                fn(*args)
+            except Exception as e:  # nunca derruba a thread
+                self._failed(getattr(fn, "__name__", "escrita"), e)
+
+    def flush(self, timeout: float = 5.0) -> bool:
+        """Espera as escritas enfileiradas até aqui (shutdown/testes)."""
+        done = threading.Event()
+        self._submit(done.set)
+        return done.wait(timeout)
+
+    # ---------- chave/valor
+    def get(self, ns: str, key: Any) -> Optional[Any]:
+        self._count("gets")
+        try:
+            row = self._conn().execute("SELECT value FROM kv WHERE ns = ? AND key = ? AND expires > ?",
+                                       (ns, _key(key), time.time())).fetchone()
+            if row is None:
+                return None
+            value = marshal.loads(row[0])
+        except (sqlite3.Error, ValueError, EOFError, TypeError) as e:
+            self._failed("get", e)
+            return None
+        self._count("hits")
+        return value
+
+    async def aget(self, ns: str, key: Any) -> Optional[Any]:
+        return await anyio.to_thread.run_sync(self.get, ns, key)
+
+    def put(self, ns: str, key: Any, value: Any, ttl: float) -> bool:
+        """Enfileira a gravação (não espera o SQLite); False se o valor não pode ser compartilhado."""
+        if ttl <= 0:
+            return False
+        try:
+            data = marshal.dumps(value)
+        except ValueError:
+            return False  # valor com tipos que o marshal não serializa: fica só local
+        if self.stats["queued"] >= _MAX_QUEUED:
+            self._failed("put", "fila de escrita cheia")
+            return False
+        self._submit(self._put, ns, _key(key), data, time.time() + ttl)
+        return True
+
+    def _put(self, ns: str, key: str, data: bytes, expires: float):
+        try:
+            self._conn().execute("INSERT OR REPLACE INTO kv (ns, key, value, expires) VALUES (?, ?, ?, ?)",
+                                 (ns, key, data, expires))
+        except sqlite3.Error as e:
+            self._failed("put", e)
+            return
+        self._count("puts")
+        with self._lock:
+            self._writes += 1
+            purge = self._writes % _PURGE_EVERY == 0
+        if purge:
+            self._purge()
+
+    def delete(self, ns: str, key: Any = None, only_if: Optional[Callable[[Any], bool]] = None):
+        """
+        Enfileira a remoção de uma chave (ou do namespace inteiro, se key for None).
+        only_if: só remove se o valor atual passar no teste (avaliado na thread de escrita).
+        """
+        self._submit(self._delete, ns, key, only_if)
+
+    def _delete(self, ns: str, key: Any, only_if: Optional[Callable[[Any], bool]]):
+        if only_if is not None:
+            value = self.get(ns, key)
+            if value is None or not only_if(value):
+                return
+        try:
+            if key is None:
+                self._conn().execute("DELETE FROM kv WHERE ns = ?", (ns,))
+            else:
+                self._conn().execute("DELETE FROM kv WHERE ns = ? AND key = ?", (ns, _key(key)))
+        except sqlite3.Error as e:
+            self._failed("delete", e)
+            return
+        self._count("deletes")
+
+    def purge(self):
+        self._submit(self._purge)
+
+    def _purge(self):
+        try:
+            now = time.time()
+            self._conn().execute("DELETE FROM kv WHERE expires <= ?", (now,))
+            self._conn().execute("DELETE FROM lease WHERE until <= ?", (now,))
+        except sqlite3.Error as e:
+            self._failed("purge", e)
+
+    # ---------- lease (um único worker busca o valor; os outros esperam por ele)
+    def acquire(self, ns: str, key: Any, ttl: float) -> bool:
+        """True se este processo ficou com o lease (ou se o SQLite falhou: segue sem coordenação)."""
+        now = time.time()
+        try:
+            cur = self._conn().execute(
+                "INSERT INTO lease (ns, key, owner, until) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (ns, key) DO UPDATE SET owner = excluded.owner, until = excluded.until "
+                "WHERE lease.until <= ? OR lease.owner = excluded.owner",
+                (ns, _key(key), os.getpid(), now + ttl, now))
+        except sqlite3.Error as e:
+            self._failed("acquire", e)
+            return True
+        if cur.rowcount == 1:
+            self._count("leases")
+            return True
+        return False
+
+    async def aacquire(self, ns: str, key: Any, ttl: float) -> bool:
+        return await anyio.to_thread.run_sync(self.acquire, ns, key, ttl)
+
+    def release(self, ns: str, key: Any):
+        try:
+            self._conn().execute("DELETE FROM lease WHERE ns = ? AND key = ? AND owner = ?",
+                                 (ns, _key(key), os.getpid()))
+        except sqlite3.Error as e:
+            self._failed("release", e)
+
+    async def arelease(self, ns: str, key: Any):
+        await anyio.to_thread.run_sync(self.release, ns, key)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {**self.stats, "path": self.path}
+
+# =========================
+# Instância do processo
+# =========================
+_STORE: Optional[SharedStore] = None
+_STORE_LOCK = threading.Lock()
+_DISABLED = False
+
+def shared_store() -> Optional[SharedStore]:
+    """Store compartilhado, ou None quando SHARED_STATE_FILE não está configurado (um processo só)."""
+    global _STORE, _DISABLED
+    if _STORE is not None or _DISABLED or not settings.SHARED_STATE_FILE:
+        return _STORE
+    with _STORE_LOCK:
+        if _STORE is None and not _DISABLED:
+            store = SharedStore(settings.SHARED_STATE_FILE)
+            try:
+                store._conn()
+            except sqlite3.Error as e:
+                warn(f"shared: não foi possível abrir {settings.SHARED_STATE_FILE} ({e}); estado só local")
+                _DISABLED = True
+                return None
+            _STORE = store
+            debug(f"shared: estado compartilhado em {store.path}")
+    return _STORE
+
+def flush_shared():
+    """Shutdown: grava o que ainda está na fila de escrita (tokens, entradas de cache)."""
+    if _STORE is not None and not _STORE.flush():
+        warn("shared: escritas pendentes descartadas no shutdown")
+
+def shared_stats() -> Dict[str, Any]:
+    store = shared_store()
+    return {"pid": os.getpid(), "worker": os.environ.get("HUB_WORKER"),
+            "store": store.snapshot() if store is not None else None}
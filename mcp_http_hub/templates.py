@@ -0,0 +1,149 @@
+from __future__ import annotations
+
+import re
+import string
+from functools import lru_cache
+from typing import Any, Iterable
+
+# =========================
+# Templates pré-compilados ({placeholder})
+# =========================
+# Semântica idêntica ao antigo safe_format (str.format_map com chaves
+# desconhecidas preservadas como "{chave}"), mas o parse é feito uma vez só
+# e a renderização consulta apenas os placeholders referenciados, sobre
+# qualquer Mapping (ex.: ChainMap(args, os.environ)) sem copiá-lo.
+
+_FORMATTER = string.Formatter()
+_ROOT_RE = re.compile(r"[^.\[]*")
+
+class _SafeMap:
+    """Mapping mínimo para format_map: chave ausente vira "{chave}" (sem copiar ctx)."""
+    __slots__ = ("ctx",)
+
+    def __init__(self, ctx):
+        self.ctx = ctx
+
+    def __getitem__(self, k):
+        try:
+            return self.ctx[k]
+        except KeyError:
+            return "{%s}" % k
+
+class Template:
+    __slots__ = ("source", "parts", "fields", "const", "legacy", "simple")
+
+    def __init__(self, source: str):
+        self.source = source
+        self.parts: tuple = ()
+        self.fields: frozenset = frozenset()
+        self.const = None
+        self.simple = False
+        # specs aninhados ("{x:{w}}"), campos posicionais ou template inválido:
+        # delega ao format_map em tempo de chamada (inclusive o erro, como antes)
+        self.legacy = False
+        try:
+            parsed = list(_FORMATTER.parse(source))
+        except ValueError:
+            self.legacy = True
+            return
+        parts = []
+        fields = set()
+        for literal, expr, spec, conv in parsed:
+            if expr is None:
+                parts.append((literal, None, None, None, None))
+                continue
+            root = _ROOT_RE.match(expr).group(0)
+            if not root or root.isdigit() or (spec and "{" in spec):
+                self.legacy = True
+                return
+            fields.add(root)
+            parts.append((literal, expr, root, conv, spec or ""))
+        self.fields = frozenset(fields)
+        if not fields:
+            # constante: "{{" / "}}" já desescapados
+            self.const = "".join(p[0] for p in parts)
+        else:
+            self.parts = tuple(parts)
+            # só "{nome}" (sem atributo/índice/conversão/spec): format_map em C resolve
+            self.simple = all(p[1] is None or (p[1] == p[2] and not p[3] and not p[4]) for p in parts)
+
+    def render(self, ctx) -> str:
+        if self.const is not None:
+            return self.const
+        if self.legacy:
+            return self.source.format_map(_SafeMap(ctx))
+        if self.simple:
+            try:
+                return self.source.format_map(ctx)
+            except KeyError:
+                pass  # placeholder ausente: caminho completo preserva "{chave}"
+        out = []
+        for literal, expr, root, conv, spec in self.parts:
+            if literal:
+                out.append(literal)
+            if expr is None:
+                continue
+            try:
+                val = ctx[root]
+            except KeyError:
+                val = "{%s}" % root
+            if expr != root:
+                val, _ = _FORMATTER.get_field(expr, (), {root: val})
+            if conv:
+                val = _FORMATTER.convert_field(val, conv)
+            out.append(format(val, spec))
+        return "".join(out)
+
+    def __repr__(self):
+        return f"Template({self.source!r})"
+
+@lru_cache(maxsize=4096)
+def compile_template(source: str) -> Template:
+    return Template(source)
+
+# =========================
+# Árvores (body/form/multipart)
+# =========================
+class _Node:
+    """Nó compilado de uma árvore dict/list com Templates nas folhas string."""
+    __slots__ = ("kind", "value", "fields")
+
+    def __init__(self, kind: str, value: Any, fields: frozenset):
+        self.kind = kind      # "const" | "tmpl" | "list" | "dict"
+        self.value = value
+        self.fields = fields
+
+def compile_obj(obj: Any) -> _Node:
+    """Compila a árvore; subárvores sem placeholders viram constantes."""
+    if isinstance(obj, str):
+        t = compile_template(obj)
+        if t.const is not None:
+            return _Node("const", t.const, frozenset())
+        return _Node("tmpl", t, t.fields)
+    if isinstance(obj, list):
+        items = [compile_obj(x) for x in obj]
+        if all(n.kind == "const" for n in items):
+            return _Node("const", [n.value for n in items], frozenset())
+        return _Node("list", tuple(items), _union(n.fields for n in items))
+    if isinstance(obj, dict):
+        items = [(k, compile_obj(v)) for k, v in obj.items()]
+        if all(n.kind == "const" for _, n in items):
+            return _Node("const", {k: n.value for k, n in items}, frozenset())
+        return _Node("dict", tuple(items), _union(n.fields for _, n in items))
+    return _Node("const", obj, frozenset())
+
+def render_obj(node: _Node, ctx) -> Any:
+    kind = node.kind
+    if kind == "const":
+        return node.value
+    if kind == "tmpl":
+        return node.value.render(ctx)
+    if kind == "list":
+        return [render_obj(n, ctx) for n in node.value]
+    return {k: render_obj(n, ctx) for k, n in node.value}
+
+def _union(sets: Iterable[frozenset]) -> frozenset:
+    out: set = set()
+    for s in sets:
+        out |= s
+    return frozenset(out)
@@ -0,0 +1,140 @@
+from __future__ import annotations
+
+import os
+import zlib
+from typing import Any, Iterator, Optional
+
+import httpx
+
+from .utils import warn
+
+# =========================
+# Uploads multipart a partir do disco
+# =========================
+# O arquivo não é carregado na memória: o httpx lê em chunks de 64KB durante o
+# envio. O tamanho vem de os.stat (limites checados antes de abrir) e a leitura
+# nunca passa do tamanho declarado no Content-Length.
+
+class UploadFile:
+    """
+    File-like preguiçoso para o multipart do httpx: abre o arquivo só ao enviar,
+    fecha no EOF e reabre no seek(0) (reenvio após 401). seek/tell são virtuais,
+    então o httpx descobre o tamanho sem abrir o arquivo.
+    """
+
+    def __init__(self, path: str, size: int):
+        self.path = path
+        self.name = path
+        self.size = size
+        self._pos = 0
+        self._fh = None
+
+    def seek(self, offset: int, whence: int = os.SEEK_SET) -> int:
+        base = {os.SEEK_SET: 0, os.SEEK_CUR: self._pos, os.SEEK_END: self.size}[whence]
+        self._pos = min(max(base + offset, 0), self.size)
+        self.close()
+        return self._pos
+
+    def tell(self) -> int:
+        return self._pos
+
+    def read(self, n: int = -1) -> bytes:
+        remaining = self.size - self._pos
+        if remaining <= 0:
+            self.close()
+            return b""
+        n = remaining if n is None or n < 0 else min(n, remaining)
+        if self._fh is None:
+            self._fh = open(self.path, "rb")
+            self._fh.seek(self._pos)
+        data = self._fh.read(n)
+        if not data:
+            self.close()
+            raise ValueError(f"Arquivo '{self.path}' diminuiu durante o upload")
+        self._pos += len(data)
+        if self._pos >= self.size:
+            self.close()
+        return data
+
+    def close(self):
+        if self._fh is not None:
+            self._fh.close()
+            self._fh = None
+
+def open_upload(field: str, path: Optional[str], max_bytes: int) -> UploadFile:
+    """Valida caminho e tamanho (os.stat) sem ler o conteúdo."""
+    try:
+        st = os.stat(path) if path else None
+    except OSError:
+        st = None
+    if st is None or not os.path.isfile(path):
+        raise ValueError(f"Caminho inválido para campo '{field}': {path!r}")
+    if st.st_size > max_bytes:
+        raise ValueError(f"Arquivo '{path}' excede o limite de {max_bytes / (1024 * 1024):g} MB")
+    return UploadFile(path, st.st_size)
+
+# =========================
+# Compressão do corpo da requisição ("compress": "gzip" | "zstd")
+# =========================
+COMPRESS_LEVELS = {"gzip": 6, "zstd": 3}
+_ZSTD = None  # None = ainda não verificado; False = indisponível
+
+def _zstd_module():
+    """zstd depende do pacote opcional 'zstandard' (pip install zstandard)."""
+    global _ZSTD
+    if _ZSTD is None:
+        try:
+            import zstandard
+            _ZSTD = zstandard
+        except ImportError:
+            _ZSTD = False
+            warn("upload: compress=zstd solicitado mas pacote 'zstandard' não está instalado; enviando sem compressão")
+    return _ZSTD
+
+def compression_options(cfg: Any) -> Optional[dict]:
+    """Normaliza "compress": "gzip" | {"algorithm": "zstd", "level": 10}; None = sem compressão."""
+    if not cfg:
+        return None
+    if isinstance(cfg, str):
+        cfg = {"algorithm": cfg}
+    algo = (cfg.get("algorithm") or "gzip").lower()
+    if algo not in COMPRESS_LEVELS:
+        raise ValueError(f"http.compress: algoritmo '{algo}' não suportado (use gzip ou zstd)")
+    if algo == "zstd" and not _zstd_module():
+        return None
+    return {"algorithm": algo, "level": int(cfg.get("level", COMPRESS_LEVELS[algo]))}
+
+def _compressor(opts: dict):
+    if opts["algorithm"] == "zstd":
+        return _zstd_module().ZstdCompressor(level=opts["level"]).compressobj()
+    return zlib.compressobj(opts["level"], zlib.DEFLATED, 31)  # wbits=31: formato gzip
+
+class CompressedStream(httpx.SyncByteStream, httpx.AsyncByteStream):
+    """Comprime o corpo chunk a chunk enquanto é enviado (Transfer-Encoding: chunked)."""
+
+    def __init__(self, inner, opts: dict):
+        self.inner = inner
+        self.opts = opts
+
+    def __iter__(self) -> Iterator[bytes]:
+        comp = _compressor(self.opts)
+        for chunk in self.inner:  # multipart/ByteStream também iteram de forma síncrona
+            out = comp.compress(chunk)
+            if out:
+                yield out
+        tail = comp.flush()
+        if tail:
+            yield tail
+
+    async def __aiter__(self):
+        for chunk in self:
+            yield chunk
+
+def compress_request(request: httpx.Request, opts: Optional[dict]) -> httpx.Request:
+    if opts is None or request.method in ("GET", "HEAD") or request.headers.get("Content-Length") == "0":
+        return request
+    request.stream = CompressedStream(request.stream, opts)
+    request.headers.pop("Content-Length", None)
+    request.headers["Transfer-Encoding"] = "chunked"
+    request.headers["Content-Encoding"] = opts["algorithm"]
+    return request
@@ -1,22 +1,26 @@
 from __future__ import annotations
 
 import json
-import sys
-import datetime
 import os
 
+from collections import ChainMap
 from typing import Any, Dict
 
+from .templates import compile_template
+from .filters import compile_filter
+
 _TYPEMAP = {"int": int, "float": float, "bool": bool, "str": str}
 
 def pytype(tname: str):
     return _TYPEMAP.get(str(tname).lower(), str)
 
-def safe_format(template: str, mapping: dict) -> str:
-    class _D(dict):
-        def __missing__(self, k):  # mantém {chave} desconhecida
-            return "{%s}" % k
-    return template.format_map(_D(mapping))
+def safe_format(template: str, mapping) -> str:
+    # mantém {chave} desconhecida; parse cacheado e sem copiar mapping (aceita ChainMap)
+    return compile_template(template).render(mapping)
+
+def args_ctx(args: Dict[str, Any]) -> ChainMap:
+    # args (como str) em camada sobre o ambiente, sem copiar os.environ a cada chamada
+    return ChainMap({k: str(v) for k, v in args.items()}, os.environ)
 
 def resolve_template_obj(obj: Any, ctx: dict) -> Any:
     if isinstance(obj, str):
@@ -48,49 +52,12 @@ def coerce_args(spec: Dict[str, str], args: Dict[str, Any] | None) -> Dict[str,
     return out
 
 def extract_filter(data, flt: dict | None, args: dict) -> Any:
-    if not flt:
-        return data
-    seq = data if isinstance(data, list) else []
-    wc = (flt.get("where_contains") or {})
-    # args já deve vir mesclado com env na chamada
-    wc_resolved = {k: safe_format(v, args) for k, v in wc.items()}
-    def keep(item):
-        for field, needle in wc_resolved.items():
-            val = str(item.get(field, "")) if isinstance(item, dict) else ""
-            if needle and needle.lower() not in val.lower():
-                return False
-        return True
-    return [x for x in seq if keep(x)]
+    # compat: compila a cada chamada; o http_client usa o filtro já compilado no load
+    compiled = compile_filter(flt)
+    return compiled.apply(data, args) if compiled else data
 
 # ==================================================
 # Logger estilo uvicorn (ex.: "INFO:     Started server process [43]")
 # ==================================================
-
-# permite ajustar via .env -> LOG_LEVEL=info
-LOG_LEVEL = os.getenv("LOG_LEVEL", "debug").upper()
-LEVEL_ORDER = {"DEBUG": 10, "INFO": 20, "WARNING": 30, "ERROR": 40}
-CURRENT_LEVEL = LEVEL_ORDER.get(LOG_LEVEL, 20)
-
-COLORS = {
-    "DEBUG": "\033[94m",   # azul
-    "INFO": "\033[38;5;2m",    # verde
-    "WARNING": "\033[93m", # amarelo
-    "ERROR": "\033[91m",   # vermelho
-}
-RESET = "\033[0m"
-
-def _emit(level: str, msg: str):
-    ts = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    color = COLORS.get(level, "")
-    sys.stdout.write(f"{color}{level}:{RESET}    {msg}\n")
-    sys.stdout.flush()
-
-def log(level: str, msg: str):
-    level = level.upper()
-    if LEVEL_ORDER.get(level, 0) >= CURRENT_LEVEL:
-        _emit(level, msg)
-
-def debug(msg: str): log("DEBUG", msg)
-def info(msg: str):  log("INFO", msg)
-def warn(msg: str):  log("WARNING", msg)
-def error(msg: str): log("ERROR", msg)
+# implementação (fila + thread de escrita, JSON, amostragem) em logs.py
+from .logs import LEVEL_ORDER, CURRENT_LEVEL, log, debug, debug_sampled, info, warn, error  # noqa: E402,F401
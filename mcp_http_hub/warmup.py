@@ -0,0 +1,132 @@
+from __future__ import annotations
+
+import os
+import re
+from typing import Any, Dict, Optional
+
+import anyio
+import httpx
+
+from .settings import settings
+from .http_pool import get_client, get_async_client, pool_options, pooled_idle, aresolve, dns_stats, _client_key
+from .templates import Template
+from .utils import debug, info, warn
+
+# =========================
+# Pré-aquecimento dos upstreams (WARMUP_CONNECTIONS / WARMUP_INTERVAL)
+# =========================
+#   "pool": { "warm": 2, "warm_path": "/health" }   por definição (default WARMUP_CONNECTIONS / WARMUP_PATH)
+# Conexões só são abertas para quem pede: WARMUP_CONNECTIONS é 0 por padrão (só DNS).
+# Cada bloco http compilado registra aqui a origem (scheme://host:port) da sua URL quando ela é
+# estática ou só depende do ambiente ("{API_BASE_URL}/items"); hosts vindos de args ficam de fora.
+# Na subida e a cada WARMUP_INTERVAL s, para cada upstream: o host é resolvido no cache de DNS
+# (renovado antes de expirar) e, se o pool tem menos conexões ociosas que "warm", o hub abre as
+# que faltam com requisições HEAD em warm_path (qualquer status serve: o que importa é a conexão,
+# com o TLS já negociado, voltar ociosa para o pool). WARMUP_INTERVAL abaixo de
+# HTTP_KEEPALIVE_EXPIRY mantém as conexões vivas entre as chamadas. Cada worker aquece o seu pool.
+
+_ORIGIN_RE = re.compile(r"^(https?)://([^/?#]+)", re.IGNORECASE)
+_TIMEOUT = httpx.Timeout(5.0)
+_CONCURRENCY = 8  # upstreams aquecidos ao mesmo tempo
+
+class _Upstream:
+    __slots__ = ("origin", "host", "port", "pool_cfg", "warm", "path", "warmups", "opened", "failures",
+                 "last_error")
+
+    def __init__(self, origin: str, pool_cfg: Optional[dict]):
+        url = httpx.URL(origin)
+        self.origin = origin
+        self.host = url.host
+        self.port = url.port or (443 if url.scheme == "https" else 80)
+        self.pool_cfg = pool_cfg
+        cfg = pool_cfg or {}
+        opts = pool_options(pool_cfg)
+        self.warm = min(int(cfg.get("warm", settings.WARMUP_CONNECTIONS)), opts["max_keepalive"])
+        self.path = "/" + str(cfg.get("warm_path", settings.WARMUP_PATH)).lstrip("/")
+        self.warmups = 0
+        self.opened = 0
+        self.failures = 0
+        self.last_error: Optional[str] = None
+
+_UPSTREAMS: Dict[tuple, _Upstream] = {}
+
+def static_origin(url: Template) -> Optional[str]:
+    """scheme://host[:port] da URL se não depende dos args da chamada (env é resolvido)."""
+    m = _ORIGIN_RE.match(url.render(os.environ))
+    if m is None or "{" in m.group(2):
+        return None
+    return f"{m.group(1).lower()}://{m.group(2)}"
+
+def note_upstream(url: Template, pool_cfg: Optional[dict]):
+    """Registra o upstream de um bloco http (no load: HttpPlan, ou check_http no catálogo preguiçoso)."""
+    origin = static_origin(url)
+    if origin is None:
+        return
+    key = _client_key(origin, pool_options(pool_cfg))
+    if key not in _UPSTREAMS:
+        _UPSTREAMS[key] = _Upstream(origin, pool_cfg)
+
+# ---------- aquecimento
+def _touch_sync(up: _Upstream):
+    get_client(up.origin, up.pool_cfg).head(up.origin + up.path, timeout=_TIMEOUT)
+
+async def _touch(up: _Upstream):
+    if settings.HTTP_ASYNC:
+        await get_async_client(up.origin, up.pool_cfg).head(up.origin + up.path, timeout=_TIMEOUT)
+    else:
+        await anyio.to_thread.run_sync(_touch_sync, up)
+
+async def _warm(up: _Upstream):
+    try:
+        if settings.DNS_CACHE_TTL > 0:
+            await aresolve(up.host, up.port, ahead=settings.WARMUP_INTERVAL)
+        idle = pooled_idle(up.origin, up.pool_cfg)
+        if up.warm <= 0 or idle is None or idle >= up.warm:
+            return
+        # "warm" requisições juntas: as ociosas são reaproveitadas e as que faltam são abertas
+        async with anyio.create_task_group() as tg:
+            for _ in range(up.warm):
+                tg.start_soon(_touch, up)
+    except Exception as e:
+        first = up.last_error is None
+        up.failures += 1
+        up.last_error = f"{type(e).__name__}: {str(e).splitlines()[0] if str(e) else ''}"
+        if first:  # uma linha por sequência de falhas
+            warn(f"warmup: {up.origin} falhou ({up.last_error})")
+        else:
+            debug("warmup: %s ainda falhando (%s)", up.origin, up.last_error)
+        return
+    if up.last_error is not None:
+        info(f"warmup: {up.origin} voltou a responder")
+        up.last_error = None
+    up.warmups += 1
+    up.opened += up.warm - idle
+    debug("warmup: %s com %d conexão(ões) ociosa(s)", up.origin, up.warm)
+
+async def warm_all():
+    limit = anyio.Semaphore(_CONCURRENCY)
+
+    async def _run(up: _Upstream):
+        async with limit:
+            await _warm(up)
+
+    async with anyio.create_task_group() as tg:
+        for up in list(_UPSTREAMS.values()):
+            tg.start_soon(_run, up)
+
+async def run_warmup():
+    """Roda no event loop do servidor até ser cancelado (WARMUP_INTERVAL=0: só na subida)."""
+    if _UPSTREAMS:
+        debug("warmup: %d upstream(s)", len(_UPSTREAMS))
+    while True:
+        await warm_all()
+        if settings.WARMUP_INTERVAL <= 0:
+            return
+        await anyio.sleep(settings.WARMUP_INTERVAL)
+
+def warmup_stats() -> Dict[str, Any]:
+    out: Dict[str, Any] = {}
+    for up in list(_UPSTREAMS.values()):
+        out[up.origin] = {"warm": up.warm, "idle": pooled_idle(up.origin, up.pool_cfg), "warmups": up.warmups,
+                          "opened": up.opened, "failures": up.failures, "last_error": up.last_error}
+    return {"interval_s": settings.WARMUP_INTERVAL, "upstreams": out, "dns": dns_stats()}
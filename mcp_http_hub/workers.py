@@ -0,0 +1,168 @@
+from __future__ import annotations
+
+import os
+import sys
+import time
+import shutil
+import signal
+import socket
+import tempfile
+import subprocess
+from typing import Dict, List, Optional
+
+from .settings import settings
+from .deadlines import DisconnectWatcher
+from .utils import info, warn, error
+
+# =========================
+# Vários processos na mesma porta (WORKERS > 1)
+# =========================
+# O supervisor não atende requisições: sobe N cópias deste mesmo script como workers,
+# reinicia as que caírem (com backoff) e repassa SIGTERM/SIGINT (parada) e SIGHUP (reload).
+# Com SO_REUSEPORT cada worker abre o próprio socket na mesma porta e o kernel distribui as
+# conexões; sem ele, o supervisor abre o socket e os workers o herdam (HUB_LISTEN_FD).
+# Sessões streamable-http ficam na memória de um worker e a próxima conexão pode cair em outro,
+# então com vários workers o transporte é sempre stateless (STATELESS_HTTP=true).
+# Tokens oauth2, cache de respostas e blobs passam pelo store compartilhado (SHARED_STATE_FILE).
+
+WORKER_ENV = "HUB_WORKER"
+LISTEN_FD_ENV = "HUB_LISTEN_FD"
+_STOP_TIMEOUT = 10.0   # s para os workers terminarem antes do SIGKILL
+_FAST_EXIT = 2.0       # worker que cai antes disso conta como falha na inicialização
+_MAX_FAST_EXITS = 5    # falhas seguidas na inicialização (ex.: porta ocupada) encerram o supervisor
+
+def worker_count() -> int:
+    n = settings.WORKERS
+    return (os.cpu_count() or 1) if n <= 0 else n
+
+def is_worker() -> bool:
+    return WORKER_ENV in os.environ
+
+def _reuse_port() -> bool:
+    return hasattr(socket, "SO_REUSEPORT") and sys.platform != "win32"
+
+def _bind(reuse_port: bool) -> socket.socket:
+    host = settings.HOST
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    return socket.create_server((host, settings.PORT), family=family, backlog=2048, reuse_port=reuse_port)
+
+def listen_socket() -> socket.socket:
+    """Socket do worker: herdado do supervisor ou aberto aqui com SO_REUSEPORT."""
+    fd = os.environ.get(LISTEN_FD_ENV)
+    if fd:
+        return socket.socket(fileno=int(fd))
+    return _bind(reuse_port=True)
+
+async def serve_http(mcp):
+    """
+    Mesmo app do run_streamable_http_async; num worker, servido no socket compartilhado.
+    log_config=None: os logs do uvicorn seguem para o root (fila de logs.py).
+    CANCEL_ON_DISCONNECT: DisconnectWatcher cancela as chamadas de quem fechou a conexão.
+    """
+    import uvicorn
+
+    app = mcp.streamable_http_app()
+    if settings.CANCEL_ON_DISCONNECT:
+        app = DisconnectWatcher(app)
+    config = uvicorn.Config(app, host=mcp.settings.host, port=mcp.settings.port,
+                            log_level=mcp.settings.log_level.lower(), log_config=None)
+    await uvicorn.Server(config).serve(sockets=[listen_socket()] if is_worker() else None)
+
+# =========================
+# Supervisor
+# =========================
+class _Worker:
+    __slots__ = ("index", "proc", "started", "fast_exits")
+
+    def __init__(self, index: int):
+        self.index = index
+        self.proc: Optional[subprocess.Popen] = None
+        self.started = 0.0
+        self.fast_exits = 0
+
+def run_supervisor(count: int) -> int:
+    env: Dict[str, str] = dict(os.environ)
+    if not settings.STATELESS_HTTP:
+        warn("workers: sessões streamable-http não são compartilhadas entre processos; usando STATELESS_HTTP=true")
+    env["STATELESS_HTTP"] = "true"
+    tmpdir = None
+    if not settings.SHARED_STATE_FILE:
+        tmpdir = tempfile.mkdtemp(prefix="mcp-hub-")
+        env["SHARED_STATE_FILE"] = os.path.join(tmpdir, "state.sqlite3")
+
+    sock = None
+    pass_fds: tuple = ()
+    if not _reuse_port():
+        sock = _bind(reuse_port=False)
+        sock.set_inheritable(True)
+        env[LISTEN_FD_ENV] = str(sock.fileno())
+        pass_fds = (sock.fileno(),)
+
+    workers = [_Worker(i) for i in range(count)]
+    stopping = False
+
+    def _start(w: _Worker):
+        w.proc = subprocess.Popen([sys.executable] + sys.argv, env={**env, WORKER_ENV: str(w.index)},
+                                  pass_fds=pass_fds)
+        w.started = time.monotonic()
+
+    def _on_stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+
+    def _on_hup(signum, frame):
+        for w in workers:
+            if w.proc is not None and w.proc.poll() is None:
+                w.proc.send_signal(signal.SIGHUP)
+
+    signal.signal(signal.SIGTERM, _on_stop)
+    signal.signal(signal.SIGINT, _on_stop)
+    if hasattr(signal, "SIGHUP"):
+        signal.signal(signal.SIGHUP, _on_hup)
+
+    info(f"workers: supervisor {os.getpid()} subindo {count} workers em {settings.HOST}:{settings.PORT} "
+         f"({'SO_REUSEPORT' if sock is None else 'socket herdado'}; estado em {env['SHARED_STATE_FILE']})")
+    code = 0
+    try:
+        for w in workers:
+            _start(w)
+        while not stopping:
+            time.sleep(0.2)
+            for w in workers:
+                rc = w.proc.poll()
+                if rc is None or stopping:
+                    continue
+                if time.monotonic() - w.started < _FAST_EXIT:
+                    w.fast_exits += 1
+                else:
+                    w.fast_exits = 0
+                if w.fast_exits >= _MAX_FAST_EXITS:
+                    error(f"workers: worker {w.index} falhou {w.fast_exits}x seguidas ao iniciar (código {rc}); encerrando")
+                    stopping, code = True, 1
+                    break
+                delay = min(0.5 * (2 ** w.fast_exits), 10.0)
+                warn(f"workers: worker {w.index} (pid {w.proc.pid}) saiu com código {rc}; reiniciando em {delay:.1f}s")
+                time.sleep(delay)
+                if not stopping:
+                    _start(w)
+    finally:
+        _stop_all([w.proc for w in workers if w.proc is not None])
+        if sock is not None:
+            sock.close()
+        if tmpdir is not None:
+            shutil.rmtree(tmpdir, ignore_errors=True)
+    info("workers: supervisor encerrado")
+    return code
+
+def _stop_all(procs: List[subprocess.Popen]):
+    for p in procs:
+        if p.poll() is None:
+            p.terminate()
+    deadline = time.monotonic() + _STOP_TIMEOUT
+    for p in procs:
+        try:
+            p.wait(timeout=max(deadline - time.monotonic(), 0.1))
+        except subprocess.TimeoutExpired:
+            warn(f"workers: pid {p.pid} não encerrou em {_STOP_TIMEOUT:.0f}s; SIGKILL")
+            p.kill()
+            p.wait()
@@ -0,0 +1,21 @@
+from mcp_http_hub.filters import CompiledFilter
+
+ITEMS = [{"id": 1, "price": 10}, {"id": 2}, {"id": 3, "price": 30}, {"id": 4, "price": None}, {"id": 5, "price": 20}]
+
+def ids(flt):
+    return [x["id"] for x in CompiledFilter(flt).apply(ITEMS, {})]
+
+def test_sort_asc_ausentes_por_ultimo():
+    assert ids({"sort": "price"}) == [1, 5, 3, 2, 4]
+    assert ids({"sort": "price", "limit": 2}) == [1, 5]
+
+def test_sort_desc_ausentes_por_ultimo():
+    assert ids({"sort": "-price"}) == [3, 5, 1, 2, 4]
+    assert ids({"sort": "-price", "limit": 2}) == [3, 5]
+    assert ids({"sort": "-price", "limit": 4}) == [3, 5, 1, 2]
+
+def test_sort_direcoes_mistas():
+    items = [{"id": 1, "g": "b", "price": 1}, {"id": 2, "g": "a"}, {"id": 3, "g": "a", "price": 5},
+             {"id": 4, "price": 9}, {"id": 5, "g": "b", "price": 3}]
+    out = CompiledFilter({"sort": ["g", "-price"]}).apply(items, {})
+    assert [x["id"] for x in out] == [3, 2, 5, 1, 4]
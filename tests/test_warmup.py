@@ -0,0 +1,19 @@
+import json
+from pathlib import Path
+
+from mcp_http_hub import warmup
+from mcp_http_hub.loaders.tools_loader import build_tool, check_tool, tool_key
+
+EXAMPLE = Path(__file__).resolve().parent.parent / "config" / "examples" / "tools.example.json"
+
+def upstreams(register):
+    warmup._UPSTREAMS.clear()
+    for defn in json.loads(EXAMPLE.read_text(encoding="utf-8")):
+        if tool_key(defn) is not None:
+            register(defn)
+    return set(warmup._UPSTREAMS)
+
+def test_catalogo_preguicoso_registra_os_mesmos_upstreams():
+    eager = upstreams(build_tool)
+    assert eager
+    assert upstreams(check_tool) == eager